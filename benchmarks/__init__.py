@@ -0,0 +1,15 @@
+"""
+Benchmark suite.
+
+Benchmarks follow the `asv <https://asv.readthedocs.io/>`_ conventions;
+classes define `setup`, optional `params` and `param_names`, and methods
+prefixed with `time_` for wall time and `peakmem_` for peak memory. The
+suite runs with asv from the source checkout::
+
+    asv run --python=same
+
+Or without any extra dependency::
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --compare results.json
+"""
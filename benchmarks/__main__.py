@@ -0,0 +1,145 @@
+"""
+Command line runner of the benchmark suite.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import gc
+import importlib
+import itertools
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+
+def iter_benchmarks(pattern=None):
+    """Yield `(name, kls, method, params)` of the benchmarks."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for filename in sorted(os.listdir(directory)):
+        if not (filename.startswith('bench_') and filename.endswith('.py')):
+            continue
+        module = importlib.import_module(
+            '%s.%s' % (__package__ or 'benchmarks', filename[:-3])
+        )
+        for kls_name in sorted(dir(module)):
+            kls = getattr(module, kls_name)
+            if not isinstance(kls, type) or kls.__module__ != module.__name__:
+                continue
+            params = getattr(kls, 'params', [])
+            if params and not isinstance(params[0], (list, tuple)):
+                params = [params]
+            for method in sorted(dir(kls)):
+                if not method.startswith(('time_', 'peakmem_')):
+                    continue
+                for values in itertools.product(*params):
+                    name = '%s.%s.%s' % (filename[:-3], kls_name, method)
+                    if values:
+                        name += '(%s)' % ', '.join(str(v) for v in values)
+                    if pattern and pattern not in name:
+                        continue
+                    yield name, kls, method, values
+
+
+def run_benchmark(kls, method, values, repeat=5):
+    """Run the benchmark and return seconds or bytes."""
+    instance = kls()
+    if hasattr(instance, 'setup'):
+        try:
+            instance.setup(*values)
+        except NotImplementedError:
+            return None
+    func = getattr(instance, method)
+    try:
+        func(*values)  # Warm up.
+        gc.collect()
+        if method.startswith('peakmem_'):
+            tracemalloc.start()
+            try:
+                func(*values)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        return min(timeit.repeat(lambda: func(*values), number=1,
+                                 repeat=repeat))
+    finally:
+        if hasattr(instance, 'teardown'):
+            instance.teardown(*values)
+
+
+def _format(method, value):
+    if value is None:
+        return 'n/a'
+    if method.startswith('peakmem_'):
+        return '%.1f MiB' % (value / float(1 << 20))
+    return '%.3f ms' % (value * 1e3)
+
+
+def main(argv=None):
+    """
+    Run the benchmark suite without asv, by `python -m benchmarks`.
+
+    Usage:
+        benchmarks [options]
+        benchmarks -h | --help
+
+    Options:
+        -k PATTERN                  Run benchmarks whose name contains
+                                    PATTERN.
+        -r N --repeat=N             Number of timed samples [default: 5].
+        -o FILE --output=FILE       Write the results to a JSON file.
+        -c FILE --compare=FILE      Compare with the results in a JSON file,
+                                    and exit with status 1 on regressions.
+        -t RATIO --threshold=RATIO  Ratio to the previous result considered
+                                    a regression [default: 1.5].
+
+    Wall time is the best of the samples in seconds, and peak memory is the
+    peak of the Python allocations in bytes traced by tracemalloc.
+    """
+    import docopt
+    import psd_tools.version
+
+    args = docopt.docopt(main.__doc__, argv=argv)
+    pattern = args['-k']
+    repeat = int(args['--repeat'])
+    threshold = float(args['--threshold'])
+
+    baseline = {}
+    if args['--compare']:
+        with open(args['--compare']) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    regressions = []
+    for name, kls, method, values in iter_benchmarks(pattern):
+        value = run_benchmark(kls, method, values, repeat)
+        results[name] = value
+        line = '%-72s %12s' % (name, _format(method, value))
+        previous = baseline.get(name)
+        if value is not None and previous:
+            ratio = value / float(previous)
+            line += '  %5.2fx' % ratio
+            if ratio > threshold:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+        sys.stdout.flush()
+
+    if args['--output']:
+        with open(args['--output'], 'w') as f:
+            json.dump({
+                'version': psd_tools.version.__version__,
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+    if regressions:
+        print('%d regression(s) over %.2fx' % (
+            len(regressions), threshold
+        ))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+from __future__ import absolute_import, unicode_literals
+
+from psd_tools.compression import compress, decompress
+from psd_tools.constants import Compression
+
+from .common import make_pixels, with_peakmem
+
+
+@with_peakmem
+class Decompress(object):
+    params = (
+        [c.name for c in Compression],
+        [8, 16, 32],
+    )
+    param_names = ['compression', 'depth']
+
+    def setup(self, compression, depth):
+        self.compression = Compression[compression]
+        raw = make_pixels((1024, 1024), depth).byteswap().tobytes()
+        self.data = compress(raw, self.compression, 1024, 1024, depth)
+
+    def time_decompress(self, compression, depth):
+        decompress(self.data, self.compression, 1024, 1024, depth)
+
+
+@with_peakmem
+class Compress(object):
+    params = (
+        [c.name for c in Compression],
+        [8, 16],
+    )
+    param_names = ['compression', 'depth']
+
+    def setup(self, compression, depth):
+        self.compression = Compression[compression]
+        self.raw = make_pixels((1024, 1024), depth).byteswap().tobytes()
+
+    def time_compress(self, compression, depth):
+        compress(self.raw, self.compression, 1024, 1024, depth)
@@ -0,0 +1,19 @@
+from __future__ import absolute_import, unicode_literals
+import os
+
+from psd_tools.psd.engine_data import EngineData
+
+from .common import TEST_ROOT, with_peakmem
+
+
+@with_peakmem
+class EngineDataParse(object):
+    params = [sorted(os.listdir(os.path.join(TEST_ROOT, 'engine_data')))]
+    param_names = ['filename']
+
+    def setup(self, filename):
+        with open(os.path.join(TEST_ROOT, 'engine_data', filename), 'rb') as f:
+            self.data = f.read()
+
+    def time_parse(self, filename):
+        EngineData.frombytes(self.data)
@@ -0,0 +1,86 @@
+from __future__ import absolute_import, unicode_literals
+import io
+
+from psd_tools import PSDImage
+
+from .common import get_fixture, make_document, with_peakmem
+
+FIXTURES = [
+    'colormodes/4x4_8bit_rgb.psd',
+    'layer_effects.psd',
+    'advanced-blending.psd',
+    'pen-text.psd',
+    'smart-object-slice.psb',
+]
+
+
+@with_peakmem
+class Open(object):
+    params = [FIXTURES, [False, True]]
+    param_names = ['filename', 'lazy']
+
+    def setup(self, filename, lazy):
+        with open(get_fixture(filename), 'rb') as f:
+            self.data = f.read()
+
+    def time_open(self, filename, lazy):
+        PSDImage.open(io.BytesIO(self.data), lazy=lazy)
+
+
+@with_peakmem
+class OpenLayers(object):
+    params = [[10, 100, 1000]]
+    param_names = ['layers']
+
+    def setup(self, layers):
+        from psd_tools.api.synthetic import generate
+        with io.BytesIO() as f:
+            generate(
+                f, (256, 256), layers=layers, group_depth=4,
+                layer_size=(32, 32), masks=0.5, effects=0.2, text=0.2
+            )
+            self.data = f.getvalue()
+
+    def time_open(self, layers):
+        PSDImage.open(io.BytesIO(self.data))
+
+
+@with_peakmem
+class LayerNumpy(object):
+    params = [[8, 16, 32]]
+    param_names = ['depth']
+
+    def setup(self, depth):
+        self.data = make_document((1024, 1024), 4, depth=depth)
+
+    def time_numpy(self, depth):
+        psd = PSDImage.open(io.BytesIO(self.data))
+        for layer in psd:
+            layer.numpy()
+
+
+@with_peakmem
+class Composite(object):
+    params = [[256, 1024, 2048], [1, 16]]
+    param_names = ['size', 'layers']
+
+    def setup(self, size, layers):
+        data = make_document((size, size), layers)
+        self.psd = PSDImage.open(io.BytesIO(data))
+
+    def time_composite(self, size, layers):
+        self.psd.cache.clear()
+        self.psd.composite(ignore_preview=True)
+
+
+@with_peakmem
+class Save(object):
+    params = [['layer_effects.psd', 'pen-text.psd', 'smart-object-slice.psb']]
+    param_names = ['filename']
+
+    def setup(self, filename):
+        self.psd = PSDImage.open(get_fixture(filename))
+
+    def time_save(self, filename):
+        with io.BytesIO() as f:
+            self.psd.save(f)
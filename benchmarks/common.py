@@ -0,0 +1,70 @@
+from __future__ import absolute_import, unicode_literals
+import io
+import os
+
+import numpy as np
+
+from psd_tools.constants import Compression
+
+TEST_ROOT = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tests')
+
+
+def get_fixture(name):
+    """Path to a fixture in `tests/psd_files`."""
+    return os.path.join(TEST_ROOT, 'psd_files', name)
+
+
+def with_peakmem(kls):
+    """Class decorator to measure peak memory of each `time_` benchmark."""
+    for name in dir(kls):
+        if name.startswith('time_'):
+            setattr(kls, 'peakmem_' + name[5:], getattr(kls, name))
+    return kls
+
+
+def make_pixels(shape, depth=8, seed=0):
+    """Smooth gradient with noise, compressible like a photograph."""
+    rng = np.random.RandomState(seed)
+    height, width = shape[:2]
+    values = np.add.outer(
+        np.linspace(0, 0.5, height), np.linspace(0, 0.5, width)
+    )
+    if len(shape) == 3:
+        values = np.repeat(values[:, :, None], shape[2], axis=2)
+    values = values + rng.uniform(0, 0.05, shape)
+    if depth == 32:
+        return values.astype(np.float32)
+    return (values * ((1 << depth) - 1)).astype(
+        np.uint8 if depth == 8 else np.uint16
+    )
+
+
+def make_document(
+    size, layers, depth=8, compression=Compression.RLE, seed=0
+):
+    """
+    Create a document of overlapping RGBA layers.
+
+    :return: `bytes` of the PSD file.
+    """
+    from psd_tools.api.writer import PSDWriter
+
+    width, height = size
+    rng = np.random.RandomState(seed)
+    with io.BytesIO() as f:
+        with PSDWriter(
+            f, size, depth=depth, compression=compression
+        ) as writer:
+            for index in range(layers):
+                w = max(1, width // 2)
+                h = max(1, height // 2)
+                offset = (
+                    int(rng.randint(0, width - w + 1)),
+                    int(rng.randint(0, height - h + 1)),
+                )
+                writer.add_layer(
+                    make_pixels((h, w, 4), depth, seed + index),
+                    name='Layer %d' % index,
+                    offset=offset,
+                )
+        return f.getvalue()
@@ -1,5 +1,34 @@
 from __future__ import absolute_import, unicode_literals
-from .api.psd_image import PSDImage
-from .composer import compose
+import importlib
+import sys
 
-__all__ = ['PSDImage', 'compose']
+__all__ = ['PSDImage', 'compose', 'probe']
+
+# Public names are imported on first access, so that `import psd_tools` and
+# reading a document do not load the composer and its dependencies.
+_LAZY = {
+    'PSDImage': 'psd_tools.api.psd_image',
+    'compose': 'psd_tools.composer',
+    'probe': 'psd_tools.api.probe',
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name)
+        )
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+if sys.version_info < (3, 7):
+    # Module __getattr__ is not supported.
+    from .api.psd_image import PSDImage  # noqa: F401
+    from .api.probe import probe  # noqa: F401
+    from .composer import compose  # noqa: F401
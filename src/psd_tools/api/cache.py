@@ -0,0 +1,198 @@
+"""
+Decoded channel cache module.
+
+:py:class:`ChannelCache` keeps decompressed layer channels so that repeated
+calls to :py:meth:`~psd_tools.api.layers.Layer.numpy`,
+:py:meth:`~psd_tools.api.layers.Layer.topil`, or
+:py:meth:`~psd_tools.api.psd_image.PSDImage.composite` do not decompress the
+same channel again. Each :py:class:`~psd_tools.api.psd_image.PSDImage` owns a
+cache at :py:attr:`~psd_tools.api.psd_image.PSDImage.cache`. The cache is
+disabled by default so that a document holds no decoded pixels unless the
+caller opts in with a budget.
+
+Example::
+
+    psd = PSDImage.open('example.psd', cache_budget=1024 * 1024 * 1024)
+    for layer_filter in filters:
+        image = psd.composite(layer_filter=layer_filter)
+    print(psd.cache.hits, psd.cache.misses)
+"""
+from __future__ import absolute_import, unicode_literals
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET = 0
+
+
+class ChannelCache(object):
+    """
+    LRU cache of decompressed channel bytes bounded by a byte budget.
+
+    Entries are keyed by the
+    :py:class:`~psd_tools.psd.layer_and_mask.ChannelData` object, which
+    identifies a channel of a layer record, and the bit depth. An entry is
+    invalidated when the compressed data of the channel is replaced, e.g., by
+    :py:meth:`~psd_tools.psd.layer_and_mask.ChannelData.set_data`.
+
+    :param budget: maximum total byte size of cached channels. 0, the
+        default, disables the cache.
+    """
+    def __init__(self, budget=DEFAULT_BUDGET):
+        if budget < 0:
+            raise ValueError('Invalid budget: %r' % (budget, ))
+        self._budget = budget
+        self._limit = None
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def budget(self):
+        """Maximum total byte size of cached channels."""
+        return self._budget
+
+    @budget.setter
+    def budget(self, value):
+        if value < 0:
+            raise ValueError('Invalid budget: %r' % (value, ))
+        with self._lock:
+            self._budget = value
+            self._evict()
+
+    @property
+    def limit(self):
+        """
+        Hard cap on the total byte size that overrides a larger budget, or
+        `None`. Set by
+        :py:attr:`~psd_tools.api.psd_image.PSDImage.memory_limit`.
+        """
+        return self._limit
+
+    @limit.setter
+    def limit(self, value):
+        with self._lock:
+            self._limit = value
+            self._evict()
+
+    @property
+    def capacity(self):
+        """Maximum total byte size, the smaller of the budget and the limit."""
+        if self._limit is None:
+            return self._budget
+        return min(self._budget, self._limit)
+
+    @property
+    def size(self):
+        """Current total byte size of cached channels."""
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        channel_data, depth = key
+        with self._lock:
+            entry = self._entries.get((id(channel_data), depth))
+            return entry is not None and _is_valid(entry, channel_data)
+
+    def get(self, channel_data, depth):
+        """
+        Get decompressed bytes of the channel.
+
+        :param channel_data:
+            :py:class:`~psd_tools.psd.layer_and_mask.ChannelData`.
+        :param depth: bit depth.
+        :return: `bytes` or `None` if not cached.
+        """
+        key = (id(channel_data), depth)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not _is_valid(entry, channel_data):
+                logger.debug('Invalidate %r' % (channel_data, ))
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[3]
+
+    def put(self, channel_data, depth, value):
+        """
+        Store decompressed bytes of the channel.
+
+        :param channel_data:
+            :py:class:`~psd_tools.psd.layer_and_mask.ChannelData`.
+        :param depth: bit depth.
+        :param value: decompressed `bytes`.
+        """
+        if len(value) > self.capacity or channel_data.is_pending:
+            # Pending channels are decoded from the raw data.
+            return
+        key = (id(channel_data), depth)
+        with self._lock:
+            self._remove(key)
+            # Keep a reference to channel_data so that its id is not reused.
+            self._entries[key] = (
+                channel_data, channel_data.data, channel_data.compression,
+                value
+            )
+            self._size += len(value)
+            self._evict()
+
+    def entries(self):
+        """
+        Get the cached entries in the order from the least recently used.
+
+        :return: `list` of `(channel_data, depth, nbytes)` tuples.
+        """
+        with self._lock:
+            return [(entry[0], key[1], len(entry[3]))
+                    for key, entry in self._entries.items()]
+
+    def shrink(self, size):
+        """
+        Evict the least recently used entries until the total byte size is
+        at most `size`, without changing the budget.
+        """
+        with self._lock:
+            while self._size > size and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Remove all the entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[3])
+
+    def _evict(self):
+        capacity = self.capacity
+        while self._size > capacity and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._size -= len(entry[3])
+
+    def __repr__(self):
+        return '%s(size=%d, budget=%d, hits=%d, misses=%d)' % (
+            self.__class__.__name__, self._size, self._budget, self.hits,
+            self.misses
+        )
+
+
+def _is_valid(entry, channel_data):
+    return (
+        not channel_data.is_pending and entry[1] is channel_data.data and
+        entry[2] == channel_data.compression
+    )
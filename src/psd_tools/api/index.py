@@ -0,0 +1,333 @@
+"""
+Layer index module.
+
+:py:class:`LayerIndex` answers structural queries on a document, such as
+finding a layer by id, by name, or by kind, without walking the layer tree.
+:py:class:`SpatialIndex` answers which layers intersect a rectangle or
+contain a point. Each :py:class:`~psd_tools.api.psd_image.PSDImage` owns the
+indices at :py:attr:`~psd_tools.api.psd_image.PSDImage.index` and
+:py:attr:`~psd_tools.api.psd_image.PSDImage.spatial_index`.
+
+Example::
+
+    psd = PSDImage.open('example.psd')
+    layer = psd.index.get(42)
+    for layer in psd.index.find_by_kind('type'):
+        print(layer.text)
+    for layer in psd.spatial_index.search_point(120, 80):
+        print(layer.name)
+"""
+from __future__ import absolute_import, unicode_literals
+import logging
+import math
+
+from psd_tools.constants import Tag
+
+logger = logging.getLogger(__name__)
+
+PATTERN_KEYS = (Tag.PATTERNS1, Tag.PATTERNS2, Tag.PATTERNS3)
+
+LINKED_LAYER_KEYS = (
+    Tag.LINKED_LAYER1, Tag.LINKED_LAYER2, Tag.LINKED_LAYER3,
+    Tag.LINKED_LAYER_EXTERNAL
+)
+
+
+class LayerIndex(object):
+    """
+    Dict-based lookup tables of layers, patterns, and linked layers.
+
+    Tables are built on the first query and kept until the layer structure
+    changes. Renaming a layer through
+    :py:attr:`~psd_tools.api.layers.Layer.name` updates the index in place,
+    and adding or removing layers through the group interface discards the
+    tables. Call :py:meth:`invalidate` after modifying records or tagged
+    blocks directly.
+
+    :param psd: :py:class:`~psd_tools.api.psd_image.PSDImage`.
+    """
+    def __init__(self, psd):
+        self._psd = psd
+        self._layers = None
+        self._by_id = None
+        self._by_name = None
+        self._by_kind = None
+        self._patterns = None
+        self._linked_layers = None
+
+    def invalidate(self):
+        """Discard all tables. They are rebuilt on the next query."""
+        self._layers = None
+        self._by_id = None
+        self._by_name = None
+        self._by_kind = None
+        self._patterns = None
+        self._linked_layers = None
+
+    def __len__(self):
+        return len(self._get_layers())
+
+    def __iter__(self):
+        return iter(list(self._get_layers()))
+
+    def __contains__(self, layer_id):
+        self._get_layers()
+        return layer_id in self._by_id
+
+    def get(self, layer_id, default=None):
+        """
+        Get a layer by id.
+
+        :param layer_id: int layer id.
+        :param default: value to return when no layer has the id.
+        :return: :py:class:`~psd_tools.api.layers.Layer` or `default`.
+        """
+        self._get_layers()
+        return self._by_id.get(layer_id, default)
+
+    def find_by_name(self, name):
+        """
+        Get layers that have the given name, in document order.
+
+        :param name: `str` layer name.
+        :return: list of :py:class:`~psd_tools.api.layers.Layer`.
+        """
+        self._get_layers()
+        return list(self._by_name.get(name, ()))
+
+    def find_by_kind(self, kind):
+        """
+        Get layers of the given kind, in document order.
+
+        :param kind: `str` kind, such as `group`, `pixel`, `shape`, `type`,
+            or `smartobject`. See :py:attr:`~psd_tools.api.layers.Layer.kind`.
+        :return: list of :py:class:`~psd_tools.api.layers.Layer`.
+        """
+        self._get_layers()
+        return list(self._by_kind.get(kind, ()))
+
+    def get_pattern(self, pattern_id):
+        """
+        Get a pattern by id.
+
+        :param pattern_id: `str` pattern id.
+        :return: :py:class:`~psd_tools.psd.patterns.Pattern` or `None`.
+        """
+        if self._patterns is None:
+            self._patterns = self._build_table(PATTERN_KEYS, 'pattern_id')
+        return self._patterns.get(pattern_id)
+
+    def get_linked_layer(self, uuid):
+        """
+        Get a linked layer item by the unique id of a smart object.
+
+        :param uuid: `str` unique id.
+        :return: :py:class:`~psd_tools.psd.linked_layer.LinkedLayer` or
+            `None`.
+        """
+        if self._linked_layers is None:
+            self._linked_layers = self._build_table(LINKED_LAYER_KEYS, 'uuid')
+        return self._linked_layers.get(uuid)
+
+    def _rename(self, layer, old_name, new_name):
+        """Move the layer to the new name entry."""
+        if self._by_name is None or old_name == new_name:
+            return
+        layers = self._by_name.get(old_name)
+        if not layers or not any(item is layer for item in layers):
+            return
+        layers[:] = [item for item in layers if item is not layer]
+        if not layers:
+            del self._by_name[old_name]
+        # Keep document order within the entry.
+        position = {id(item): i for i, item in enumerate(self._layers)}
+        layers = self._by_name.setdefault(new_name, [])
+        layers.append(layer)
+        layers.sort(key=lambda item: position[id(item)])
+
+    def _get_layers(self):
+        if self._layers is None:
+            self._build_layers()
+        return self._layers
+
+    def _build_layers(self):
+        layers, by_id, by_name, by_kind = [], {}, {}, {}
+        for layer in _iter_descendants(self._psd):
+            layers.append(layer)
+            layer_id = layer.layer_id
+            if layer_id != -1:
+                by_id.setdefault(layer_id, layer)
+            by_name.setdefault(layer.name, []).append(layer)
+            by_kind.setdefault(layer.kind, []).append(layer)
+        self._layers = layers
+        self._by_id = by_id
+        self._by_name = by_name
+        self._by_kind = by_kind
+
+    def _build_table(self, keys, attribute):
+        table = {}
+        tagged_blocks = self._psd.tagged_blocks
+        if tagged_blocks is None:
+            return table
+        for key in keys:
+            if key in tagged_blocks:
+                for item in tagged_blocks.get_data(key):
+                    table.setdefault(getattr(item, attribute), item)
+        return table
+
+
+class SpatialIndex(object):
+    """
+    R-tree of layer bounding boxes.
+
+    The tree is bulk-loaded by sort-tile-recursive packing on the first query
+    and kept in NumPy arrays, one array of node boxes per level. A query
+    descends only into the nodes that match, so that layers far from the
+    query are not visited. Layers with an empty bbox are not indexed.
+
+    Moving a layer, changing the visibility, or adding or removing layers
+    through the group interface discards the tree. Call :py:meth:`invalidate`
+    after modifying records or tagged blocks directly.
+
+    :param psd: :py:class:`~psd_tools.api.psd_image.PSDImage`.
+    """
+    NODE_SIZE = 16
+
+    def __init__(self, psd):
+        self._psd = psd
+        self._layers = None
+        self._positions = None
+        self._levels = None
+
+    def invalidate(self):
+        """Discard the tree. It is rebuilt on the next query."""
+        self._layers = None
+        self._positions = None
+        self._levels = None
+
+    def __len__(self):
+        self._build()
+        return len(self._layers)
+
+    def search(self, bbox):
+        """
+        Get layers whose bbox intersects the given bbox, in document order.
+
+        Example::
+
+            layers = psd.spatial_index.search((0, 0, 256, 256))
+
+        :param bbox: (left, top, right, bottom) `tuple`.
+        :return: list of :py:class:`~psd_tools.api.layers.Layer`.
+        """
+        left, top, right, bottom = bbox
+        return self._query(
+            lambda b: (b[:, 0] < right) & (b[:, 2] > left) &
+            (b[:, 1] < bottom) & (b[:, 3] > top)
+        )
+
+    def search_point(self, x, y):
+        """
+        Get layers whose bbox contains the given point, in document order.
+
+        Use this for hit-testing. The bbox does not account for transparent
+        pixels.
+
+        :param x: horizontal coordinate.
+        :param y: vertical coordinate.
+        :return: list of :py:class:`~psd_tools.api.layers.Layer`.
+        """
+        return self._query(
+            lambda b: (b[:, 0] <= x) & (b[:, 2] > x) &
+            (b[:, 1] <= y) & (b[:, 3] > y)
+        )
+
+    def _query(self, predicate):
+        import numpy as np
+        self._build()
+        if not self._levels:
+            return []
+        size = self.NODE_SIZE
+        nodes = np.arange(len(self._levels[-1]))
+        for depth in range(len(self._levels) - 1, -1, -1):
+            nodes = nodes[predicate(self._levels[depth][nodes])]
+            if depth == 0 or len(nodes) == 0:
+                break
+            nodes = (nodes[:, None] * size + np.arange(size)).ravel()
+            nodes = nodes[nodes < len(self._levels[depth - 1])]
+        if len(nodes) == 0:
+            return []
+        return [self._layers[i] for i in np.sort(self._positions[nodes])]
+
+    def _build(self):
+        import numpy as np
+        if self._layers is not None:
+            return
+        layers, boxes = [], []
+        for layer in self._psd.descendants():
+            bbox = layer.bbox
+            if bbox[0] < bbox[2] and bbox[1] < bbox[3]:
+                layers.append(layer)
+                boxes.append(bbox)
+        boxes = np.array(boxes, dtype=np.float64).reshape((-1, 4))
+        order = _pack(boxes, self.NODE_SIZE)
+
+        levels = []
+        if len(boxes):
+            levels.append(boxes[order])
+        while len(levels) and len(levels[-1]) > 1:
+            children = levels[-1]
+            starts = np.arange(0, len(children), self.NODE_SIZE)
+            levels.append(
+                np.stack((
+                    np.minimum.reduceat(children[:, 0], starts),
+                    np.minimum.reduceat(children[:, 1], starts),
+                    np.maximum.reduceat(children[:, 2], starts),
+                    np.maximum.reduceat(children[:, 3], starts),
+                ), axis=1)
+            )
+        self._layers = layers
+        self._positions = order
+        self._levels = levels
+
+
+def _pack(boxes, size):
+    """
+    Sort-tile-recursive order of the boxes; boxes are sorted into vertical
+    slices by the center x, and each slice is sorted by the center y.
+    """
+    import numpy as np
+
+    count = len(boxes)
+    if count == 0:
+        return np.zeros(0, dtype=np.intp)
+    slices = int(math.ceil(math.sqrt(math.ceil(count / float(size)))))
+    step = slices * size
+    order = np.argsort(boxes[:, 0] + boxes[:, 2], kind='mergesort')
+    center_y = boxes[:, 1] + boxes[:, 3]
+    return np.concatenate([
+        chunk[np.argsort(center_y[chunk], kind='mergesort')]
+        for chunk in (order[i:i + step] for i in range(0, count, step))
+    ])
+
+
+def _iter_descendants(group, include_clip=True):
+    """
+    Iterate over descendant layers of the group in document order without
+    recursion.
+    """
+    stack = [(iter(group), True)]
+    while stack:
+        iterator, expand = stack[-1]
+        layer = next(iterator, None)
+        if layer is None:
+            stack.pop()
+            continue
+        yield layer
+        if not expand:
+            continue
+        # Clipping layers come after the children of the layer.
+        if include_clip and layer.clip_layers:
+            stack.append((iter(layer.clip_layers), False))
+        if layer.is_group():
+            stack.append((iter(layer), True))
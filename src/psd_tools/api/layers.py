@@ -5,7 +5,7 @@ from __future__ import absolute_import, unicode_literals
 import logging
 
 from psd_tools.constants import BlendMode, Tag
-from psd_tools.api.effects import Effects
+from psd_tools.api.index import _iter_descendants
 from psd_tools.api.mask import Mask
 from psd_tools.api.shape import VectorMask, Stroke, Origination
 from psd_tools.api.smart_object import SmartObject
@@ -14,6 +14,15 @@ from psd_tools.api import deprecated
 
 logger = logging.getLogger(__name__)
 
+# Memoized properties that depend on each writable attribute.
+_DEPENDENTS = {
+    'name': ('_name', ),
+    'visible': ('_is_visible', '_bbox'),
+    'opacity': (),
+    'blend_mode': (),
+    'offset': ('_bbox', ),
+}
+
 
 class Layer(object):
     def __init__(self, psd, record, channels, parent):
@@ -30,21 +39,27 @@ class Layer(object):
 
         :return: `str`
         """
-        return self._record.tagged_blocks.get_data(
-            Tag.UNICODE_LAYER_NAME, self._record.name
-        )
+        if not hasattr(self, '_name'):
+            self._name = self._record.tagged_blocks.get_data(
+                Tag.UNICODE_LAYER_NAME, self._record.name
+            )
+        return self._name
 
     @name.setter
     def name(self, value):
         assert len(value) < 256, 'Layer name too long (%d) %s' % (
             len(value), value
         )
+        old_name = self.name
         try:
             value.encode('macroman')
             self._record.name = value
         except UnicodeEncodeError:
             self._record.name = str('?')
         self._record.tagged_blocks.set_data(Tag.UNICODE_LAYER_NAME, value)
+        self._changed('name')
+        if self._psd is not None:
+            self._psd.index._rename(self, old_name, value)
 
     @property
     def kind(self):
@@ -54,7 +69,9 @@ class Layer(object):
 
         :return: `str`
         """
-        return self.__class__.__name__.lower().replace('layer', '')
+        if not hasattr(self, '_kind'):
+            self._kind = self.__class__.__name__.lower().replace('layer', '')
+        return self._kind
 
     @property
     def layer_id(self):
@@ -77,6 +94,7 @@ class Layer(object):
     @visible.setter
     def visible(self, value):
         self._record.flags.visible = bool(value)
+        self._changed('visible')
 
     def is_visible(self):
         """
@@ -84,7 +102,9 @@ class Layer(object):
 
         :return: `bool`
         """
-        return self.visible and self.parent.is_visible()
+        if not hasattr(self, '_is_visible'):
+            self._is_visible = self.visible and self.parent.is_visible()
+        return self._is_visible
 
     @property
     def opacity(self):
@@ -99,6 +119,7 @@ class Layer(object):
     def opacity(self, value):
         assert 0 <= value and value <= 255
         self._record.opacity = int(value)
+        self._changed('opacity')
 
     @property
     def parent(self):
@@ -131,6 +152,7 @@ class Layer(object):
     @blend_mode.setter
     def blend_mode(self, value):
         self._record.blend_mode = BlendMode(value)
+        self._changed('blend_mode')
 
     @property
     def left(self):
@@ -146,6 +168,7 @@ class Layer(object):
         w = self.width
         self._record.left = int(value)
         self._record.right = int(value) + w
+        self._changed('offset')
 
     @property
     def top(self):
@@ -161,6 +184,7 @@ class Layer(object):
         h = self.height
         self._record.top = int(value)
         self._record.bottom = int(value) + h
+        self._changed('offset')
 
     @property
     def right(self):
@@ -397,7 +421,9 @@ class Layer(object):
         force=False,
         color=1.0,
         alpha=0.0,
-        layer_filter=None
+        layer_filter=None,
+        tile_size=None,
+        workers=None,
     ):
         """
         Composite layer and masks (mask, vector mask, and clipping layers).
@@ -412,10 +438,26 @@ class Layer(object):
         :param layer_filter: Callable that takes a layer as argument and
             returns whether if the layer is composited. Default is
             :py:func:`~psd_tools.api.layers.PixelLayer.is_visible`.
+        :param tile_size: Tile size in pixels, or a tuple of (width,
+            height). When given, the image is composited tile by tile to
+            bound memory usage. See
+            :py:func:`~psd_tools.composite.composite_tiles`.
+        :param workers: Number of threads to composite tiles in parallel.
+            The default tile size is 512 pixels when `tile_size` is not
+            given.
         :return: :py:class:`PIL.Image`.
         """
         from psd_tools.composite import composite_pil
-        return composite_pil(self, color, alpha, viewport, layer_filter, force)
+        return composite_pil(
+            self,
+            color,
+            alpha,
+            viewport,
+            layer_filter,
+            force,
+            tile_size=tile_size,
+            workers=workers
+        )
 
     def has_clip_layers(self):
         """
@@ -461,6 +503,7 @@ class Layer(object):
         :return: :py:class:`~psd_tools.api.effects.Effects`
         """
         if not hasattr(self, '_effects'):
+            from psd_tools.api.effects import Effects
             self._effects = Effects(self)
         return self._effects
 
@@ -482,6 +525,24 @@ class Layer(object):
         """
         return self._record.tagged_blocks
 
+    def _changed(self, key):
+        """
+        Discard memoized properties that depend on the changed attribute.
+
+        Visibility of a group also affects the descendants, and the bbox also
+        affects the ancestors and the spatial index of the document.
+        """
+        names = _DEPENDENTS[key]
+        layers = [self]
+        if key == 'visible' and self.is_group():
+            layers.extend(self.descendants())
+        for layer in layers:
+            for name in names:
+                if hasattr(layer, name):
+                    delattr(layer, name)
+        if '_bbox' in names:
+            _invalidate_bbox(self)
+
     def __repr__(self):
         has_size = self.width > 0 and self.height > 0
         return '%s(%r%s%s%s%s)' % (
@@ -528,11 +589,19 @@ class GroupMixin(object):
         return self._layers.__getitem__(key)
 
     def __setitem__(self, key, value):
+        self._invalidate_index()
         return self._layers.__setitem__(key, value)
 
     def __delitem__(self, key):
+        self._invalidate_index()
         return self._layers.__delitem__(key)
 
+    def _invalidate_index(self):
+        psd = self if self.parent is None else self._psd
+        if psd is not None:
+            psd.index.invalidate()
+        _invalidate_bbox(self)
+
     @deprecated
     def compose(
         self,
@@ -573,14 +642,7 @@ class GroupMixin(object):
 
         :param include_clip: include clipping layers.
         """
-        for layer in self:
-            yield layer
-            if layer.is_group():
-                for child in layer.descendants(include_clip):
-                    yield child
-            if include_clip and hasattr(layer, 'clip_layers'):
-                for clip_layer in layer.clip_layers:
-                    yield clip_layer
+        return _iter_descendants(self, include_clip)
 
 
 class Group(GroupMixin, Layer):
@@ -605,6 +667,8 @@ class Group(GroupMixin, Layer):
         """
         def _get_bbox(layer, **kwargs):
             if layer.is_group():
+                if not include_invisible and not isinstance(layer, Artboard):
+                    return layer.bbox
                 return Group.extract_bbox(layer, **kwargs)
             else:
                 return layer.bbox
@@ -648,6 +712,7 @@ class Group(GroupMixin, Layer):
         setting = self._setting
         if setting:
             setting.blend_mode = _value
+        self._changed('blend_mode')
 
     def composite(
         self,
@@ -655,7 +720,9 @@ class Group(GroupMixin, Layer):
         force=False,
         color=1.0,
         alpha=0.0,
-        layer_filter=None
+        layer_filter=None,
+        tile_size=None,
+        workers=None,
     ):
         """
         Composite layer and masks (mask, vector mask, and clipping layers).
@@ -670,11 +737,26 @@ class Group(GroupMixin, Layer):
         :param layer_filter: Callable that takes a layer as argument and
             returns whether if the layer is composited. Default is
             :py:func:`~psd_tools.api.layers.PixelLayer.is_visible`.
+        :param tile_size: Tile size in pixels, or a tuple of (width,
+            height). When given, the image is composited tile by tile to
+            bound memory usage. See
+            :py:func:`~psd_tools.composite.composite_tiles`.
+        :param workers: Number of threads to composite tiles in parallel.
+            The default tile size is 512 pixels when `tile_size` is not
+            given.
         :return: :py:class:`PIL.Image`.
         """
         from psd_tools.composite import composite_pil
         return composite_pil(
-            self, color, alpha, viewport, layer_filter, force, as_layer=True
+            self,
+            color,
+            alpha,
+            viewport,
+            layer_filter,
+            force,
+            as_layer=True,
+            tile_size=tile_size,
+            workers=workers
         )
 
 
@@ -958,3 +1040,14 @@ class FillLayer(Layer):
     @property
     def bottom(self):
         return self._record.bottom or self._psd.height
+
+
+def _invalidate_bbox(layer):
+    """Discard the cached bbox of the layer and the ancestors."""
+    while layer is not None:
+        if hasattr(layer, '_bbox'):
+            del layer._bbox
+        root, layer = layer, layer.parent
+    spatial_index = getattr(root, '_spatial_index', None)
+    if spatial_index is not None:
+        spatial_index.invalidate()
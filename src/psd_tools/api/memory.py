@@ -0,0 +1,335 @@
+"""
+Memory accounting module.
+
+:py:func:`memory_report` measures the bytes that an open document holds:
+the compressed channel and merged image data, the decoded and not yet
+decoded tagged blocks, and the decoded channel cache, broken down per layer.
+Data read with `lazy=True` stays in the file and is not counted, and data
+read with `mmap=True` is counted separately in
+:py:attr:`MemoryReport.mapped` because the pages belong to the shared page
+cache.
+
+:py:attr:`~psd_tools.api.psd_image.PSDImage.memory_limit` sets a hard cap on
+the decode and composite operations of a document. The channel cache never
+grows over the limit and is trimmed to make room for an operation, and an
+operation whose estimated working memory alone exceeds the limit raises
+:py:class:`MemoryLimitError` before decoding or allocating pixels.
+
+Example::
+
+    psd = PSDImage.open('example.psd')
+    report = psd.memory_report()
+    print(report.total)
+    for item in sorted(report.layers, key=lambda x: -x.total)[:10]:
+        print(item.layer.name, item.channels, item.tagged_blocks, item.cache)
+
+    psd.memory_limit = 512 * 1024 * 1024
+    try:
+        image = psd.composite()
+    except MemoryLimitError:
+        image = psd.composite(tile_size=1024)
+"""
+from __future__ import absolute_import, unicode_literals
+import attr
+import enum
+import logging
+import sys
+
+from psd_tools.constants import Tag
+from psd_tools.api.index import LINKED_LAYER_KEYS, PATTERN_KEYS
+
+logger = logging.getLogger(__name__)
+
+FILTER_EFFECTS_KEYS = (
+    Tag.FILTER_EFFECTS1, Tag.FILTER_EFFECTS2, Tag.FILTER_EFFECTS3
+)
+# Layer records and their channels are accounted per layer.
+_LAYER_KEYS = (Tag.LAYER, Tag.LAYER_16, Tag.LAYER_32)
+
+
+class MemoryLimitError(MemoryError):
+    """
+    Raised when a decode or composite operation would exceed
+    :py:attr:`~psd_tools.api.psd_image.PSDImage.memory_limit`.
+    """
+
+
+@attr.s(repr=False, frozen=True, slots=True)
+class LayerMemory(object):
+    """
+    Bytes held by a layer.
+
+    .. py:attribute:: layer
+
+        See :py:class:`~psd_tools.api.layers.Layer`.
+
+    .. py:attribute:: channels
+
+        Compressed channel data in memory, and raw pixels of the channels
+        set with `deferred` flag that are not compressed yet.
+
+    .. py:attribute:: tagged_blocks
+
+        Decoded tagged blocks, and raw bytes of the deferred blocks.
+
+    .. py:attribute:: cache
+
+        Decompressed channels of the layer in the channel cache.
+
+    .. py:attribute:: mapped
+
+        Channel data in a memory-mapped file.
+    """
+    layer = attr.ib()
+    channels = attr.ib(default=0, type=int)
+    tagged_blocks = attr.ib(default=0, type=int)
+    cache = attr.ib(default=0, type=int)
+    mapped = attr.ib(default=0, type=int)
+
+    @property
+    def total(self):
+        """Total bytes held by the layer, excluding mapped data."""
+        return self.channels + self.tagged_blocks + self.cache
+
+    def __repr__(self):
+        return '%s(%r total=%d)' % (
+            self.__class__.__name__, self.layer, self.total
+        )
+
+
+@attr.s(repr=False, frozen=True, slots=True)
+class MemoryReport(object):
+    """
+    Bytes held by a document.
+
+    .. py:attribute:: image_data
+
+        Compressed merged image data in memory.
+
+    .. py:attribute:: image_resources
+
+        Image resources, including the thumbnail.
+
+    .. py:attribute:: patterns
+
+        Pattern tagged blocks of the document.
+
+    .. py:attribute:: linked_layers
+
+        Linked layer tagged blocks of the document, i.e., embedded smart
+        object data.
+
+    .. py:attribute:: filter_effects
+
+        Filter effects tagged blocks of the document.
+
+    .. py:attribute:: tagged_blocks
+
+        Other tagged blocks of the document.
+
+    .. py:attribute:: cache
+
+        Decompressed channels in the channel cache. See
+        :py:attr:`~psd_tools.api.psd_image.PSDImage.cache`.
+
+    .. py:attribute:: mapped
+
+        Channel and merged image data in a memory-mapped file, which is not
+        included in :py:attr:`total`.
+
+    .. py:attribute:: layers
+
+        `list` of :py:class:`LayerMemory` in the order of
+        :py:meth:`~psd_tools.api.psd_image.PSDImage.descendants`.
+    """
+    image_data = attr.ib(default=0, type=int)
+    image_resources = attr.ib(default=0, type=int)
+    patterns = attr.ib(default=0, type=int)
+    linked_layers = attr.ib(default=0, type=int)
+    filter_effects = attr.ib(default=0, type=int)
+    tagged_blocks = attr.ib(default=0, type=int)
+    cache = attr.ib(default=0, type=int)
+    mapped = attr.ib(default=0, type=int)
+    layers = attr.ib(factory=list)
+
+    @property
+    def total(self):
+        """
+        Total bytes held by the document, excluding mapped data. The cache
+        of the layers is counted once in :py:attr:`cache`.
+        """
+        return (
+            self.image_data + self.image_resources + self.patterns +
+            self.linked_layers + self.filter_effects + self.tagged_blocks +
+            self.cache +
+            sum(item.channels + item.tagged_blocks for item in self.layers)
+        )
+
+    def __repr__(self):
+        return '%s(total=%d, layers=%d, cache=%d, mapped=%d)' % (
+            self.__class__.__name__, self.total, len(self.layers), self.cache,
+            self.mapped
+        )
+
+
+def memory_report(psd):
+    """
+    Measure the bytes held by the document.
+
+    Sizes of decoded objects are the sum of :py:func:`sys.getsizeof` of the
+    reachable objects, and the sizes of NumPy arrays are their buffer sizes.
+
+    :param psd: :py:class:`~psd_tools.api.psd_image.PSDImage`.
+    :return: :py:class:`MemoryReport`
+    """
+    cached = {}
+    for channel_data, _, nbytes in psd.cache.entries():
+        key = id(channel_data)
+        cached[key] = cached.get(key, 0) + nbytes
+
+    seen = set()
+    layers = []
+    mapped = 0
+    for layer in psd.descendants():
+        channels, layer_mapped, cache = 0, 0, 0
+        for channel_data in layer._channels or ():
+            held, in_map = _data_size(channel_data)
+            channels += held
+            layer_mapped += in_map
+            cache += cached.get(id(channel_data), 0)
+        tagged_blocks = 0
+        if layer._record is not None:
+            tagged_blocks = getsizeof(layer._record.tagged_blocks, seen)
+        mapped += layer_mapped
+        layers.append(
+            LayerMemory(layer, channels, tagged_blocks, cache, layer_mapped)
+        )
+
+    image_data, image_mapped = _data_size(psd._record.image_data)
+    sizes = dict.fromkeys(
+        ('patterns', 'linked_layers', 'filter_effects', 'tagged_blocks'), 0
+    )
+    blocks = psd._record.layer_and_mask_information.tagged_blocks
+    for key, block in (blocks or {}).items():
+        if key in _LAYER_KEYS:
+            continue
+        elif key in PATTERN_KEYS:
+            name = 'patterns'
+        elif key in LINKED_LAYER_KEYS:
+            name = 'linked_layers'
+        elif key in FILTER_EFFECTS_KEYS:
+            name = 'filter_effects'
+        else:
+            name = 'tagged_blocks'
+        sizes[name] += getsizeof(block, seen)
+
+    return MemoryReport(
+        image_data=image_data,
+        image_resources=getsizeof(psd._record.image_resources, seen),
+        cache=psd.cache.size,
+        mapped=mapped + image_mapped,
+        layers=layers,
+        **sizes
+    )
+
+
+def check_memory(psd, nbytes, operation):
+    """
+    Make room for `nbytes` of working memory within the memory limit of the
+    document.
+
+    Least recently used entries of the channel cache are evicted so that
+    the cache and the operation fit in the limit together.
+
+    :param psd: :py:class:`~psd_tools.api.psd_image.PSDImage`.
+    :param nbytes: estimated bytes that the operation allocates.
+    :param operation: name of the operation for the error message.
+    :raise MemoryLimitError: if the operation alone exceeds the limit.
+    """
+    limit = getattr(psd, 'memory_limit', None)
+    if limit is None:
+        return
+    nbytes = int(nbytes)
+    if nbytes > limit:
+        raise MemoryLimitError(
+            '%s requires %d bytes, over the limit of %d bytes' %
+            (operation, nbytes, limit)
+        )
+    psd.cache.shrink(limit - nbytes)
+
+
+def estimate_decode(width, height, channels, depth):
+    """
+    Estimate bytes to decode channels into a float array.
+
+    A channel is decompressed to `depth` bits per pixel, converted to 32-bit
+    floats, and stacked with the others.
+    """
+    return width * height * channels * (depth / 8. + 8)
+
+
+def estimate_composite(width, height, channels):
+    """
+    Estimate bytes to composite a viewport.
+
+    The compositor keeps the backdrop, the blending buffers, and the source
+    of a layer in 32-bit float arrays of the color channels and of the
+    shape and alpha.
+    """
+    return width * height * 4 * (6 * channels + 8)
+
+
+def getsizeof(obj, seen=None):
+    """
+    Get the total size of `obj` and the objects reachable from it through
+    attrs fields and containers. Objects in `seen` are not counted again.
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if obj is None or id(obj) in seen or isinstance(
+            obj, (enum.Enum, type)
+        ):
+            continue
+        seen.add(id(obj))
+        if hasattr(obj, 'nbytes') and hasattr(obj, 'base'):
+            # NumPy array, counted only when it owns the buffer.
+            size += sys.getsizeof(obj)
+            if obj.base is None:
+                size += obj.nbytes
+            continue
+        size += sys.getsizeof(obj)
+        if isinstance(obj, (bytes, bytearray, memoryview, str)):
+            continue
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif attr.has(obj.__class__):
+            stack.extend(
+                getattr(obj, field.name, None)
+                for field in attr.fields(obj.__class__)
+            )
+    return size
+
+
+def _data_size(element):
+    """Get `(held, mapped)` bytes of channel or image data."""
+    held, mapped = 0, 0
+    raw = element._raw
+    if raw is not None:
+        # Raw pixels of a channel, or a list of channels of the image.
+        if isinstance(raw[0], (list, tuple)):
+            held += sum(len(value) for value in raw[0])
+        else:
+            held += len(raw[0])
+    data = element._data
+    if isinstance(data, memoryview):
+        mapped += data.nbytes
+    elif isinstance(data, (bytes, bytearray)):
+        held += len(data)
+    return held, mapped
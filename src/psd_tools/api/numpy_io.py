@@ -1,7 +1,13 @@
 import numpy as np
 import logging
 
-from psd_tools.constants import ChannelID, Tag, ColorMode, Resource
+from psd_tools.compression import decompress_rows
+from psd_tools.constants import (
+    ChannelID, Compression, Tag, ColorMode, Resource
+)
+from psd_tools.psd.source import resolve
+from psd_tools.api.memory import check_memory, estimate_decode
+from psd_tools.api.scheduler import decode_channels, decode_channel_rows
 
 logger = logging.getLogger(__name__)
 
@@ -19,27 +25,63 @@ EXPECTED_CHANNELS = {
 
 def get_array(layer, channel, **kwargs):
     if layer.kind == 'psdimage':
-        return get_image_data(layer, channel)
+        return get_image_data(layer, channel, kwargs.get('viewport'))
     else:
         return get_layer_data(layer, channel, **kwargs)
     return None
 
 
-def get_image_data(psd, channel):
+def get_image_data(psd, channel, viewport=None):
+    """
+    Get image data.
+
+    When `viewport` is given, the returned array covers the intersection of
+    the viewport and the canvas, and only the rows in the intersection are
+    decoded for RLE and raw data.
+    """
+    bbox = psd.viewbox
+    region = bbox if viewport is None else _intersect(viewport, bbox)
+    height, width = region[3] - region[1], region[2] - region[0]
     if (channel == 'mask'
         ) or (channel == 'shape' and not has_transparency(psd)):
-        return np.ones((psd.height, psd.width, 1), dtype=np.float32)
+        return np.ones((height, width, 1), dtype=np.float32)
 
     lut = None
     if psd.color_mode == ColorMode.INDEXED:
         lut = np.frombuffer(psd._record.color_mode_data.value, np.uint8)
         lut = lut.reshape((3, -1)).transpose()
-    data = psd._record.image_data.get_data(psd._record.header, False)
+    full = region in (bbox, (0, 0, 0, 0)) or psd.depth < 8 or (
+        psd._record.image_data.compression not in
+        (Compression.RAW, Compression.RLE)
+    )
+    check_memory(
+        psd,
+        estimate_decode(
+            psd.width, psd.height if full else height, psd.channels,
+            psd.depth
+        ), 'Decoding image data'
+    )
+    if full:
+        if psd.scheduler is not None:
+            data = psd.scheduler.decode_image_data(
+                psd._record.image_data, psd._record.header, False
+            )
+        else:
+            data = psd._record.image_data.get_data(psd._record.header, False)
+        top, bottom = 0, psd.height
+    else:
+        top, bottom = region[1] - bbox[1], region[3] - bbox[1]
+        data = _get_image_rows(psd, top, bottom)
     data = _parse_array(data, psd.depth, lut=lut)
     if lut is not None:
-        data = data.reshape((psd.height, psd.width, -1))
+        data = data.reshape((bottom - top, psd.width, -1))
     else:
-        data = data.reshape((-1, psd.height, psd.width)).transpose((1, 2, 0))
+        data = data.reshape((-1, bottom - top, psd.width)).transpose(
+            (1, 2, 0)
+        )
+    if region != bbox:
+        data = data[region[1] - bbox[1] - top:region[3] - bbox[1] - top,
+                    region[0] - bbox[0]:region[2] - bbox[0]]
     data = _remove_background(data, psd)
 
     if channel == 'shape':
@@ -53,17 +95,56 @@ def get_image_data(psd, channel):
     return data
 
 
-def get_layer_data(layer, channel, real_mask=True):
-    def _find_channel(layer, width, height, condition):
-        depth, version = layer._psd.depth, layer._psd.version
-        iterator = zip(layer._record.channel_info, layer._channels)
-        channels = [
-            _parse_array(data.get_data(width, height, depth, version), depth)
-            for info, data in iterator
-            if condition(info) and len(data.data) > 0
-        ]
+def _get_image_rows(psd, top, bottom):
+    header = psd._record.header
+    image_data = psd._record.image_data
+    data = resolve(image_data.data)
+    return b''.join(
+        decompress_rows(
+            data, image_data.compression, header.width,
+            header.height * header.channels, header.depth, header.version,
+            index * header.height + top, index * header.height + bottom
+        ) for index in range(header.channels)
+    )
+
+
+def get_layer_data(layer, channel, real_mask=True, viewport=None):
+    """
+    Get layer data.
+
+    When `viewport` is given, only the rows and columns of the channels that
+    intersect the viewport are decoded, and the returned array covers the
+    intersection of the viewport and the channel bbox.
+    """
+    def _find_channel(layer, bbox, condition):
+        depth = layer._psd.depth
+        width, height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+        tasks = get_channel_tasks(layer, width, height, condition)
+        region = bbox if viewport is None else _intersect(viewport, bbox)
+        check_memory(
+            layer._psd,
+            estimate_decode(width, region[3] - region[1], len(tasks), depth),
+            'Decoding %r' % layer
+        )
+        if region == bbox:
+            decoded = decode_channels(layer._psd, tasks)
+        elif region == (0, 0, 0, 0):
+            if not tasks:
+                return None
+            expected_channels = EXPECTED_CHANNELS.get(layer._psd.color_mode)
+            return np.zeros((0, 0, min(len(tasks), expected_channels)),
+                            dtype=np.float32)
+        else:
+            decoded = decode_channel_rows(
+                layer._psd, tasks, region[1] - bbox[1], region[3] - bbox[1]
+            )
+        channels = [_parse_array(data, depth) for data in decoded]
         if len(channels) and channels[0].size > 0:
-            result = np.stack(channels, axis=1).reshape((height, width, -1))
+            result = np.stack(channels, axis=1).reshape(
+                (region[3] - region[1], width, -1)
+            )
+            if region[0] != bbox[0] or region[2] != bbox[2]:
+                result = result[:, region[0] - bbox[0]:region[2] - bbox[0]]
             expected_channels = EXPECTED_CHANNELS.get(layer._psd.color_mode)
             if result.shape[2] > expected_channels:
                 logger.debug('Extra channel found')
@@ -72,13 +153,10 @@ def get_layer_data(layer, channel, real_mask=True):
         return None
 
     if channel == 'color':
-        return _find_channel(
-            layer, layer.width, layer.height, lambda x: x.id >= 0
-        )
+        return _find_channel(layer, layer.bbox, lambda x: x.id >= 0)
     elif channel == 'shape':
         return _find_channel(
-            layer, layer.width, layer.height,
-            lambda x: x.id == ChannelID.TRANSPARENCY_MASK
+            layer, layer.bbox, lambda x: x.id == ChannelID.TRANSPARENCY_MASK
         )
     elif channel == 'mask':
         if layer.mask._has_real() and real_mask:
@@ -86,22 +164,27 @@ def get_layer_data(layer, channel, real_mask=True):
         else:
             channel_id = ChannelID.USER_LAYER_MASK
         return _find_channel(
-            layer, layer.mask.width, layer.mask.height,
-            lambda x: x.id == channel_id
+            layer, layer.mask.bbox, lambda x: x.id == channel_id
         )
 
-    color = _find_channel(
-        layer, layer.width, layer.height, lambda x: x.id >= 0
-    )
+    color = _find_channel(layer, layer.bbox, lambda x: x.id >= 0)
     shape = _find_channel(
-        layer, layer.width, layer.height,
-        lambda x: x.id == ChannelID.TRANSPARENCY_MASK
+        layer, layer.bbox, lambda x: x.id == ChannelID.TRANSPARENCY_MASK
     )
     if shape is None:
         return color
     return np.concatenate([color, shape], axis=2)
 
 
+def get_channel_tasks(layer, width, height, condition):
+    """Get decode tasks of the layer channels that satisfy the condition."""
+    depth, version = layer._psd.depth, layer._psd.version
+    iterator = zip(layer._record.channel_info, layer._channels)
+    return [(data, width, height, depth, version)
+            for info, data in iterator
+            if condition(info) and len(data.data) > 0]
+
+
 def get_pattern(pattern):
     """Get pattern array."""
     height, width = pattern.data.rectangle[2], pattern.data.rectangle[3]
@@ -164,3 +247,12 @@ def _remove_background(data, psd):
         color[a > 0] = (color + alpha - 1)[a > 0] / a[a > 0]
         data[:, :, :3] = color
     return data
+
+
+def _intersect(a, b):
+    inter = (
+        max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])
+    )
+    if inter[0] >= inter[2] or inter[1] >= inter[3]:
+        return (0, 0, 0, 0)
+    return inter
@@ -6,7 +6,11 @@ import logging
 import io
 
 from psd_tools.constants import ColorMode, ChannelID, Resource
-from .numpy_io import has_transparency, get_transparency_index
+from psd_tools.api.memory import check_memory, estimate_decode
+from psd_tools.api.scheduler import decode_channels, prefetch_channels
+from .numpy_io import (
+    has_transparency, get_transparency_index, get_channel_tasks
+)
 
 logger = logging.getLogger(__name__)
 
@@ -49,8 +53,11 @@ def get_pil_channels(pil_mode):
     }.get(pil_mode, 3)
 
 
-def convert_image_data_to_pil(psd, channel, apply_icc):
+def convert_image_data_to_pil(psd, channel, apply_icc, step=1):
     """Convert ImageData to PIL Image.
+
+    :param step: sampling interval in pixels. When greater than 1, only every
+        `step`-th row and column of the image data is decoded.
     """
     from PIL import Image
 
@@ -64,10 +71,27 @@ def convert_image_data_to_pil(psd, channel, apply_icc):
         if channel >= psd.channels:
             return None
 
+    check_memory(
+        psd,
+        estimate_decode(
+            -(-psd.width // step), -(-psd.height // step), psd.channels,
+            psd.depth
+        ), 'Decoding image data'
+    )
+
     alpha = None
     icc = None
-    channel_data = psd._record.image_data.get_data(psd._record.header)
-    size = (psd.width, psd.height)
+    if step > 1:
+        channel_data = psd._record.image_data.get_sampled_data(
+            psd._record.header, step
+        )
+    elif psd.scheduler is not None:
+        channel_data = psd.scheduler.decode_image_data(
+            psd._record.image_data, psd._record.header
+        )
+    else:
+        channel_data = psd._record.image_data.get_data(psd._record.header)
+    size = (-(-psd.width // step), -(-psd.height // step))
     if channel is None:
         channels = [_create_image(size, c, psd.depth) for c in channel_data]
 
@@ -97,11 +121,24 @@ def convert_image_data_to_pil(psd, channel, apply_icc):
 
 def convert_layer_to_pil(layer, channel, apply_icc):
     """Convert Layer to PIL Image."""
+    check_memory(
+        layer._psd,
+        estimate_decode(
+            layer.width, layer.height,
+            len(layer._channels or ()) if channel is None else 1,
+            layer._psd.depth
+        ), 'Decoding %r' % layer
+    )
+
     alpha = None
     icc = None
     if channel is None:
-        image = _merge_channels(layer)
-        alpha = _get_channel(layer, ChannelID.TRANSPARENCY_MASK)
+        tasks = get_channel_tasks(
+            layer, layer.width, layer.height, lambda x: x.id >= -1
+        )
+        with prefetch_channels(layer._psd, [tasks]):
+            image = _merge_channels(layer)
+            alpha = _get_channel(layer, ChannelID.TRANSPARENCY_MASK)
         if apply_icc and (Resource.ICC_PROFILE in layer._psd.image_resources):
             icc = layer._psd.image_resources.get_data(Resource.ICC_PROFILE)
     else:
@@ -197,7 +234,10 @@ def _get_channel(layer, channel):
     channel_data = layer._channels[index[channel]]
     if width == 0 or height == 0 or len(channel_data.data) == 0:
         return None
-    channel = channel_data.get_data(width, height, depth, layer._psd.version)
+    channel = decode_channels(
+        layer._psd,
+        [(channel_data, width, height, depth, layer._psd.version)],
+    )[0]
     return _create_image((width, height), channel, depth)
 
 
@@ -0,0 +1,96 @@
+"""
+Preview module.
+
+Previews are downscaled images of a document made from the cheapest source
+that meets the requested size, in the following order:
+
+1. the embedded thumbnail resource;
+2. the merged image data, decoding only every N-th row and column;
+3. the composite of the layers.
+
+Example::
+
+    from psd_tools.api.preview import preview
+
+    image = preview('large.psb', 256)
+    image.save('gallery.png')
+"""
+from __future__ import absolute_import, unicode_literals
+import logging
+
+from psd_tools.api.probe import probe
+
+logger = logging.getLogger(__name__)
+
+#: Factor of the sampled size to the preview size, so that resizing the
+#: sampled image smooths out aliasing.
+OVERSAMPLING = 2
+
+
+def preview(fp, size=256, apply_icc=False):
+    """
+    Create a preview image of a PSD/PSB file.
+
+    The file is probed for the embedded thumbnail first, and the document is
+    opened lazily only when the thumbnail is smaller than `size`, so that
+    pixels are read from the file only for the sampled rows.
+
+    :param fp: filename or file-like object.
+    :param size: maximum width and height of the preview.
+    :param apply_icc: Whether to apply ICC profile conversion to sRGB.
+    :return: :py:class:`PIL.Image`
+    """
+    position = fp.tell() if hasattr(fp, 'read') else None
+    info = probe(fp)
+    image = _get_thumbnail(info, size)
+    if image is not None:
+        logger.debug('Preview from the thumbnail')
+        return image
+
+    from psd_tools.api.psd_image import PSDImage
+    if position is not None:
+        fp.seek(position)
+    return get_preview(PSDImage.open(fp, lazy=True), size, apply_icc)
+
+
+def get_preview(psd, size=256, apply_icc=False):
+    """
+    Create a preview image of the document.
+
+    See :py:meth:`~psd_tools.api.psd_image.PSDImage.preview`.
+    """
+    from .pil_io import convert_image_data_to_pil
+
+    image = _get_thumbnail(psd, size)
+    if image is not None:
+        logger.debug('Preview from the thumbnail')
+        return image
+
+    image = None
+    if psd.has_preview():
+        target = min(size * OVERSAMPLING, max(psd.width, psd.height))
+        step = max(1, max(psd.width, psd.height) // max(target, 1))
+        logger.debug('Preview from the image data, step=%d' % step)
+        image = convert_image_data_to_pil(psd, None, apply_icc, step=step)
+    if image is None:
+        logger.debug('Preview from the composite')
+        image = psd.composite()
+    return _fit(image, size)
+
+
+def _get_thumbnail(document, size):
+    """Get the thumbnail if it is at least as large as the preview."""
+    if not document.has_thumbnail():
+        return None
+    target = min(size, max(document.width, document.height))
+    image = document.thumbnail()
+    if image is None or max(image.size) < target:
+        return None
+    return _fit(image, size)
+
+
+def _fit(image, size):
+    if max(image.size) > size:
+        image = image.copy()
+        image.thumbnail((size, size))
+    return image
@@ -0,0 +1,203 @@
+"""
+Probe module.
+
+:py:func:`probe` reads the summary of a PSD/PSB file, such as the size,
+depth, color mode, and layer count, without parsing layer records or pixel
+data. Only the file header, image resources, and the length markers of the
+other sections are read, so that probing takes the same time regardless of
+the file size.
+
+Example::
+
+    from psd_tools import probe
+
+    info = probe('example.psd')
+    print(info.size, info.depth, info.color_mode, info.layer_count)
+    if info.has_thumbnail():
+        info.thumbnail().save('thumbnail.png')
+"""
+from __future__ import absolute_import, unicode_literals
+import attr
+import logging
+
+from psd_tools.constants import Compression, Resource, Tag
+from psd_tools.psd.header import FileHeader
+from psd_tools.psd.image_resources import ImageResources
+from psd_tools.psd.tagged_blocks import TaggedBlock
+from psd_tools.utils import is_readable, read_fmt, read_padding
+
+logger = logging.getLogger(__name__)
+
+
+def probe(fp, encoding='macroman'):
+    """
+    Read the summary of a PSD/PSB file.
+
+    :param fp: filename or file-like object.
+    :param encoding: charset encoding of the pascal string within the file,
+        default 'macroman'.
+    :return: :py:class:`ProbeResult`
+    """
+    if hasattr(fp, 'read'):
+        return ProbeResult.read(fp, encoding)
+    with open(fp, 'rb') as f:
+        return ProbeResult.read(f, encoding)
+
+
+@attr.s(repr=False, frozen=True, slots=True)
+class ProbeResult(object):
+    """
+    Summary of a PSD/PSB file.
+
+    .. py:attribute:: header
+
+        See :py:class:`~psd_tools.psd.header.FileHeader`.
+
+    .. py:attribute:: image_resources
+
+        See :py:class:`~psd_tools.psd.image_resources.ImageResources`.
+
+    .. py:attribute:: layer_count
+
+        Number of layer records, including the records that mark the end of
+        groups.
+
+    .. py:attribute:: compression
+
+        Compression of the merged image data, see
+        :py:class:`~psd_tools.constants.Compression`. `None` when the file
+        has no merged image data.
+
+    .. py:attribute:: image_data_offset
+
+        File offset of the merged image data section.
+    """
+    header = attr.ib()
+    image_resources = attr.ib()
+    layer_count = attr.ib(default=0, type=int)
+    compression = attr.ib(default=None)
+    image_data_offset = attr.ib(default=None)
+
+    @classmethod
+    def read(cls, fp, encoding='macroman'):
+        header = FileHeader.read(fp)
+        length = read_fmt('I', fp)[0]
+        fp.seek(length, 1)  # Color mode data.
+        image_resources = ImageResources.read(fp, encoding)
+
+        length = read_fmt(('I', 'Q')[header.version - 1], fp)[0]
+        end_pos = fp.tell() + length
+        layer_count = 0
+        if length > 0:
+            layer_count = _read_layer_count(fp, end_pos, header.version)
+        fp.seek(end_pos, 0)
+
+        compression = None
+        if is_readable(fp, 2):
+            compression = Compression(read_fmt('H', fp)[0])
+        return cls(header, image_resources, layer_count, compression, end_pos)
+
+    @property
+    def version(self):
+        """Document version. PSD files are 1, and PSB files are 2."""
+        return self.header.version
+
+    @property
+    def width(self):
+        """Document width."""
+        return self.header.width
+
+    @property
+    def height(self):
+        """Document height."""
+        return self.header.height
+
+    @property
+    def size(self):
+        """(width, height) tuple."""
+        return self.header.width, self.header.height
+
+    @property
+    def depth(self):
+        """Pixel depth bits."""
+        return self.header.depth
+
+    @property
+    def channels(self):
+        """Number of color channels."""
+        return self.header.channels
+
+    @property
+    def color_mode(self):
+        """See :py:class:`~psd_tools.constants.ColorMode`."""
+        return self.header.color_mode
+
+    def has_icc(self):
+        """True if the file has an embedded ICC profile."""
+        return Resource.ICC_PROFILE in self.image_resources
+
+    def has_thumbnail(self):
+        """True if the file has a thumbnail resource."""
+        return (
+            Resource.THUMBNAIL_RESOURCE in self.image_resources or
+            Resource.THUMBNAIL_RESOURCE_PS4 in self.image_resources
+        )
+
+    def thumbnail(self):
+        """
+        Returns a thumbnail image in PIL.Image. When the file does not
+        contain an embedded thumbnail image, returns None.
+        """
+        from .pil_io import convert_thumbnail_to_pil
+        for key in (
+            Resource.THUMBNAIL_RESOURCE, Resource.THUMBNAIL_RESOURCE_PS4
+        ):
+            if key in self.image_resources:
+                return convert_thumbnail_to_pil(
+                    self.image_resources.get_data(key)
+                )
+        return None
+
+    def __repr__(self):
+        return (
+            '%s(size=%dx%d, depth=%d, mode=%s, version=%d, layers=%d)' % (
+                self.__class__.__name__, self.width, self.height, self.depth,
+                self.color_mode.name, self.version, self.layer_count
+            )
+        )
+
+
+def _read_layer_count(fp, end_pos, version):
+    """
+    Read the layer count at the beginning of the layer info, or of the
+    16/32-bit layer info block in the global tagged blocks.
+    """
+    length = read_fmt(('I', 'Q')[version - 1], fp)[0]
+    if length > 0:
+        return abs(read_fmt('h', fp)[0])
+    if fp.tell() + 4 > end_pos:
+        return 0
+    # Global layer mask info, which is ignored when broken.
+    pos = fp.tell()
+    length = read_fmt('I', fp)[0]
+    if 0 < length < 13:
+        fp.seek(pos, 0)
+    else:
+        fp.seek(length, 1)
+
+    while fp.tell() + 12 <= end_pos:
+        signature, key = read_fmt('4s4s', fp)
+        if signature not in TaggedBlock._SIGNATURES:
+            logger.warning('Invalid signature (%r)' % (signature))
+            break
+        try:
+            key = Tag(key)
+        except ValueError:
+            pass
+        length = read_fmt(TaggedBlock._length_format(key, version), fp)[0]
+        if key in (Tag.LAYER_16, Tag.LAYER_32):
+            return abs(read_fmt('h', fp)[0]) if length >= 2 else 0
+        fp.seek(length, 1)
+        # Global tagged blocks align 4 bytes.
+        read_padding(fp, length, 4)
+    return 0
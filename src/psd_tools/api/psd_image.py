@@ -3,11 +3,17 @@ PSD Image module.
 """
 from __future__ import absolute_import, unicode_literals
 import logging
+import os
 
 from psd_tools.constants import (
     Clipping, Compression, ColorMode, SectionDivider, Resource, Tag
 )
 from psd_tools.psd import PSD, FileHeader, ImageData, ImageResources
+from psd_tools.psd.source import ByteRange, FileSource, MmapSource
+from psd_tools.profiling import span
+from psd_tools.api.cache import ChannelCache
+from psd_tools.api.memory import memory_report
+from psd_tools.api.index import LayerIndex, SpatialIndex
 from psd_tools.api.layers import (
     Artboard, Group, PixelLayer, ShapeLayer, SmartObjectLayer, TypeLayer,
     GroupMixin
@@ -40,6 +46,13 @@ class PSDImage(GroupMixin):
         self._record = data
         self._layers = []
         self._tagged_blocks = None
+        self._scheduler = None
+        self._cache = ChannelCache()
+        self._memory_limit = None
+        self._source = None
+        self._row_readers = None
+        self._index = LayerIndex(self)
+        self._spatial_index = SpatialIndex(self)
         self._init()
 
     @classmethod
@@ -88,22 +101,105 @@ class PSDImage(GroupMixin):
         )
 
     @classmethod
-    def open(cls, fp, **kwargs):
+    def open(cls, fp, lazy=False, mmap=False, cache_budget=0, **kwargs):
         """
         Open a PSD document.
 
         :param fp: filename or file-like object.
+        :param lazy: Boolean flag to defer loading of pixel data. When True,
+            channel and merged image data are read from the file on demand,
+            and tagged blocks such as descriptors and text data are decoded
+            at the first access. A file-like object must be kept open while
+            the document is used.
+        :param mmap: Boolean flag to memory-map the file. When True, channel
+            and merged image data are zero-copy `memoryview` slices of the
+            mapping. A file-like object must have `fileno()`. Call
+            :py:meth:`close` or use the document as a context manager to
+            unmap the file.
+        :param cache_budget: maximum byte size of decompressed channels kept
+            in :py:attr:`cache`, default 0 that disables the cache.
         :param encoding: charset encoding of the pascal string within the file,
             default 'macroman'. Some psd files need explicit encoding option.
         :return: A :py:class:`~psd_tools.api.psd_image.PSDImage` object.
-        """
-        if hasattr(fp, 'read'):
-            self = cls(PSD.read(fp, **kwargs))
-        else:
-            with open(fp, 'rb') as f:
-                self = cls(PSD.read(f, **kwargs))
+
+        Example::
+
+            psd = PSDImage.open('large.psb', lazy=True)
+            names = [layer.name for layer in psd.descendants()]
+
+            with PSDImage.open('large.psb', mmap=True) as psd:
+                image = psd.composite()
+        """
+        if mmap:
+            kwargs['source'] = MmapSource(fp)
+        elif lazy:
+            kwargs['source'] = FileSource(fp)
+        if lazy:
+            kwargs.setdefault('deferred', True)
+        with span('open', lazy=lazy, mmap=mmap):
+            if hasattr(fp, 'read'):
+                self = cls(PSD.read(fp, **kwargs))
+            else:
+                with open(fp, 'rb') as f:
+                    self = cls(PSD.read(f, **kwargs))
+        self._cache.budget = cache_budget
+        self._source = kwargs.get('source')
         return self
 
+    def close(self):
+        """
+        Release the memory-mapped file of the document opened with `mmap`
+        flag. Pixel data of the document is not accessible after closing.
+        """
+        source, self._source = self._source, None
+        if source is None or not hasattr(source, 'close'):
+            return
+        self._cache.clear()
+        for element in self._iter_data_elements():
+            if isinstance(element._data, memoryview):
+                element._data.release()
+        source.close()
+
+    def _detach(self):
+        """
+        Copy the data referenced in the source file into memory, and close
+        the source so that the file can be overwritten.
+        """
+        self._cache.clear()
+        for element in self._iter_data_elements():
+            data = element._data
+            if isinstance(data, (ByteRange, memoryview)):
+                element._data = bytes(data)
+                if isinstance(data, memoryview):
+                    data.release()
+        source, self._source = self._source, None
+        if hasattr(source, 'close'):
+            source.close()
+
+    def _iter_data_elements(self):
+        """Iterate over channel data of the layers and the image data."""
+        for _, channels in self._record._iter_layers():
+            for channel in channels:
+                yield channel
+        yield self._record.image_data
+
+    def _is_source(self, fp):
+        """True if `fp` is the file that the document reads data from."""
+        source_name = getattr(self._source, 'name', None)
+        name = getattr(fp, 'name', None) if hasattr(fp, 'write') else fp
+        if source_name is None or name is None:
+            return False
+        try:
+            return os.path.samefile(name, source_name)
+        except (OSError, TypeError, ValueError):
+            return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def save(self, fp, mode='wb', **kwargs):
         """
         Save the PSD file.
@@ -112,12 +208,24 @@ class PSDImage(GroupMixin):
         :param encoding: charset encoding of the pascal string within the file,
             default 'macroman'.
         :param mode: file open mode, default 'wb'.
-        """
-        if hasattr(fp, 'write'):
-            self._record.write(fp, **kwargs)
-        else:
-            with open(fp, mode) as f:
-                self._record.write(f, **kwargs)
+        :param workers: number of threads to compress channels set with
+            `deferred` flag, default is the number of CPUs. See
+            :py:meth:`~psd_tools.psd.PSD.compress_pending`.
+
+        When the document is opened with `lazy` or `mmap` flag and saved to
+        the same file, the data in the file is read into memory and the
+        source is closed before the file is truncated.
+        """
+        if self._source is not None and self._is_source(fp):
+            logger.debug('Read the source into memory to overwrite it')
+            self._detach()
+        with span('save') as stage:
+            if hasattr(fp, 'write'):
+                written = self._record.write(fp, **kwargs)
+            else:
+                with open(fp, mode) as f:
+                    written = self._record.write(f, **kwargs)
+            stage.set(nbytes=written)
 
     def topil(self, channel=None, apply_icc=False):
         """
@@ -179,6 +287,8 @@ class PSDImage(GroupMixin):
         alpha=0.0,
         layer_filter=None,
         ignore_preview=False,
+        tile_size=None,
+        workers=None,
     ):
         """
         Composite the PSD image.
@@ -195,12 +305,32 @@ class PSDImage(GroupMixin):
         :param layer_filter: Callable that takes a layer as argument and
             returns whether if the layer is composited. Default is
             :py:func:`~psd_tools.api.layers.PixelLayer.is_visible`.
+        :param tile_size: Tile size in pixels, or a tuple of (width,
+            height). When given, the image is composited tile by tile to
+            bound memory usage. See
+            :py:func:`~psd_tools.composite.composite_tiles`.
+        :param workers: Number of threads to composite tiles in parallel.
+            The default tile size is 512 pixels when `tile_size` is not
+            given.
         :return: :py:class:`PIL.Image`.
+
+        Example::
+
+            image = psd.composite(ignore_preview=True, tile_size=2048)
         """
         from psd_tools.composite import composite_pil
         if not (ignore_preview or force or layer_filter) and self.has_preview():
             return self.topil()
-        return composite_pil(self, color, alpha, viewport, layer_filter, force)
+        return composite_pil(
+            self,
+            color,
+            alpha,
+            viewport,
+            layer_filter,
+            force,
+            tile_size=tile_size,
+            workers=workers
+        )
 
     def is_visible(self):
         """
@@ -439,6 +569,156 @@ class PSDImage(GroupMixin):
         """
         return self._record.layer_and_mask_information.tagged_blocks
 
+    @property
+    def cache(self):
+        """
+        Cache of decompressed layer channels shared by :py:meth:`numpy`,
+        :py:meth:`topil`, and :py:meth:`composite` of the layers. The cache is
+        disabled by default; set `budget` to the maximum byte size to enable
+        it, or pass `cache_budget` to :py:meth:`open`.
+
+        :return: :py:class:`~psd_tools.api.cache.ChannelCache`
+
+        Example::
+
+            psd.cache.budget = 1024 * 1024 * 1024
+            image = psd.composite(layer_filter=lambda x: x.is_visible())
+            image = psd.composite(layer_filter=lambda x: x.kind == 'pixel')
+            print(psd.cache.hits, psd.cache.misses)
+        """
+        return self._cache
+
+    @property
+    def memory_limit(self):
+        """
+        Hard cap in bytes on the working memory of decode and composite
+        operations together with the channel cache, or `None` for no limit.
+        The cache never grows over the limit and is trimmed to make room for
+        an operation, and an operation that alone exceeds the limit raises
+        :py:class:`~psd_tools.api.memory.MemoryLimitError` before decoding or
+        allocating pixels. Composite tile by tile to stay within the limit.
+
+        Example::
+
+            from psd_tools.api.memory import MemoryLimitError
+
+            psd.memory_limit = 512 * 1024 * 1024
+            try:
+                image = psd.composite()
+            except MemoryLimitError:
+                image = psd.composite(tile_size=1024)
+        """
+        return self._memory_limit
+
+    @memory_limit.setter
+    def memory_limit(self, value):
+        if value is not None and value < 0:
+            raise ValueError('Invalid memory limit: %r' % (value, ))
+        self._memory_limit = value
+        self._cache.limit = value
+
+    def memory_report(self):
+        """
+        Report the bytes held by the document and each layer: compressed
+        channel and image data, tagged blocks such as patterns and linked
+        smart object data, and the channel cache.
+
+        :return: :py:class:`~psd_tools.api.memory.MemoryReport`
+
+        Example::
+
+            report = psd.memory_report()
+            if report.total > 1024 * 1024 * 1024:
+                psd.cache.clear()
+            largest = max(report.layers, key=lambda x: x.total)
+        """
+        return memory_report(self)
+
+    @property
+    def index(self):
+        """
+        Index of layers by id, name, and kind, and of patterns and linked
+        layers by id. Lookups are dict-based and do not walk the layer tree.
+
+        :return: :py:class:`~psd_tools.api.index.LayerIndex`
+
+        Example::
+
+            layer = psd.index.get(42)
+            layers = psd.index.find_by_name('Background')
+            groups = psd.index.find_by_kind('group')
+        """
+        return self._index
+
+    @property
+    def spatial_index(self):
+        """
+        Spatial index of the layer bboxes for culling and hit-testing.
+
+        :return: :py:class:`~psd_tools.api.index.SpatialIndex`
+
+        Example::
+
+            layers = psd.spatial_index.search((0, 0, 256, 256))
+            layers = psd.spatial_index.search_point(120, 80)
+        """
+        return self._spatial_index
+
+    def descendants(self, include_clip=True):
+        """
+        Return a generator to iterate over all descendant layers.
+
+        :param include_clip: include clipping layers.
+        """
+        if include_clip:
+            return iter(self._index)
+        return super(PSDImage, self).descendants(include_clip)
+
+    @property
+    def scheduler(self):
+        """
+        Decode scheduler that decompresses channels on a worker pool, used by
+        :py:meth:`numpy`, :py:meth:`topil`, and :py:meth:`composite` of the
+        document and its layers. Default is `None`, which decodes channels
+        sequentially.
+
+        :return: :py:class:`~psd_tools.api.scheduler.DecodeScheduler` or
+            `None`.
+
+        Example::
+
+            from psd_tools.api.scheduler import DecodeScheduler
+            psd.scheduler = DecodeScheduler(workers=8)
+            image = psd.composite(force=True)
+        """
+        return self._scheduler
+
+    @scheduler.setter
+    def scheduler(self, value):
+        self._scheduler = value
+
+    def preview(self, size=256, apply_icc=False):
+        """
+        Returns a downscaled image whose width and height are at most `size`.
+
+        The image is made from the embedded thumbnail when it is large
+        enough, otherwise from every N-th row and column of the merged image
+        data, and from the composite of the layers as the last resort. Open
+        the document with `lazy=True` so that only the sampled rows are read
+        from the file. See :py:mod:`psd_tools.api.preview`.
+
+        :param size: maximum width and height of the preview.
+        :param apply_icc: Whether to apply ICC profile conversion to sRGB.
+        :return: :py:class:`PIL.Image`
+
+        Example::
+
+            psd = PSDImage.open('large.psb', lazy=True)
+            psd.preview(256).save('gallery.png')
+        """
+        from .preview import get_preview
+        return get_preview(self, size, apply_icc)
+
     def has_thumbnail(self):
         """True if the PSDImage has a thumbnail resource."""
         return (
@@ -517,13 +797,7 @@ class PSDImage(GroupMixin):
 
     def _get_pattern(self, pattern_id):
         """Get pattern item by id."""
-        for key in (Tag.PATTERNS1, Tag.PATTERNS2, Tag.PATTERNS3):
-            if key in self.tagged_blocks:
-                data = self.tagged_blocks.get_data(key)
-                for pattern in data:
-                    if pattern.pattern_id == pattern_id:
-                        return pattern
-        return None
+        return self._index.get_pattern(pattern_id)
 
     def _init(self):
         """Initialize layer structure."""
@@ -0,0 +1,352 @@
+"""
+Decode scheduler module.
+
+The scheduler dispatches channel decompression to a worker pool. zlib and the
+Cython RLE codec release the GIL, so a thread pool decodes channels
+concurrently; a process pool is available for the pure-Python fallbacks.
+
+Example::
+
+    from psd_tools import PSDImage
+    from psd_tools.api.scheduler import DecodeScheduler
+
+    psd = PSDImage.open('example.psb')
+    psd.scheduler = DecodeScheduler(workers=8)
+    image = psd.composite(ignore_preview=True)
+"""
+from __future__ import absolute_import, unicode_literals
+import contextlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from psd_tools.compression import RowReader, decompress, decompress_rows
+from psd_tools.constants import Compression
+from psd_tools.psd.source import resolve
+from psd_tools.utils import be_array_from_bytes
+
+logger = logging.getLogger(__name__)
+_READERS_LOCK = threading.Lock()
+
+
+class DecodeScheduler(object):
+    """
+    Scheduler that decompresses channels on a worker pool.
+
+    A task is a tuple of `(channel_data, width, height, depth, version)`
+    where `channel_data` is
+    :py:class:`~psd_tools.psd.layer_and_mask.ChannelData`.
+
+    :param workers: number of workers, default is the number of CPUs.
+    :param processes: Boolean flag to use a process pool instead of threads.
+    :param window: maximum number of prefetched channels held at once.
+    """
+    def __init__(self, workers=None, processes=False, window=None):
+        self._workers = workers or os.cpu_count() or 1
+        self._processes = processes
+        self._window = window or 4 * self._workers
+        if processes:
+            from concurrent.futures import ProcessPoolExecutor as kls
+        else:
+            kls = ThreadPoolExecutor
+        self._executor = kls(max_workers=self._workers)
+        self._lock = threading.Lock()
+        self._queue = []
+        self._pending = {}
+        self._prefetching = False
+
+    @property
+    def workers(self):
+        """Number of workers."""
+        return self._workers
+
+    def submit(self, channel_data, width, height, depth, version=1):
+        """
+        Schedule decompression of a channel.
+
+        :return: :py:class:`concurrent.futures.Future` of the decompressed
+            bytes.
+        """
+        if self._processes:
+            data = resolve(channel_data.data)
+            return self._executor.submit(
+                decompress, bytes(data), channel_data.compression, width,
+                height, depth, version
+            )
+        return self._executor.submit(
+            channel_data.get_data, width, height, depth, version
+        )
+
+    def decode(self, tasks):
+        """
+        Decompress channels concurrently.
+
+        :param tasks: list of tasks.
+        :return: list of decompressed bytes in the order of tasks.
+        """
+        futures = [self._take(task) for task in tasks]
+        return [future.result() for future in futures]
+
+    def decode_image_data(self, image_data, header, split=True):
+        """
+        Decompress the merged image data, decoding RLE channels concurrently.
+
+        :param image_data: :py:class:`~psd_tools.psd.image_data.ImageData`.
+        :param header: :py:class:`~psd_tools.psd.header.FileHeader`.
+        :param split: Boolean flag to return a list of channels.
+        :return: `list` of bytes corresponding each channel, or bytes of all
+            the channels when `split` is False.
+        """
+        if image_data.compression != Compression.RLE or header.channels < 2:
+            return image_data.get_data(header, split)
+
+        data = memoryview(resolve(image_data.data))
+        count_size = (2, 4)[header.version - 1]
+        rows = header.height * header.channels
+        counts = be_array_from_bytes(
+            ('H', 'I')[header.version - 1],
+            data[:rows * count_size].tobytes()
+        )
+        offset = rows * count_size
+        futures = []
+        for index in range(header.channels):
+            start = index * header.height
+            end = start + header.height
+            length = sum(counts[start:end])
+            chunk = (
+                data[start * count_size:end * count_size].tobytes() +
+                data[offset:offset + length].tobytes()
+            )
+            offset += length
+            futures.append(
+                self._executor.submit(
+                    decompress, chunk, Compression.RLE, header.width,
+                    header.height, header.depth, header.version
+                )
+            )
+        channels = [future.result() for future in futures]
+        if split:
+            return channels
+        return b''.join(channels)
+
+    @contextlib.contextmanager
+    def prefetch(self, groups):
+        """
+        Context manager to decode tasks ahead of their use.
+
+        Groups of tasks are expected to be consumed by :py:meth:`decode` in
+        the given order. At most `window` channels are decoded ahead, and a
+        group left behind by the consumer is discarded. Nested calls are
+        ignored.
+
+        :param groups: iterable of task lists, typically one per layer.
+        """
+        with self._lock:
+            if self._prefetching:
+                nested = True
+            else:
+                nested = False
+                self._prefetching = True
+                self._queue = [
+                    (index, task) for index, tasks in enumerate(groups)
+                    for task in tasks
+                ]
+                self._queue.reverse()
+                self._fill()
+        try:
+            yield self
+        finally:
+            if not nested:
+                with self._lock:
+                    for _, future in self._pending.values():
+                        future.cancel()
+                    self._pending.clear()
+                    self._queue = []
+                    self._prefetching = False
+
+    def shutdown(self, wait=True):
+        """Shutdown the worker pool."""
+        self._executor.shutdown(wait=wait)
+
+    def _take(self, task):
+        key = _task_key(task)
+        with self._lock:
+            item = self._pending.pop(key, None)
+            if item is None:
+                return self.submit(*task)
+            group, future = item
+            for other in list(self._pending):
+                if self._pending[other][0] < group:
+                    self._pending.pop(other)[1].cancel()
+            self._fill()
+        return future
+
+    def _fill(self):
+        while self._queue and len(self._pending) < self._window:
+            group, task = self._queue.pop()
+            key = _task_key(task)
+            if key not in self._pending:
+                self._pending[key] = (group, self.submit(*task))
+
+
+def _task_key(task):
+    """Key of a task by the channel and the decode arguments."""
+    return (id(task[0]), ) + tuple(task[1:])
+
+
+def decode_channels(psd, tasks):
+    """
+    Decompress channel tasks with the cache and the scheduler of the document.
+
+    :param psd: :py:class:`~psd_tools.api.psd_image.PSDImage`.
+    :param tasks: list of tasks.
+    :return: list of decompressed bytes.
+    """
+    cache = getattr(psd, 'cache', None)
+    if cache is not None and cache.capacity > 0:
+        results = [cache.get(task[0], task[3]) for task in tasks]
+    else:
+        cache = None
+        results = [None] * len(tasks)
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        scheduler = getattr(psd, 'scheduler', None)
+        if scheduler is not None:
+            decoded = scheduler.decode([tasks[i] for i in missing])
+        else:
+            decoded = [tasks[i][0].get_data(*tasks[i][1:]) for i in missing]
+        for i, data in zip(missing, decoded):
+            results[i] = data
+            if cache is not None:
+                cache.put(tasks[i][0], tasks[i][3], data)
+    return results
+
+
+def decode_channel_rows(psd, tasks, start, stop):
+    """
+    Decompress a range of rows of channel tasks.
+
+    Cached channels are sliced. RLE and raw channels are decoded only for the
+    requested rows. ZIP channels, which cannot be decoded from the middle,
+    are decoded entirely and cached when they fit in the cache budget.
+    Otherwise, they are inflated up to the last requested row, or read
+    forward band by band within :py:func:`stream_channel_rows`.
+
+    :param psd: :py:class:`~psd_tools.api.psd_image.PSDImage`.
+    :param tasks: list of tasks.
+    :param start: first row to decode.
+    :param stop: row to stop decoding at.
+    :return: list of decompressed bytes.
+    """
+    cache = getattr(psd, 'cache', None)
+    if cache is not None and cache.capacity <= 0:
+        cache = None
+    readers = getattr(psd, '_row_readers', None)
+    results = []
+    for task in tasks:
+        channel_data, width, height, depth, version = task
+        data = None
+        if cache is not None:
+            if (channel_data, depth) in cache:
+                data = cache.get(channel_data, depth)
+            elif channel_data.compression not in (
+                Compression.RAW, Compression.RLE
+            ) and width * height * depth // 8 <= cache.capacity:
+                data = decode_channels(psd, [task])[0]
+        if data is not None:
+            row_size = len(data) // height
+            results.append(
+                memoryview(data)[start * row_size:stop * row_size]
+            )
+        elif readers is not None and depth >= 8 and \
+                channel_data.compression in (
+                    Compression.ZIP, Compression.ZIP_WITH_PREDICTION
+                ):
+            results.append(_get_reader(readers, task).read(start, stop))
+        else:
+            results.append(
+                decompress_rows(
+                    resolve(channel_data.data), channel_data.compression,
+                    width, height, depth, version, start, stop
+                )
+            )
+    return results
+
+
+@contextlib.contextmanager
+def stream_channel_rows(psd):
+    """
+    Context manager to read ZIP channels forward across row ranges.
+
+    Within the context, :py:func:`decode_channel_rows` keeps a zlib stream
+    per ZIP channel, so that reading the channels band by band, e.g., tiles
+    in raster order, inflates every row once instead of inflating from the
+    first row for each range. The streams are released on exit.
+
+    :param psd: :py:class:`~psd_tools.api.psd_image.PSDImage`.
+    """
+    previous = getattr(psd, '_row_readers', None)
+    if previous is not None:
+        yield previous
+        return
+    psd._row_readers = {}
+    try:
+        yield psd._row_readers
+    finally:
+        psd._row_readers = None
+
+
+def _get_reader(readers, task):
+    """Get the row reader of a channel task, shared between threads."""
+    key = _task_key(task)
+    with _READERS_LOCK:
+        entry = readers.get(key)
+        if entry is None:
+            channel_data, width, height, depth, _ = task
+            reader = RowReader(
+                resolve(channel_data.data), channel_data.compression, width,
+                height, depth
+            )
+            # Keep the channel alive so that its id is not reused.
+            entry = readers[key] = (channel_data, _LockedReader(reader))
+    return entry[1]
+
+
+class _LockedReader(object):
+    """Row reader serialized by a lock."""
+    def __init__(self, reader):
+        self._reader = reader
+        self._lock = threading.Lock()
+
+    def read(self, start, stop):
+        with self._lock:
+            return self._reader.read(start, stop)
+
+
+def prefetch_channels(psd, groups):
+    """
+    Context manager to prefetch channel tasks with the scheduler if any.
+
+    Cached channels are not prefetched.
+
+    :param psd: :py:class:`~psd_tools.api.psd_image.PSDImage`.
+    :param groups: iterable of task lists, evaluated only when the document
+        has a scheduler.
+    """
+    scheduler = getattr(psd, 'scheduler', None)
+    if scheduler is None:
+        return _null_context()
+    cache = getattr(psd, 'cache', None)
+    if cache is not None and len(cache):
+        groups = (
+            [task for task in tasks if (task[0], task[3]) not in cache]
+            for tasks in groups
+        )
+    return scheduler.prefetch(groups)
+
+
+@contextlib.contextmanager
+def _null_context():
+    yield None
@@ -29,19 +29,7 @@ class SmartObject(object):
                 self._config = layer.tagged_blocks.get_data(key)
                 break
 
-        self._data = None
-        for key in (
-            Tag.LINKED_LAYER1, Tag.LINKED_LAYER2, Tag.LINKED_LAYER3,
-            Tag.LINKED_LAYER_EXTERNAL
-        ):
-            if key in layer._psd.tagged_blocks:
-                data = layer._psd.tagged_blocks.get_data(key)
-                for item in data:
-                    if item.uuid == self.unique_id:
-                        self._data = item
-                        break
-                if self._data:
-                    break
+        self._data = layer._psd.index.get_linked_layer(self.unique_id)
 
     @property
     def kind(self):
@@ -0,0 +1,379 @@
+"""
+Synthetic document module.
+
+:py:func:`generate` writes parameterized PSD/PSB files for stress and
+scaling tests, with any number of layers, nested groups, canvases up to the
+PSB limits, every compression and depth, and optional masks, layer effects
+and type layers. Documents are written by
+:py:class:`~psd_tools.api.writer.PSDWriter` and pixels are generated by
+strips of rows, so that files of several gigabytes can be made without
+holding a layer in memory.
+
+Example::
+
+    from psd_tools.api.synthetic import generate
+    from psd_tools.constants import Compression
+
+    generate(
+        'stress.psb', (60000, 40000), layers=200, group_depth=8,
+        compression=Compression.ZIP, masks=0.5, effects=0.1, text=0.1
+    )
+"""
+from __future__ import absolute_import, unicode_literals
+import logging
+
+import numpy as np
+
+from psd_tools.api.writer import PSDWriter
+from psd_tools.constants import BlendMode, Compression, Tag
+
+logger = logging.getLogger(__name__)
+
+#: Maximum width and height of PSB files.
+MAX_SIZE = 300000
+
+#: Amplitude of the noise added to the pixels.
+NOISE = 0.02
+
+WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+    'tempor incididunt ut labore et dolore magna aliqua'
+).split()
+
+
+def generate(
+    fp,
+    size=(1024, 1024),
+    layers=16,
+    group_depth=0,
+    mode='RGB',
+    depth=8,
+    compression=Compression.RLE,
+    version=None,
+    layer_size=None,
+    masks=0.0,
+    effects=0.0,
+    text=0.0,
+    text_length=64,
+    image=False,
+    seed=0,
+    **kwargs
+):
+    """
+    Generate a synthetic document.
+
+    Layers are gradients of random colors with noise, placed at random
+    offsets. When `group_depth` is given, half of the remaining layers at
+    each level go into a nested group.
+
+    :param fp: filename or file-like object that has `write`.
+    :param size: (width, height) of the canvas, up to 300,000 pixels.
+    :param layers: number of pixel layers.
+    :param group_depth: nesting depth of the groups.
+    :param mode: color mode of the document, see
+        :py:class:`~psd_tools.api.writer.PSDWriter`.
+    :param depth: bits per channel, 8, 16, or 32.
+    :param compression: compression of the channels, see
+        :py:class:`~psd_tools.constants.Compression`.
+    :param version: 1 for PSD and 2 for PSB. Default is PSB for canvases
+        larger than 30,000 pixels.
+    :param layer_size: (width, height) of the layers. Default is a random
+        size between a quarter and a half of the canvas.
+    :param masks: ratio of the layers with a user mask, or `True` for all.
+    :param effects: ratio of the layers with a drop shadow and a color
+        overlay, or `True` for all.
+    :param text: ratio of the layers that are type layers, or `True` for
+        all.
+    :param text_length: number of characters in each type layer.
+    :param image: Boolean flag to write a merged image. Otherwise readers
+        composite the layers.
+    :param seed: random seed; the same parameters and seed produce the same
+        file.
+    :param kwargs: other arguments to
+        :py:class:`~psd_tools.api.writer.PSDWriter`.
+    """
+    width, height = size
+    if not (0 < width <= MAX_SIZE and 0 < height <= MAX_SIZE):
+        raise ValueError('Invalid canvas size: %r' % (size, ))
+    rng = np.random.RandomState(seed)
+    with PSDWriter(
+        fp,
+        size,
+        mode=mode,
+        depth=depth,
+        compression=compression,
+        version=version,
+        **kwargs
+    ) as writer:
+        rows = kwargs.get('rows', 64)
+        channels = writer.header.channels
+        color_channels = channels - int(mode.upper().endswith('A'))
+
+        index, remaining = 0, layers
+        for level in range(group_depth + 1):
+            count = remaining // 2 if level < group_depth else remaining
+            for _ in range(count):
+                index += 1
+                _add_layer(
+                    writer, index, size, layer_size, color_channels + 1,
+                    rows, rng, rng.rand() < masks, rng.rand() < effects,
+                    rng.rand() < text, text_length
+                )
+            remaining -= count
+            if level < group_depth:
+                writer.begin_group('Group %d' % (level + 1))
+        for _ in range(group_depth):
+            writer.end_group()
+
+        if image:
+            writer.set_image(
+                _iter_rows(
+                    width, height, channels, rows, rng,
+                    channels > color_channels
+                )
+            )
+    logger.debug(
+        'generated %d layers and %d groups' % (layers, group_depth)
+    )
+
+
+def _add_layer(
+    writer, index, size, layer_size, channels, rows, rng, mask, effects,
+    text, text_length
+):
+    width, height = size
+    if layer_size is None:
+        w = rng.randint(max(1, width // 4), max(1, width // 2) + 1)
+        h = rng.randint(max(1, height // 4), max(1, height // 2) + 1)
+    else:
+        w, h = layer_size
+    left = int(rng.randint(0, max(1, width - w + 1)))
+    top = int(rng.randint(0, max(1, height - h + 1)))
+    name = 'Layer %d' % index
+
+    tagged_blocks = []
+    if effects:
+        tagged_blocks.append(
+            (Tag.OBJECT_BASED_EFFECTS_LAYER_INFO, _make_effects(rng))
+        )
+    if text:
+        name = ' '.join(
+            WORDS[i % len(WORDS)] for i in range(index, index + 3)
+        )
+        tagged_blocks.append(
+            (
+                Tag.TYPE_TOOL_OBJECT_SETTING,
+                _make_type_tool(index, left, top, text_length, rng)
+            )
+        )
+    writer.add_layer(
+        _iter_rows(w, h, channels, rows, rng),
+        name=name,
+        offset=(left, top),
+        size=(w, h),
+        opacity=int(rng.randint(128, 256)),
+        blend_mode=(BlendMode.MULTIPLY if index % 4 == 0 else
+                    BlendMode.NORMAL),
+        mask=_iter_mask(w, h, rows) if mask else None,
+        tagged_blocks=tagged_blocks,
+    )
+
+
+def _iter_rows(width, height, channels, rows, rng, alpha=True):
+    """Iterate over strips of a noisy gradient, opaque when `alpha`."""
+    color = rng.uniform(0.2, 1.0, channels).astype(np.float32)
+    ramp = np.linspace(0, 0.5, width, dtype=np.float32)
+    for top in range(0, height, rows):
+        count = min(rows, height - top)
+        y = np.arange(top, top + count, dtype=np.float32)
+        y *= 0.5 / max(height - 1, 1)
+        strip = (ramp[None, :] + y[:, None])[:, :, None] * color
+        strip += rng.uniform(0, NOISE, strip.shape).astype(np.float32)
+        if alpha:
+            strip[:, :, -1] = 1.
+        yield np.clip(strip, 0, 1, out=strip)
+
+
+def _iter_mask(width, height, rows):
+    """Iterate over strips of a mask that fades out to the corners."""
+    x = np.abs(np.linspace(-1, 1, width, dtype=np.float32))
+    y = np.abs(np.linspace(-1, 1, height, dtype=np.float32))
+    for top in range(0, height, rows):
+        strip = np.maximum(x[None, :], y[top:top + rows, None])
+        yield (1. - strip)[:, :, None]
+
+
+def _make_descriptor(kls, classID, items, **kwargs):
+    descriptor = kls(classID=classID, **kwargs)
+    for key, value in items:
+        descriptor[key] = value
+    return descriptor
+
+
+def _make_color(rgb):
+    from psd_tools.psd.descriptor import Descriptor, Double
+    from psd_tools.terminology import Key, Klass
+    return _make_descriptor(
+        Descriptor, Klass.RGBColor.value, [
+            (Key.Red, Double(rgb[0])),
+            (Key.Green, Double(rgb[1])),
+            (Key.Blue, Double(rgb[2])),
+        ]
+    )
+
+
+def _make_effects(rng):
+    """Object-based effects of a drop shadow and a color overlay."""
+    from psd_tools.psd.descriptor import (
+        Bool, Descriptor, DescriptorBlock2, Enumerated, UnitFloat
+    )
+    from psd_tools.terminology import Enum, Key, Klass, Type, Unit
+
+    def mode(enum):
+        return Enumerated(Type.BlendMode.value, enum.value)
+
+    color = rng.randint(0, 256, 3).astype(float)
+    drop_shadow = _make_descriptor(
+        Descriptor, Klass.DropShadow.value, [
+            (Key.Enabled, Bool(True)),
+            (Key.Mode, mode(Enum.Multiply)),
+            (Key.Color, _make_color((0., 0., 0.))),
+            (Key.Opacity, UnitFloat(unit=Unit.Percent, value=75.)),
+            (Key.UseGlobalAngle, Bool(False)),
+            (
+                Key.LocalLightingAngle,
+                UnitFloat(unit=Unit.Angle, value=float(rng.randint(0, 360)))
+            ),
+            (Key.Distance, UnitFloat(unit=Unit.Pixels, value=5.)),
+            (Key.ChokeMatte, UnitFloat(unit=Unit.Pixels, value=0.)),
+            (Key.Blur, UnitFloat(unit=Unit.Pixels, value=5.)),
+            (Key.Noise, UnitFloat(unit=Unit.Percent, value=0.)),
+            (Key.AntiAlias, Bool(False)),
+        ]
+    )
+    color_overlay = _make_descriptor(
+        Descriptor, Klass.SolidFill.value, [
+            (Key.Enabled, Bool(True)),
+            (Key.Mode, mode(Enum.Normal)),
+            (Key.Color, _make_color(color)),
+            (Key.Opacity, UnitFloat(unit=Unit.Percent, value=50.)),
+        ]
+    )
+    return _make_descriptor(
+        DescriptorBlock2, Klass.Null.value, [
+            (Key.Scale, UnitFloat(unit=Unit.Percent, value=100.)),
+            (b'masterFXSwitch', Bool(True)),
+            (Klass.DropShadow.value, drop_shadow),
+            (Klass.SolidFill.value, color_overlay),
+        ],
+        version=0,
+    )
+
+
+def _make_type_tool(index, left, top, length, rng):
+    """Type tool object of a paragraph of words with a style run per word."""
+    from psd_tools.psd.descriptor import (
+        DescriptorBlock, Double, Enumerated, Integer, RawData, String
+    )
+    from psd_tools.psd.engine_data import EngineData
+    from psd_tools.psd.tagged_blocks import TypeToolObjectSetting
+
+    words = []
+    while len(' '.join(words)) < length:
+        words.append(WORDS[(index + len(words)) % len(WORDS)])
+    value = ' '.join(words)[:length]
+    # Runs cover the words with the following space or carriage return.
+    runs = [len(word) + 1 for word in value.split(' ')]
+    engine_data = EngineData.frombytes(
+        _ENGINE_DATA_TEMPLATE % {
+            b'text': _encode_engine_string(value + '\r'),
+            b'length': str(sum(runs)).encode('ascii'),
+            b'style_runs': b' '.join(
+                _STYLE_RUN_TEMPLATE % (
+                    b'%g' % float(rng.randint(12, 72)),
+                    b' '.join(
+                        b'%.3f' % c for c in rng.uniform(0, 1, 3)
+                    ),
+                ) for _ in runs
+            ),
+            b'style_lengths': b' '.join(b'%d' % run for run in runs),
+        }
+    )
+
+    text_data = _make_descriptor(
+        DescriptorBlock, b'TxLr', [
+            (b'Txt ', String(value + '\x00')),
+            (b'textGridding', Enumerated(b'textGridding', b'None')),
+            (b'Ornt', Enumerated(b'Ornt', b'Hrzn')),
+            (b'AntA', Enumerated(b'Annt', b'AnSm')),
+            (b'TextIndex', Integer(index)),
+            (b'EngineData', RawData(engine_data)),
+        ]
+    )
+    warp = _make_descriptor(
+        DescriptorBlock, b'warp', [
+            (b'warpStyle', Enumerated(b'warpStyle', b'warpNone')),
+            (b'warpValue', Double(0.)),
+            (b'warpPerspective', Double(0.)),
+            (b'warpPerspectiveOther', Double(0.)),
+            (b'warpRotate', Enumerated(b'Ornt', b'Hrzn')),
+        ]
+    )
+    return TypeToolObjectSetting(
+        version=1,
+        transform=(1., 0., 0., 1., float(left), float(top)),
+        text_version=50,
+        text_data=text_data,
+        warp_version=1,
+        warp=warp,
+    )
+
+
+def _encode_engine_string(value):
+    value = b'\xfe\xff' + value.encode('utf-16-be')
+    for c in (b'\\', b'(', b')'):
+        value = value.replace(c, b'\\' + c)
+    return value
+
+
+_STYLE_RUN_TEMPLATE = (
+    b'<< /StyleSheet << /StyleSheetData << /Font 0 /FontSize %s '
+    b'/AutoKerning true /FillColor << /Type 1 /Values [ 1.0 %s ] >> '
+    b'>> >> >>'
+)
+
+_ENGINE_DATA_TEMPLATE = b'''
+<<
+/EngineDict
+<<
+/Editor
+<<
+/Text (%(text)s)
+>>
+/ParagraphRun
+<<
+/RunArray [ << /ParagraphSheet << /DefaultStyleSheet 0 /Properties <<
+/Justification 0 /AutoLeading 1.2 >> >> >> ]
+/RunLengthArray [ %(length)s ]
+/IsJoinable 1
+>>
+/StyleRun
+<<
+/RunArray [ %(style_runs)s ]
+/RunLengthArray [ %(style_lengths)s ]
+/IsJoinable 2
+>>
+>>
+/ResourceDict
+<<
+/FontSet [ << /Name (\xfe\xff\x00A\x00r\x00i\x00a\x00l\x00M\x00T) /Script 0
+/FontType 1 /Synthetic 0 >> ]
+/StyleSheetSet [ << /Name (\xfe\xff\x00N\x00o\x00r\x00m\x00a\x00l)
+/StyleSheetData
+<< /Font 0 /FontSize 12.0 >> >> ]
+/ParagraphSheetSet [ << /Name (\xfe\xff\x00N\x00o\x00r\x00m\x00a\x00l)
+/DefaultStyleSheet 0
+/Properties << /Justification 0 >> >> ]
+>>
+>>
+'''
@@ -0,0 +1,705 @@
+"""
+Streaming writer module.
+
+:py:class:`PSDWriter` writes a PSD/PSB file from layers that are added one by
+one, without building the document in memory. Pixels are given as NumPy
+arrays or as iterators of rows, and each channel is compressed as the rows
+arrive.
+
+Layer records precede the channel data in the file, and channels are stored
+one after another, so that compressed channels are spooled to temporary
+files until the writer is closed. The lengths of all sections are then known
+before they are written, and the output is written sequentially without
+seeking. The output can therefore be a pipe or a socket.
+
+Example::
+
+    from psd_tools.api.writer import PSDWriter
+
+    with PSDWriter('large.psb', (60000, 40000), mode='RGB') as writer:
+        writer.add_layer(background, name='Background')
+        writer.begin_group('Tiles')
+        for (left, top), tile in render_tiles():
+            writer.add_layer(tile, name='Tile', offset=(left, top))
+        writer.end_group()
+        writer.add_layer(
+            render_rows(), name='Overlay', size=(60000, 40000)
+        )
+"""
+from __future__ import absolute_import, unicode_literals
+import itertools
+import logging
+import shutil
+import tempfile
+import zlib
+
+import numpy as np
+
+from psd_tools.compression import encode_prediction, encode_rle
+from psd_tools.constants import (
+    BlendMode, ChannelID, Clipping, ColorMode, Compression, Resource,
+    SectionDivider, Tag
+)
+from psd_tools.psd.color_mode_data import ColorModeData
+from psd_tools.psd.header import FileHeader
+from psd_tools.psd.image_resources import ImageResources
+from psd_tools.psd.layer_and_mask import (
+    ChannelInfo, GlobalLayerMaskInfo, LayerFlags, LayerRecord, MaskData
+)
+from psd_tools.psd.tagged_blocks import TaggedBlock
+from psd_tools.utils import pack
+
+logger = logging.getLogger(__name__)
+
+#: Big-endian pixel type of each depth.
+DTYPES = {8: np.dtype('u1'), 16: np.dtype('>u2'), 32: np.dtype('>f4')}
+
+#: Maximum size of a spooled channel kept in memory before rolling over to
+#: a temporary file.
+SPOOL_SIZE = 1 << 24
+
+
+class PSDWriter(object):
+    """
+    Streaming PSD/PSB writer.
+
+    Layers are stacked from the bottom in the order they are added. The file
+    is written when the writer is closed; closing the writer after an error
+    in the `with` block discards the document.
+
+    :param fp: filename or file-like object that has `write`.
+    :param size: (width, height) of the document.
+    :param mode: color mode of the document such as `RGB`, `RGBA`, `L`, or
+        `CMYK`. A trailing `A` adds an alpha channel to the merged image.
+    :param depth: bits per channel, 8, 16, or 32.
+    :param compression: compression of the channels, see
+        :py:class:`~psd_tools.constants.Compression`.
+    :param version: 1 for PSD and 2 for PSB. Default is PSB when the width
+        or the height exceeds 30,000 pixels.
+    :param encoding: charset encoding of the pascal string within the file,
+        default 'macroman'.
+    :param rows: number of rows compressed at once.
+    :param spool_size: maximum size of a compressed channel kept in memory.
+    :param spool_dir: directory of the temporary files.
+    """
+    def __init__(
+        self,
+        fp,
+        size,
+        mode='RGB',
+        depth=8,
+        compression=Compression.RLE,
+        version=None,
+        encoding='macroman',
+        rows=64,
+        spool_size=SPOOL_SIZE,
+        spool_dir=None,
+    ):
+        from .pil_io import get_color_mode
+        if depth not in DTYPES:
+            raise ValueError('Unsupported depth: %g' % depth)
+        width, height = size
+        if version is None:
+            version = 2 if width > 30000 or height > 30000 else 1
+        color_mode = get_color_mode(mode)
+        alpha = int(mode.upper().endswith('A'))
+        self._header = FileHeader(
+            version=version,
+            width=width,
+            height=height,
+            depth=depth,
+            channels=ColorMode.channels(color_mode, alpha),
+            color_mode=color_mode,
+        )
+        self._compression = Compression(compression)
+        self._encoding = encoding
+        self._rows = rows
+        self._spool_size = spool_size
+        self._spool_dir = spool_dir
+        self._image_resources = ImageResources.new()
+        self._records = []
+        self._groups = []
+        self._image = None
+        self._layer_id = 0
+        self._spool = self._make_spool()
+
+        if hasattr(fp, 'write'):
+            self._fp, self._owns_fp = fp, False
+        else:
+            self._fp, self._owns_fp = open(fp, 'wb'), True
+
+    @property
+    def header(self):
+        """See :py:class:`~psd_tools.psd.header.FileHeader`."""
+        return self._header
+
+    @property
+    def image_resources(self):
+        """
+        Image resources to write. See
+        :py:class:`~psd_tools.psd.image_resources.ImageResources`.
+        """
+        return self._image_resources
+
+    @property
+    def closed(self):
+        """True if the writer is closed."""
+        return self._spool is None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+
+    def add_layer(
+        self,
+        pixels=None,
+        name='Layer',
+        offset=(0, 0),
+        size=None,
+        opacity=255,
+        blend_mode=BlendMode.NORMAL,
+        visible=True,
+        clipping=False,
+        mask=None,
+        mask_offset=None,
+        mask_color=0,
+        tagged_blocks=None,
+    ):
+        """
+        Add a pixel layer on top of the layers added so far.
+
+        `pixels` is either a NumPy array of shape `(height, width)` or
+        `(height, width, channels)`, or an iterable of rows, where each item
+        is a row of shape `(width, channels)` or `(width,)`, or a strip of
+        rows of shape `(rows, width, channels)`. An iterable is consumed
+        once, and `size` is required. Channels are the color channels of the
+        document, optionally followed by alpha.
+
+        Integer pixels are written as is. Floating point pixels in [0, 1]
+        are scaled to the depth, except for 32-bit documents where they are
+        written as is.
+
+        :param pixels: pixel data, or `None` for an empty layer.
+        :param name: layer name.
+        :param offset: (left, top) position of the layer.
+        :param size: (width, height) of the layer. Default is the shape of
+            the array.
+        :param opacity: opacity, 0 = transparent, 255 = opaque.
+        :param blend_mode: see :py:class:`~psd_tools.constants.BlendMode`.
+        :param visible: visibility.
+        :param clipping: True if the layer clips to the layer below.
+        :param mask: user layer mask given in the same way as `pixels` with
+            a single channel, or `None`. An iterable mask has the size of
+            the layer.
+        :param mask_offset: (left, top) position of the mask. Default is the
+            offset of the layer.
+        :param mask_color: value of the mask outside of its bounds, 0 or 255.
+        :param tagged_blocks: additional tagged blocks of the layer such as
+            effects, given as an iterable of `(key, data)` pairs, where
+            `key` is :py:class:`~psd_tools.constants.Tag` and `data` is the
+            block data.
+        :return: `int` layer id.
+        """
+        self._check_open()
+        if size is None:
+            if isinstance(pixels, np.ndarray):
+                size = pixels.shape[1], pixels.shape[0]
+            elif pixels is None:
+                size = 0, 0
+            else:
+                raise ValueError('size is required for the iterable of rows')
+        width, height = size
+        left, top = offset
+        record = self._make_record(
+            name, opacity, blend_mode, visible, clipping
+        )
+        record.left, record.top = left, top
+        record.right, record.bottom = left + width, top + height
+        for key, data in tagged_blocks or ():
+            key = Tag(key)
+            record.tagged_blocks[key] = TaggedBlock(key=key, data=data)
+
+        channel_ids = list(range(ColorMode.channels(self._header.color_mode)))
+        if pixels is not None and width and height:
+            pixels, channels = _get_channels(pixels, len(channel_ids))
+            if channels > len(channel_ids):
+                channel_ids.append(ChannelID.TRANSPARENCY_MASK)
+            encoders = self._encode(pixels, width, height, channels)
+        else:
+            encoders = [None] * len(channel_ids)
+        if mask is not None:
+            if isinstance(mask, np.ndarray):
+                mask_width, mask_height = mask.shape[1], mask.shape[0]
+            else:
+                mask_width, mask_height = width, height
+            mask_left, mask_top = mask_offset or offset
+            record.mask_data = MaskData(
+                top=mask_top,
+                left=mask_left,
+                bottom=mask_top + mask_height,
+                right=mask_left + mask_width,
+                background_color=mask_color,
+            )
+            try:
+                mask, _ = _get_channels(mask, 1, False)
+                encoders += self._encode(mask, mask_width, mask_height, 1)
+            except Exception:
+                for encoder in encoders:
+                    if encoder is not None:
+                        encoder.close()
+                raise
+            channel_ids.append(ChannelID.USER_LAYER_MASK)
+        self._append(record, channel_ids, encoders)
+        return record.tagged_blocks.get_data(Tag.LAYER_ID)
+
+    def begin_group(
+        self,
+        name='Group',
+        opacity=255,
+        blend_mode=BlendMode.PASS_THROUGH,
+        visible=True,
+        open_folder=True,
+    ):
+        """
+        Begin a group. Layers added until the matching :py:meth:`end_group`
+        belong to the group.
+
+        :param name: group name.
+        :param opacity: opacity, 0 = transparent, 255 = opaque.
+        :param blend_mode: see :py:class:`~psd_tools.constants.BlendMode`.
+        :param visible: visibility.
+        :param open_folder: True if the group is expanded in the layers panel.
+        :return: `int` layer id of the group.
+        """
+        self._check_open()
+        record = LayerRecord(
+            name='</Layer group>',
+            flags=LayerFlags(pixel_data_irrelevant=True),
+        )
+        record.tagged_blocks.set_data(
+            Tag.SECTION_DIVIDER_SETTING,
+            SectionDivider.BOUNDING_SECTION_DIVIDER
+        )
+        self._append(record, self._group_channel_ids(), None)
+
+        group = self._make_record(name, opacity, blend_mode, visible, False)
+        group.flags.pixel_data_irrelevant = True
+        group.tagged_blocks.set_data(
+            Tag.SECTION_DIVIDER_SETTING,
+            (
+                SectionDivider.OPEN_FOLDER
+                if open_folder else SectionDivider.CLOSED_FOLDER
+            ),
+            signature=b'8BIM',
+            blend_mode=group.blend_mode,
+        )
+        self._groups.append(group)
+        return group.tagged_blocks.get_data(Tag.LAYER_ID)
+
+    def end_group(self):
+        """End the group started by the last :py:meth:`begin_group`."""
+        self._check_open()
+        if not self._groups:
+            raise ValueError('No group to end')
+        self._append(self._groups.pop(), self._group_channel_ids(), None)
+
+    def set_image(self, pixels):
+        """
+        Set the merged image of the document.
+
+        The pixels are given in the same way as :py:meth:`add_layer`, with
+        all the channels of the document, and are compressed immediately.
+        When the merged image is not set, a blank image is written and the
+        document is marked to have no merged image, so that readers
+        composite the layers. The merged image is a single stream of all the
+        channels in ZIP compression, so the channels are spooled raw and
+        compressed when the writer is closed.
+
+        :param pixels: pixel data.
+        """
+        self._check_open()
+        header = self._header
+        pixels, _ = _get_channels(pixels, header.channels, False)
+        image = self._encode(
+            pixels, header.width, header.height, header.channels,
+            self._image_compression
+        )
+        for encoder in self._image or ():
+            encoder.close()
+        self._image = image
+
+    def close(self):
+        """
+        Write the document and close the writer. Raises `ValueError` when a
+        group is not ended.
+        """
+        if self.closed:
+            return
+        if self._groups:
+            raise ValueError('%d groups are not ended' % len(self._groups))
+        try:
+            self._write(self._fp)
+        finally:
+            self._discard()
+
+    def _discard(self):
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        for encoder in self._image or ():
+            encoder.close()
+        self._image = None
+        if self._owns_fp:
+            self._fp.close()
+
+    def _check_open(self):
+        if self.closed:
+            raise ValueError('I/O operation on closed writer')
+
+    @property
+    def _image_compression(self):
+        # Channels of the merged image are planar, so a ZIP stream is made at
+        # close() by compressing the raw channels one after another.
+        if self._compression in (
+            Compression.ZIP, Compression.ZIP_WITH_PREDICTION
+        ):
+            return Compression.RAW
+        return self._compression
+
+    def _make_spool(self):
+        return tempfile.SpooledTemporaryFile(
+            self._spool_size, dir=self._spool_dir
+        )
+
+    def _make_record(self, name, opacity, blend_mode, visible, clipping):
+        try:
+            name.encode(self._encoding)
+            record_name = name
+        except UnicodeEncodeError:
+            record_name = str('?')
+        self._layer_id += 1
+        record = LayerRecord(
+            blend_mode=blend_mode,
+            opacity=opacity,
+            clipping=Clipping.NON_BASE if clipping else Clipping.BASE,
+            flags=LayerFlags(visible=visible),
+            name=record_name,
+        )
+        record.tagged_blocks.set_data(Tag.UNICODE_LAYER_NAME, name)
+        record.tagged_blocks.set_data(Tag.LAYER_ID, self._layer_id)
+        return record
+
+    def _group_channel_ids(self):
+        color_channels = ColorMode.channels(self._header.color_mode)
+        return [ChannelID.TRANSPARENCY_MASK] + list(range(color_channels))
+
+    def _encode(self, pixels, width, height, channels, compression=None):
+        """Compress the pixels into an encoder per channel."""
+        header = self._header
+        if compression is None:
+            compression = self._compression
+        encoders = [
+            _ChannelEncoder(
+                compression, width, header.depth, header.version,
+                self._make_spool()
+            ) for _ in range(channels)
+        ]
+        try:
+            count = 0
+            for strip in _iter_strips(
+                pixels, width, channels, header.depth, self._rows
+            ):
+                count += strip.shape[0]
+                if count > height:
+                    break
+                for index, encoder in enumerate(encoders):
+                    encoder.write(strip[:, :, index].tobytes(), strip.shape[0])
+            if count != height:
+                raise ValueError(
+                    'Expected %d rows but found %s' %
+                    (height, count if count < height else 'more')
+                )
+            for encoder in encoders:
+                encoder.flush()
+        except Exception:
+            for encoder in encoders:
+                encoder.close()
+            raise
+        return encoders
+
+    def _append(self, record, channel_ids, encoders=None):
+        """
+        Move compressed channels to the spool in the order of the ids. An
+        encoder of `None` is an empty channel.
+        """
+        if encoders is None:
+            encoders = [None] * len(channel_ids)
+
+        # Transparency comes first and the user mask last like Photoshop.
+        order = sorted(
+            range(len(encoders)),
+            key=lambda i: (
+                channel_ids[i] == ChannelID.USER_LAYER_MASK, channel_ids[i]
+            )
+        )
+        try:
+            for index in order:
+                if encoders[index] is None:
+                    self._spool.write(b'\x00\x00')  # Compression.RAW
+                    length = 2
+                else:
+                    length = encoders[index].copy_to(self._spool, True)
+                record.channel_info.append(
+                    ChannelInfo(channel_ids[index], length)
+                )
+        finally:
+            for encoder in encoders:
+                if encoder is not None:
+                    encoder.close()
+        self._records.append(record)
+
+    def _write(self, fp):
+        header = self._header
+        length_fmt = ('I', 'Q')[header.version - 1]
+        encoding = self._encoding
+        if self._image is None:
+            self._image = self._encode(
+                _iter_blank(header, self._rows), header.width, header.height,
+                header.channels, self._image_compression
+            )
+            version_info = self._image_resources.get_data(
+                Resource.VERSION_INFO
+            )
+            if version_info is not None:
+                version_info.has_composite = False
+
+        records = b''.join(
+            record.tobytes(encoding, header.version)
+            for record in self._records
+        )
+        spool_size = self._spool.tell()
+        layer_info_length = 2 + len(records) + spool_size
+        padding = -layer_info_length % 4
+        layer_info_length += padding
+
+        layer_count = len(self._records)
+        if header.channels > ColorMode.channels(header.color_mode):
+            # The first alpha channel of the merged image is transparency.
+            layer_count = -layer_count
+        global_layer_mask_info = GlobalLayerMaskInfo(
+            overlay_color=None
+        ).tobytes()
+
+        if not self._records:
+            block_header = pack(length_fmt, 0)
+            layer_info_length = 0
+        elif header.depth == 8:
+            block_header = pack(length_fmt, layer_info_length)
+        else:
+            # Photoshop keeps 16 and 32-bit layers in a global tagged block,
+            # whose length does not include the padding.
+            key = Tag.LAYER_16 if header.depth == 16 else Tag.LAYER_32
+            block_header = (
+                pack(length_fmt, 0) + global_layer_mask_info +
+                pack('4s4s', b'8BIM', key.value) + pack(
+                    TaggedBlock._length_format(key, header.version),
+                    layer_info_length - padding
+                )
+            )
+            global_layer_mask_info = b''
+
+        total = (
+            len(block_header) + layer_info_length +
+            len(global_layer_mask_info)
+        )
+        if total >= 1 << (32 * header.version):
+            raise ValueError('Layers are too large, use version=2 (PSB)')
+        logger.debug(
+            'writing %d layer records, len=%d' % (len(self._records), total)
+        )
+
+        # Elements are serialized in memory since they seek to write lengths.
+        fp.write(header.tobytes())
+        fp.write(ColorModeData().tobytes())
+        fp.write(self._image_resources.tobytes(encoding))
+        fp.write(pack(length_fmt, total))
+        fp.write(block_header)
+        if layer_info_length:
+            fp.write(pack('h', layer_count))
+            fp.write(records)
+            self._spool.seek(0)
+            shutil.copyfileobj(self._spool, fp)
+            fp.write(b'\x00' * padding)
+        fp.write(global_layer_mask_info)
+
+        # Merged image data has one table of RLE counts for all channels.
+        fp.write(pack('H', self._compression.value))
+        if self._image_compression == self._compression:
+            for encoder in self._image:
+                fp.write(encoder.counts)
+            for encoder in self._image:
+                encoder.copy_to(fp)
+        else:
+            self._write_zip_image(fp)
+
+    def _write_zip_image(self, fp):
+        """Compress the raw channels of the merged image in one stream."""
+        header = self._header
+        row_size = header.width * header.depth // 8
+        compressor = zlib.compressobj()
+        for encoder in self._image:
+            for chunk in encoder.iter_chunks(self._rows * row_size):
+                if self._compression == Compression.ZIP_WITH_PREDICTION:
+                    chunk = encode_prediction(
+                        chunk, header.width, len(chunk) // row_size,
+                        header.depth
+                    )
+                fp.write(compressor.compress(chunk))
+        fp.write(compressor.flush())
+
+
+class _ChannelEncoder(object):
+    """
+    Compress rows of a channel into a spool.
+
+    RLE counts are kept aside since the table precedes the rows.
+    """
+    def __init__(self, compression, width, depth, version, spool):
+        self._compression = compression
+        self._width = width
+        self._depth = depth
+        self._version = version
+        self._spool = spool
+        self._counts = bytearray()
+        self._compressor = None
+        if compression in (Compression.ZIP, Compression.ZIP_WITH_PREDICTION):
+            self._compressor = zlib.compressobj()
+
+    @property
+    def counts(self):
+        """Big-endian RLE counts of the rows written so far."""
+        return bytes(self._counts)
+
+    def write(self, data, rows):
+        compression = self._compression
+        if compression == Compression.RAW:
+            self._spool.write(data)
+        elif compression == Compression.RLE:
+            encoded = encode_rle(
+                data, self._width, rows, self._depth, self._version
+            )
+            table_size = rows * (2, 4)[self._version - 1]
+            self._counts += encoded[:table_size]
+            self._spool.write(encoded[table_size:])
+        else:
+            if compression == Compression.ZIP_WITH_PREDICTION:
+                data = encode_prediction(data, self._width, rows, self._depth)
+            self._spool.write(self._compressor.compress(data))
+
+    def flush(self):
+        if self._compressor is not None:
+            self._spool.write(self._compressor.flush())
+            self._compressor = None
+
+    def copy_to(self, fp, marker=False):
+        """
+        Copy the compressed rows to `fp`, preceded by the compression marker
+        and the RLE counts when `marker` is True.
+
+        :return: written byte size.
+        """
+        written = self._spool.tell()
+        if marker:
+            counts = self.counts
+            fp.write(pack('H', self._compression.value) + counts)
+            written += 2 + len(counts)
+        self._spool.seek(0)
+        shutil.copyfileobj(self._spool, fp)
+        return written
+
+    def iter_chunks(self, size):
+        """Iterate over the compressed rows in chunks of `size` bytes."""
+        self._spool.seek(0)
+        while True:
+            chunk = self._spool.read(size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self._spool.close()
+
+
+def _get_channels(pixels, color_channels, alpha=True):
+    """
+    Get the number of channels in the pixels, checked against the color
+    channels. The first item of an iterable is read to find the channels.
+
+    :return: tuple of the pixels and the number of channels.
+    """
+    if isinstance(pixels, np.ndarray):
+        channels = 1 if pixels.ndim == 2 else pixels.shape[-1]
+    else:
+        pixels = iter(pixels)
+        first = next(pixels, None)
+        if first is None:
+            raise ValueError('No rows found')
+        channels = 1 if np.ndim(first) == 1 else np.shape(first)[-1]
+        pixels = itertools.chain((first, ), pixels)
+    if channels not in (color_channels, color_channels + alpha):
+        raise ValueError(
+            'Expected %d channels but found %d' % (
+                color_channels + alpha, channels
+            )
+        )
+    return pixels, channels
+
+
+def _iter_strips(pixels, width, channels, depth, rows):
+    """
+    Iterate over strips of shape `(rows, width, channels)` in the big-endian
+    pixel type of the depth.
+    """
+    if isinstance(pixels, np.ndarray):
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, None]
+        items = (
+            pixels[top:top + rows] for top in range(0, pixels.shape[0], rows)
+        )
+    else:
+        items = pixels
+    for item in items:
+        item = np.asarray(item)
+        if item.ndim < 3:
+            item = item.reshape((1, -1, channels))
+        if item.shape[1:] != (width, channels):
+            raise ValueError(
+                'Expected rows of shape %r but found %r' %
+                ((width, channels), item.shape[1:])
+            )
+        yield _convert(item, depth)
+
+
+def _convert(strip, depth):
+    """Convert pixels to the big-endian pixel type of the depth."""
+    dtype = DTYPES[depth]
+    if strip.dtype == dtype:
+        return strip
+    if depth != 32 and strip.dtype.kind in 'fb':
+        scale = (1 << depth) - 1
+        strip = np.rint(np.clip(strip.astype(np.float64), 0, 1) * scale)
+    return strip.astype(dtype)
+
+
+def _iter_blank(header, rows):
+    """Iterate over blank strips of the merged image."""
+    for top in range(0, header.height, rows):
+        count = min(rows, header.height - top)
+        yield np.zeros(
+            (count, header.width, header.channels), DTYPES[header.depth]
+        )
@@ -1,7 +1,16 @@
+import collections
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
 import numpy as np
 from psd_tools.constants import Tag, BlendMode, ColorMode
 from psd_tools.api.layers import AdjustmentLayer, Layer
-from psd_tools.api.numpy_io import EXPECTED_CHANNELS
+from psd_tools.api.numpy_io import (
+    EXPECTED_CHANNELS, get_channel_tasks, get_image_data, get_layer_data
+)
+from psd_tools.api.memory import check_memory, estimate_composite
+from psd_tools.api.scheduler import prefetch_channels, stream_channel_rows
+from psd_tools.profiling import span
 
 import logging
 from .blend import BLEND_FUNC, normal
@@ -13,9 +22,19 @@ from .effects import draw_stroke_effect
 
 logger = logging.getLogger(__name__)
 
+PARALLEL_TILE_SIZE = 512
+
 
 def composite_pil(
-    layer, color, alpha, viewport, layer_filter, force, as_layer=False
+    layer,
+    color,
+    alpha,
+    viewport,
+    layer_filter,
+    force,
+    as_layer=False,
+    tile_size=None,
+    workers=None,
 ):
     from PIL import Image
     from psd_tools.api.pil_io import get_pil_mode
@@ -29,16 +48,6 @@ def composite_pil(
     if color_mode in UNSUPPORTED_MODES:
         logger.warning('Unsupported blending color space: %s' % (color_mode))
 
-    color, _, alpha = composite(
-        layer,
-        color=color,
-        alpha=alpha,
-        viewport=viewport,
-        layer_filter=layer_filter,
-        force=force,
-        as_layer=as_layer
-    )
-
     mode = get_pil_mode(color_mode)
     if mode == 'P':
         mode = 'RGB'
@@ -50,14 +59,63 @@ def composite_pil(
         )
     )
     logger.debug('Skipping alpha: %g' % skip_alpha)
+
+    if workers and workers > 1 and tile_size is None:
+        tile_size = PARALLEL_TILE_SIZE
+    if tile_size is None:
+        color, _, alpha = composite(
+            layer,
+            color=color,
+            alpha=alpha,
+            viewport=viewport,
+            layer_filter=layer_filter,
+            force=force,
+            as_layer=as_layer
+        )
+        pixels = _to_pixels(color, alpha, skip_alpha)
+    else:
+        viewport = _get_viewport(layer, viewport)
+        pixels = None
+        for bbox, color_t, _, alpha_t in composite_tiles(
+            layer,
+            tile_size,
+            color=color,
+            alpha=alpha,
+            viewport=viewport,
+            layer_filter=layer_filter,
+            force=force,
+            as_layer=as_layer,
+            workers=workers
+        ):
+            if color_t.shape[2] == 1:
+                color_t = np.repeat(
+                    color_t, EXPECTED_CHANNELS.get(color_mode, 1), axis=2
+                )
+            tile = _to_pixels(color_t, alpha_t, skip_alpha)
+            if pixels is None:
+                pixels = np.empty((
+                    viewport[3] - viewport[1], viewport[2] - viewport[0],
+                    tile.shape[2]
+                ),
+                                  dtype=np.uint8)
+            pixels[bbox[1] - viewport[1]:bbox[3] - viewport[1],
+                   bbox[0] - viewport[0]:bbox[2] - viewport[0]] = tile
+
+    if pixels is None:
+        return None
     if not skip_alpha:
-        color = np.concatenate((color, alpha), 2)
         mode += 'A'
     if mode in ('1', 'L'):
-        color = color[:, :, 0]
-    if color.shape[0] == 0 or color.shape[1] == 0:
+        pixels = pixels[:, :, 0]
+    if pixels.shape[0] == 0 or pixels.shape[1] == 0:
         return None
-    return Image.fromarray((255 * color).astype(np.uint8), mode)
+    return Image.fromarray(pixels, mode)
+
+
+def _to_pixels(color, alpha, skip_alpha):
+    if not skip_alpha:
+        color = np.concatenate((color, alpha), 2)
+    return (255 * color).astype(np.uint8)
 
 
 def composite(
@@ -68,24 +126,39 @@ def composite(
     layer_filter=None,
     force=False,
     as_layer=False,
+    memo=None,
+    workspace=None,
 ):
     """
     Composite the given group of layers.
+
+    :param memo: optional dict to share layer effects between calls with
+        different viewports of the same document, e.g., tiles.
+    :param workspace: optional :py:class:`Workspace` to reuse blending
+        buffers. A workspace must not be shared between threads.
     """
-    viewport = viewport or getattr(group, 'viewbox', None) or group.bbox
-    if viewport == (0, 0, 0, 0):
-        viewport = getattr(group, '_psd').viewbox
+    viewport = _get_viewport(group, viewport)
 
     if getattr(group, 'kind', None) == 'psdimage' and len(group) == 0:
-        color, shape = group.numpy('color'), group.numpy('shape')
+        color = get_image_data(group, 'color', viewport)
+        shape = get_image_data(group, 'shape', viewport)
         if viewport != group.viewbox:
-            color = paste(viewport, group.bbox, color, 1.)
-            shape = paste(viewport, group.bbox, shape)
+            region = _intersect(viewport, group.viewbox)
+            color = paste(viewport, region, color, 1.)
+            shape = paste(viewport, region, shape)
         return color, shape, shape
 
+    psd = getattr(group, '_psd', group)
+    check_memory(
+        psd,
+        estimate_composite(
+            viewport[2] - viewport[0], viewport[3] - viewport[1],
+            EXPECTED_CHANNELS.get(psd.color_mode, 1)
+        ), 'Compositing %r' % (viewport, )
+    )
+
     if not isinstance(color, np.ndarray) and not hasattr(color, '__iter__'):
-        color_mode = getattr(group, '_psd', group).color_mode
-        color = (color, ) * EXPECTED_CHANNELS.get(color_mode)
+        color = (color, ) * EXPECTED_CHANNELS.get(psd.color_mode)
 
     isolated = False
     if hasattr(group, 'blend_mode'):
@@ -93,15 +166,216 @@ def composite(
 
     layer_filter = layer_filter or Layer.is_visible
 
-    compositor = Compositor(
-        viewport, color, alpha, isolated, layer_filter, force
+    with span('composite', viewport=viewport):
+        compositor = Compositor(
+            viewport, color, alpha, isolated, layer_filter, force, memo,
+            workspace
+        )
+        if hasattr(group, '__iter__') and not as_layer:
+            layers = _cull(group, viewport)
+        else:
+            layers = [group]
+        with prefetch_channels(
+            getattr(group, '_psd', group),
+            _prefetch_tasks(layers, viewport, layer_filter),
+        ):
+            for layer in layers:
+                compositor.apply(layer)
+
+        return compositor.finish()
+
+
+def composite_tiles(
+    group,
+    tile_size=1024,
+    color=1.0,
+    alpha=0.0,
+    viewport=None,
+    layer_filter=None,
+    force=False,
+    as_layer=False,
+    workers=None,
+    processes=False,
+):
+    """
+    Composite the given group of layers tile by tile.
+
+    Each tile is composited independently, and a layer is decoded and
+    rasterized only in the tiles it intersects, so peak memory depends on
+    the tile size rather than the viewport size. Fills, strokes, and
+    overlay effects are rasterized only in the tile. Stroke effects, which
+    depend on the whole layer shape, are rasterized at the layer size once
+    per call and shared between the tiles. ZIP channels are inflated
+    forward across the tiles, keeping one band of rows per channel, so each
+    row is inflated once when the tiles are composited in order.
+
+    Tiles are composited in parallel when `workers` is given. NumPy releases
+    the GIL in blending, so a thread pool scales with cores on large tiles. A
+    process pool copies the document to each worker, and requires
+    `layer_filter` to be picklable, i.e., not a lambda.
+
+    :param tile_size: tile width and height in pixels, or a tuple of
+        (width, height).
+    :param workers: number of workers to composite tiles in parallel.
+    :param processes: Boolean flag to use a process pool instead of threads.
+    :return: generator of `(bbox, color, shape, alpha)` tuples in raster
+        order, where `bbox` is the tile bounding box.
+
+    Example::
+
+        import numpy as np
+        from psd_tools.composite import composite_tiles
+
+        out = np.lib.format.open_memmap(
+            'output.npy', mode='w+', dtype=np.uint8,
+            shape=(psd.height, psd.width, 3)
+        )
+        for bbox, color, _, _ in composite_tiles(psd, 2048, workers=8):
+            out[bbox[1]:bbox[3], bbox[0]:bbox[2]] = 255 * color
+        out.flush()
+    """
+    viewport = _get_viewport(group, viewport)
+    memo = {}
+    tasks = (
+        (
+            bbox,
+            dict(
+                color=_crop(color, viewport, bbox),
+                alpha=_crop(alpha, viewport, bbox),
+                viewport=bbox,
+                layer_filter=layer_filter,
+                force=force,
+                as_layer=as_layer,
+            )
+        ) for bbox in _iter_tiles(viewport, tile_size)
     )
-    for layer in (
-        group if hasattr(group, '__iter__') and not as_layer else [group]
-    ):
-        compositor.apply(layer)
 
-    return compositor.finish()
+    psd = getattr(group, '_psd', group)
+    with stream_channel_rows(psd):
+        if not workers or workers <= 1:
+            for bbox, kwargs in tasks:
+                yield (bbox, ) + composite(group, memo=memo, **kwargs)
+            return
+
+        if processes:
+            index = None
+            if group is not psd:
+                index = next(
+                    i for i, layer in enumerate(psd.descendants())
+                    if layer is group
+                )
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(psd._record, )
+            )
+            fn = functools.partial(_composite_worker, index)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+            fn = functools.partial(composite, group, memo=memo)
+
+        # Keep a bounded number of tiles in flight and yield them in order.
+        pending = collections.deque()
+        try:
+            for bbox, kwargs in tasks:
+                pending.append((bbox, executor.submit(fn, **kwargs)))
+                if len(pending) >= 2 * workers:
+                    bbox, future = pending.popleft()
+                    yield (bbox, ) + future.result()
+            while pending:
+                bbox, future = pending.popleft()
+                yield (bbox, ) + future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+
+_WORKER_PSD = None
+_WORKER_MEMO = {}
+
+
+def _init_worker(record):
+    global _WORKER_PSD
+    from psd_tools.api.psd_image import PSDImage
+    _WORKER_PSD = PSDImage(record)
+    # The worker document is private, so ZIP channels stay open for the
+    # lifetime of the worker.
+    _WORKER_PSD._row_readers = {}
+
+
+def _composite_worker(index, **kwargs):
+    group = _WORKER_PSD
+    if index is not None:
+        group = list(_WORKER_PSD.descendants())[index]
+    return composite(group, memo=_WORKER_MEMO, **kwargs)
+
+
+def _crop(value, viewport, bbox):
+    if not isinstance(value, np.ndarray):
+        return value
+    return value[bbox[1] - viewport[1]:bbox[3] - viewport[1],
+                 bbox[0] - viewport[0]:bbox[2] - viewport[0]]
+
+
+def _get_viewport(group, viewport):
+    viewport = viewport or getattr(group, 'viewbox', None) or group.bbox
+    if viewport == (0, 0, 0, 0):
+        viewport = getattr(group, '_psd').viewbox
+    return viewport
+
+
+def _iter_tiles(viewport, tile_size):
+    if not hasattr(tile_size, '__iter__'):
+        tile_size = (tile_size, tile_size)
+    width, height = tile_size
+    assert width > 0 and height > 0, 'Invalid tile size %r' % (tile_size, )
+    for top in range(viewport[1], viewport[3], height):
+        for left in range(viewport[0], viewport[2], width):
+            yield (
+                left, top, min(left + width, viewport[2]),
+                min(top + height, viewport[3])
+            )
+
+
+def _cull(group, viewport):
+    """Get layers of the group that intersect the viewport.
+
+    The spatial index of the document is used when the viewport does not
+    cover the group, so that layers out of the viewport are not visited.
+    """
+    spatial_index = getattr(
+        getattr(group, '_psd', group), 'spatial_index', None
+    )
+    if spatial_index is None or _intersect(viewport, group.bbox) == group.bbox:
+        return group
+    hits = set(id(layer) for layer in spatial_index.search(viewport))
+    return [layer for layer in group if id(layer) in hits]
+
+
+def _prefetch_tasks(layers, viewport, layer_filter):
+    """Yield channel tasks of pixel layers in the compositing order.
+
+    Layers partially in the viewport are decoded by rows and not prefetched.
+    """
+    for layer in layers:
+        if not layer_filter(layer) or isinstance(layer, AdjustmentLayer):
+            continue
+        bbox = _intersect(viewport, layer.bbox)
+        if bbox == (0, 0, 0, 0):
+            continue
+        if layer.is_group():
+            for tasks in _prefetch_tasks(layer, viewport, layer_filter):
+                yield tasks
+        elif bbox == layer.bbox:
+            yield get_channel_tasks(
+                layer, layer.width, layer.height, lambda x: x.id >= -1
+            )
+        if layer.has_clip_layers():
+            for tasks in _prefetch_tasks(
+                layer.clip_layers, viewport, layer_filter
+            ):
+                yield tasks
 
 
 def paste(viewport, bbox, values, background=None):
@@ -130,6 +404,9 @@ def paste(viewport, bbox, values, background=None):
 class Compositor(object):
     """Composite context.
 
+    Each layer is blended only in the intersection of its bbox and the
+    viewport, and the backdrop arrays are updated in place.
+
     Example::
 
         compositor = Compositor(group.bbox)
@@ -145,10 +422,16 @@ class Compositor(object):
         isolated=False,
         layer_filter=None,
         force=False,
+        memo=None,
+        workspace=None,
     ):
         self._viewport = viewport
+        self._region = viewport
+        self._applied = False
         self._layer_filter = layer_filter
         self._force = force
+        self._memo = memo
+        self._workspace = Workspace() if workspace is None else workspace
         self._clip_mask = 1.
 
         if isolated:
@@ -173,8 +456,8 @@ class Compositor(object):
                                  dtype=np.float32)
         self._alpha_g = np.zeros((self.height, self.width, 1),
                                  dtype=np.float32)
-        self._color = self._color_0
-        self._alpha = self._alpha_0
+        self._color = self._color_0.copy()
+        self._alpha = self._alpha_0.copy()
 
     def apply(self, layer):
         logger.debug('Compositing %s' % layer)
@@ -185,10 +468,19 @@ class Compositor(object):
         if isinstance(layer, AdjustmentLayer):
             logger.debug('Ignore adjustment %s' % layer)
             return
-        if _intersect(self._viewport, layer.bbox) == (0, 0, 0, 0):
+        region = _intersect(self._viewport, layer.bbox)
+        if region == (0, 0, 0, 0):
             logger.debug('Out of viewport %s' % (layer))
             return
 
+        self._region = region
+        try:
+            with span('composite.layer', layer=layer):
+                self._apply_layer(layer)
+        finally:
+            self._region = self._viewport
+
+    def _apply_layer(self, layer):
         knockout = bool(layer.tagged_blocks.get_data(Tag.KNOCKOUT_SETTING, 0))
         if layer.is_group():
             color, shape, alpha = self._get_group(layer, knockout)
@@ -198,51 +490,134 @@ class Compositor(object):
         shape_mask, opacity_mask = self._get_mask(layer)
         shape_const, opacity_const = self._get_const(layer)
         shape *= shape_mask
-        alpha *= shape_mask * opacity_mask * opacity_const
+        alpha *= shape_mask
+        alpha *= opacity_mask * opacity_const
 
         # TODO: Tag.BLEND_INTERIOR_ELEMENTS controls how inner effects apply.
 
         # TODO: Apply before effects
-        self._apply_source(
-            color, shape * shape_const, alpha * shape_const, layer.blend_mode,
-            knockout
-        )
+        shape_s, alpha_s = shape, alpha
+        if shape_const != 1.:
+            shape_s = np.multiply(
+                shape, shape_const,
+                out=self._workspace.get('source_shape', shape.shape)
+            )
+            alpha_s = np.multiply(
+                alpha, shape_const,
+                out=self._workspace.get('source_alpha', alpha.shape)
+            )
+        self._apply_source(color, shape_s, alpha_s, layer.blend_mode, knockout)
 
         # TODO: Apply after effects
-        self._apply_color_overlay(layer, color, shape, alpha)
-        self._apply_pattern_overlay(layer, color, shape, alpha)
-        self._apply_gradient_overlay(layer, color, shape, alpha)
-        if ((self._force and layer.has_vector_mask()) or (
-            not layer.has_pixels()) and has_fill(layer)):
-            self._apply_stroke_effect(layer, color, shape_mask, alpha)
-        else:
-            self._apply_stroke_effect(layer, color, shape, alpha)
+        if not layer.has_effects():
+            return
+        with span('composite.effects', layer=layer):
+            self._apply_color_overlay(layer, color, shape, alpha)
+            self._apply_pattern_overlay(layer, color, shape, alpha)
+            self._apply_gradient_overlay(layer, color, shape, alpha)
+            if ((self._force and layer.has_vector_mask()) or (
+                not layer.has_pixels()) and has_fill(layer)):
+                self._apply_stroke_effect(
+                    layer, color, shape_mask, alpha, True
+                )
+            else:
+                self._apply_stroke_effect(layer, color, shape, alpha)
 
     def _apply_source(self, color, shape, alpha, blend_mode, knockout=False):
+        """Blend the source, emitting a profiling event."""
+        with span('composite.blend'):
+            self._blend(color, shape, alpha, blend_mode, knockout)
+
+    def _blend(self, color, shape, alpha, blend_mode, knockout):
+        """Blend the source in the current region of the backdrop.
+
+        Intermediate results are kept in the workspace buffers, and the
+        backdrop arrays are updated in place.
+        """
         if self._color_0.shape[2] == 1 and 1 < color.shape[2]:
             self._color_0 = np.repeat(self._color_0, color.shape[2], axis=2)
         if self._color.shape[2] == 1 and 1 < color.shape[2]:
             self._color = np.repeat(self._color, color.shape[2], axis=2)
-
-        self._shape_g = _union(self._shape_g, shape)
+        self._applied = True
+
+        index = self._get_index(self._region)
+        shape_g = self._shape_g[index]
+        alpha_g = self._alpha_g[index]
+        alpha_0 = self._alpha_0[index]
+        color_0 = self._color_0[index]
+        alpha_previous = self._alpha[index]
+        color_previous = self._color[index]
+
+        workspace = self._workspace
+        scratch = workspace.get('scratch', shape_g.shape)
+        alpha_r = workspace.get('alpha', shape_g.shape)
+        color_t = workspace.get('color', color_previous.shape)
+        blended = workspace.get('blend', color_previous.shape)
+
+        np.copyto(shape_g, _union(shape_g, shape, out=scratch))
         if knockout:
-            self._alpha_g = (1. - shape) * self._alpha_g + \
-                (shape - alpha) * self._alpha_0 + alpha
+            # alpha_g = (1 - shape) * alpha_g + (shape - alpha) * alpha_0 +
+            #     alpha
+            np.subtract(1., shape, out=scratch)
+            alpha_g *= scratch
+            np.subtract(shape, alpha, out=scratch)
+            scratch *= alpha_0
+            alpha_g += scratch
+            alpha_g += alpha
         else:
-            self._alpha_g = _union(self._alpha_g, alpha)
-        alpha_previous = self._alpha
-        self._alpha = _union(self._alpha_0, self._alpha_g)
+            np.copyto(alpha_g, _union(alpha_g, alpha, out=scratch))
+        _union(alpha_0, alpha_g, out=alpha_r)
 
-        alpha_b = self._alpha_0 if knockout else alpha_previous
-        color_b = self._color_0 if knockout else self._color
+        alpha_b = alpha_0 if knockout else alpha_previous
+        color_b = color_0 if knockout else color_previous
 
+        # color_t = (shape - alpha) * alpha_b * color_b + alpha *
+        #     ((1 - alpha_b) * color + alpha_b * blend_fn(color_b, color))
         blend_fn = BLEND_FUNC.get(blend_mode, normal)
-        color_t = (shape - alpha) * alpha_b * color_b + alpha * \
-            ((1. - alpha_b) * color + alpha_b * blend_fn(color_b, color))
-        self._color = _clip(
-            _divide((1. - shape) * alpha_previous * self._color + color_t,
-                    self._alpha)
+        blend_fn(color_b, color, out=blended)
+        blended *= alpha_b
+        np.subtract(1., alpha_b, out=scratch)
+        np.multiply(scratch, color, out=color_t)
+        color_t += blended
+        color_t *= alpha
+        np.subtract(shape, alpha, out=scratch)
+        scratch *= alpha_b
+        np.multiply(scratch, color_b, out=blended)
+        color_t += blended
+
+        # color = ((1 - shape) * alpha_previous * color + color_t) / alpha
+        np.subtract(1., shape, out=scratch)
+        scratch *= alpha_previous
+        np.multiply(scratch, color_previous, out=blended)
+        color_t += blended
+        _clip(
+            _divide(color_t, alpha_r, out=color_previous), out=color_previous
         )
+        np.copyto(alpha_previous, alpha_r)
+
+    def _get_index(self, bbox):
+        """Get the index of the bbox in the viewport arrays."""
+        return (
+            slice(bbox[1] - self._viewport[1], bbox[3] - self._viewport[1]),
+            slice(bbox[0] - self._viewport[0], bbox[2] - self._viewport[0]),
+        )
+
+    def _full(self, value):
+        """Get a constant single-channel array of the current region."""
+        region = self._region
+        return np.full((region[3] - region[1], region[2] - region[0], 1),
+                       value,
+                       dtype=np.float32)
+
+    def _get_color(self):
+        """Get the blended color.
+
+        Transparent pixels are white once anything is blended, regardless of
+        the region of the blended sources.
+        """
+        if not self._applied:
+            return self._color
+        return np.where(self._alpha == 0., 1., self._color).astype(np.float32)
 
     def finish(self):
         return self.color, self.shape, self.alpha
@@ -261,8 +636,9 @@ class Compositor(object):
 
     @property
     def color(self):
+        color = self._get_color()
         return _clip(
-            self._color + (self._color - self._color_0) *
+            color + (color - self._color_0) *
             (_divide(self._alpha_0, self._alpha_g) - self._alpha_0)
         )
 
@@ -275,25 +651,29 @@ class Compositor(object):
         return self._alpha_g
 
     def _get_group(self, layer, knockout):
-        viewport = _intersect(self._viewport, layer.bbox)
+        viewport = _intersect(self._region, layer.bbox)
+        index = self._get_index(viewport)
         if knockout:
-            color_b = self._color_0
-            alpha_b = self._alpha_0
+            color_b = self._color_0[index]
+            alpha_b = self._alpha_0[index]
         else:
-            color_b = self._color
-            alpha_b = self._alpha
+            color_b = self._color[index]
+            alpha_b = self._alpha[index]
 
         color, shape, alpha = composite(
             layer,
-            paste(viewport, self._viewport, color_b, 1.),
-            paste(viewport, self._viewport, alpha_b),
+            color_b,
+            alpha_b,
             viewport,
             layer_filter=self._layer_filter,
-            force=self._force
+            force=self._force,
+            memo=self._memo,
+            workspace=self._workspace
         )
-        color = paste(self._viewport, viewport, color, 1.)
-        shape = paste(self._viewport, viewport, shape)
-        alpha = paste(self._viewport, viewport, alpha)
+        if viewport != self._region:
+            color = paste(self._region, viewport, color, 1.)
+            shape = paste(self._region, viewport, shape)
+            alpha = paste(self._region, viewport, alpha)
 
         # Composite clip layers.
         if layer.has_clip_layers():
@@ -306,26 +686,34 @@ class Compositor(object):
 
     def _get_object(self, layer):
         """Get object attributes."""
-        color, shape = layer.numpy('color'), layer.numpy('shape')
+        bbox = _intersect(self._region, layer.bbox)
+        with span('composite.decode', layer=layer) as stage:
+            color = get_layer_data(layer, 'color', viewport=bbox)
+            shape = get_layer_data(layer, 'shape', viewport=bbox)
+            if stage:
+                stage.set(nbytes=sum(
+                    x.nbytes for x in (color, shape) if x is not None
+                ))
         if (self._force or not layer.has_pixels()) and has_fill(layer):
-            color, shape = create_fill(layer, layer.bbox)
+            with span('composite.vector', layer=layer):
+                color, shape = create_fill(layer, layer.bbox, bbox)
             if shape is None:
-                shape = np.ones((layer.height, layer.width, 1),
+                shape = np.ones((bbox[3] - bbox[1], bbox[2] - bbox[0], 1),
                                 dtype=np.float32)
 
         if color is None and shape is None:
             # Empty pixel layer.
-            color = np.ones((self.height, self.width, 1), dtype=np.float32)
-            shape = np.zeros((self.height, self.width, 1), dtype=np.float32)
+            color = self._full(1.)
+            shape = self._full(0.)
 
         if color is None:
-            color = np.ones((self.height, self.width, 1), dtype=np.float32)
+            color = self._full(1.)
         else:
-            color = paste(self._viewport, layer.bbox, color, 1.)
+            color = paste(self._region, bbox, color, 1.)
         if shape is None:
-            shape = np.ones((self.height, self.width, 1), dtype=np.float32)
+            shape = self._full(1.)
         else:
-            shape = paste(self._viewport, layer.bbox, shape)
+            shape = paste(self._region, bbox, shape)
 
         alpha = shape * 1.  # Constant factor is always 1.
 
@@ -335,8 +723,11 @@ class Compositor(object):
 
         # Apply stroke if any.
         if layer.has_stroke() and layer.stroke.enabled:
-            color_s, shape_s, alpha_s = self._get_stroke(layer)
-            compositor = Compositor(self._viewport, color, alpha)
+            with span('composite.vector', layer=layer):
+                color_s, shape_s, alpha_s = self._get_stroke(layer)
+            compositor = Compositor(
+                self._region, color, alpha, workspace=self._workspace
+            )
             compositor._apply_source(
                 color_s, shape_s, alpha_s, layer.stroke.blend_mode
             )
@@ -350,15 +741,17 @@ class Compositor(object):
     def _apply_clip_layers(self, layer, color, alpha):
         # TODO: Consider Tag.BLEND_CLIPPING_ELEMENTS.
         compositor = Compositor(
-            self._viewport,
+            self._region,
             color,
             alpha,
             layer_filter=self._layer_filter,
-            force=self._force
+            force=self._force,
+            memo=self._memo,
+            workspace=self._workspace
         )
         for clip_layer in layer.clip_layers:
             compositor.apply(clip_layer)
-        return compositor._color
+        return compositor._get_color()
 
     def _get_mask(self, layer):
         """Get mask attributes."""
@@ -366,11 +759,17 @@ class Compositor(object):
         opacity = 1.
         if layer.has_mask() and not layer.mask.disabled:
             # TODO: When force, ignore real mask.
-            mask = layer.numpy('mask', real_mask=not self._force)
+            with span('composite.mask', layer=layer) as stage:
+                mask = get_layer_data(
+                    layer, 'mask', real_mask=not self._force,
+                    viewport=self._region
+                )
+                if stage and mask is not None:
+                    stage.set(nbytes=mask.nbytes)
             if mask is not None:
                 shape = paste(
-                    self._viewport, layer.mask.bbox, mask,
-                    layer.mask.background_color / 255.
+                    self._region, _intersect(self._region, layer.mask.bbox),
+                    mask, layer.mask.background_color / 255.
                 )
             if layer.mask.parameters:
                 density = layer.mask.parameters.user_mask_density
@@ -386,8 +785,8 @@ class Compositor(object):
                 not layer.mask._has_real()
             )
         ):
-            shape_v = draw_vector_mask(layer)
-            shape_v = paste(self._viewport, layer._psd.viewbox, shape_v)
+            with span('composite.vector', layer=layer):
+                shape_v = draw_vector_mask(layer, self._region)
             shape *= shape_v
 
         assert shape is not None
@@ -411,27 +810,27 @@ class Compositor(object):
         viewport = tuple(
             x + d for x, d in zip(layer.bbox, (-width, -width, width, width))
         )
+        region = _intersect(self._region, viewport)
         color, _ = create_fill_desc(
-            layer, desc.get('strokeStyleContent'), viewport
+            layer, desc.get('strokeStyleContent'), viewport, region
         )
-        color = paste(self._viewport, viewport, color, 1.)
-        shape = draw_stroke(layer)
-        if shape.shape[0] != self.height or shape.shape[1] != self.width:
-            bbox = (0, 0, shape.shape[1], shape.shape[0])
-            shape = paste(self._viewport, bbox, shape)
+        color = paste(self._region, region, color, 1.)
+        shape = draw_stroke(layer, self._region)
         opacity = desc.get('strokeStyleOpacity', 100.) / 100.
         alpha = shape * opacity
         return color, shape, alpha
 
     def _apply_color_overlay(self, layer, color, shape, alpha):
+        region = _intersect(self._region, layer.bbox)
         for effect in layer.effects.find('coloroverlay'):
-            color, shape_e = draw_solid_color_fill(layer.bbox, effect.value)
-            color = paste(self._viewport, layer.bbox, color, 1.)
+            color, shape_e = draw_solid_color_fill(
+                layer.bbox, effect.value, region
+            )
+            color = paste(self._region, region, color, 1.)
             if shape_e is None:
-                shape_e = np.ones((self.height, self.width, 1),
-                                  dtype=np.float32)
+                shape_e = self._full(1.)
             else:
-                shape_e = paste(self._viewport, layer.bbox, shape_e)
+                shape_e = paste(self._region, region, shape_e)
             opacity = effect.opacity / 100.
             self._apply_source(
                 color, shape * shape_e, alpha * shape_e * opacity,
@@ -439,16 +838,16 @@ class Compositor(object):
             )
 
     def _apply_pattern_overlay(self, layer, color, shape, alpha):
+        region = _intersect(self._region, layer.bbox)
         for effect in layer.effects.find('patternoverlay'):
             color, shape_e = draw_pattern_fill(
-                layer.bbox, layer._psd, effect.value
+                layer.bbox, layer._psd, effect.value, region
             )
-            color = paste(self._viewport, layer.bbox, color, 1.)
+            color = paste(self._region, region, color, 1.)
             if shape_e is None:
-                shape_e = np.ones((self.height, self.width, 1),
-                                  dtype=np.float32)
+                shape_e = self._full(1.)
             else:
-                shape_e = paste(self._viewport, layer.bbox, shape_e)
+                shape_e = paste(self._region, region, shape_e)
             opacity = effect.opacity / 100.
             self._apply_source(
                 color, shape * shape_e, alpha * shape_e * opacity,
@@ -456,34 +855,113 @@ class Compositor(object):
             )
 
     def _apply_gradient_overlay(self, layer, color, shape, alpha):
+        region = _intersect(self._region, layer.bbox)
         for effect in layer.effects.find('gradientoverlay'):
-            color, shape_e = draw_gradient_fill(layer.bbox, effect.value)
-            color = paste(self._viewport, layer.bbox, color, 1.)
+            color, shape_e = draw_gradient_fill(
+                layer.bbox, effect.value, region
+            )
+            color = paste(self._region, region, color, 1.)
             if shape_e is None:
-                shape_e = np.ones((self.height, self.width, 1),
-                                  dtype=np.float32)
+                shape_e = self._full(1.)
             else:
-                shape_e = paste(self._viewport, layer.bbox, shape_e)
+                shape_e = paste(self._region, region, shape_e)
             opacity = effect.opacity / 100.
             self._apply_source(
                 color, shape * shape_e, alpha * shape_e * opacity,
                 effect.blend_mode
             )
 
-    def _apply_stroke_effect(self, layer, color, shape, alpha):
-        for effect in layer.effects.find('stroke'):
-            # Effect must happen at the layer viewport.
-            shape = paste(layer.bbox, self._viewport, shape)
-            color, shape_e = draw_stroke_effect(
-                layer.bbox, shape, effect.value, layer._psd
-            )
-            color = paste(self._viewport, layer.bbox, color)
-            shape_e = paste(self._viewport, layer.bbox, shape_e)
+    def _apply_stroke_effect(
+        self, layer, color, shape, alpha, mask_only=False
+    ):
+        layer_shape = None
+        for index, effect in enumerate(layer.effects.find('stroke')):
+            key = (id(layer), index, mask_only)
+            if self._memo is not None and key in self._memo:
+                color, shape_e = self._memo[key]
+            else:
+                # Effect must happen at the layer viewport.
+                if layer_shape is None:
+                    layer_shape = self._get_layer_shape(
+                        layer, shape, mask_only
+                    )
+                color, shape_e = draw_stroke_effect(
+                    layer.bbox, layer_shape, effect.value, layer._psd
+                )
+                if self._memo is not None:
+                    self._memo[key] = (color, shape_e)
+            color = paste(self._region, layer.bbox, color)
+            shape_e = paste(self._region, layer.bbox, shape_e)
             opacity = effect.opacity / 100.
             self._apply_source(
                 color, shape_e, shape_e * opacity, effect.blend_mode
             )
 
+    def _get_layer_shape(self, layer, shape, mask_only=False):
+        """Get the shape of the layer in the layer bbox.
+
+        When the viewport does not cover the visible part of the layer, e.g.,
+        in a tile, the shape is composited again in the visible part.
+        """
+        region = _intersect(layer.bbox, layer._psd.viewbox)
+        if _intersect(self._region, region) != region:
+            compositor = Compositor(
+                region,
+                layer_filter=self._layer_filter,
+                force=self._force,
+                memo=self._memo,
+                workspace=self._workspace
+            )
+            shape_mask, _ = compositor._get_mask(layer)
+            if mask_only:
+                shape = shape_mask
+            elif layer.is_group():
+                shape = compositor._get_group(layer, False)[1] * shape_mask
+            else:
+                shape = compositor._get_object(layer)[1] * shape_mask
+            viewport = region
+        else:
+            viewport = self._region
+        if not isinstance(shape, np.ndarray):
+            shape = np.full((viewport[3] - viewport[1],
+                             viewport[2] - viewport[0], 1),
+                            shape,
+                            dtype=np.float32)
+        return paste(layer.bbox, viewport, shape)
+
+
+class Workspace(object):
+    """Scratch buffers reused by :py:class:`Compositor`.
+
+    A buffer is a view of a flat array that grows to the largest requested
+    size, so that blending layers of various sizes does not allocate once the
+    workspace is warm.
+    """
+    def __init__(self, dtype=np.float32):
+        self._dtype = dtype
+        self._buffers = {}
+
+    def get(self, name, shape):
+        """Get the named buffer of the given shape.
+
+        The content of the buffer is undefined.
+        """
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(size, dtype=self._dtype)
+            self._buffers[name] = buffer
+        return buffer[:size].reshape(shape)
+
+    @property
+    def nbytes(self):
+        """Total byte size of the buffers."""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def clear(self):
+        """Release the buffers."""
+        self._buffers.clear()
+
 
 def _intersect(a, b):
     inter = (
@@ -504,19 +982,25 @@ def has_fill(layer):
     return any(tag in layer.tagged_blocks for tag in FILL_TAGS)
 
 
-def _union(backdrop, source):
-    """Generalized union of shape."""
-    return backdrop + source - (backdrop * source)
+def _union(backdrop, source, out=None):
+    """Generalized union of shape.
+
+    `out` must not be either of the operands.
+    """
+    out = np.subtract(1., backdrop, out=out)
+    out *= source
+    out += backdrop
+    return out
 
 
-def _clip(x):
+def _clip(x, out=None):
     """Clip between [0, 1]."""
-    return np.clip(x, 0., 1.)
+    return np.clip(x, 0., 1., out=out)
 
 
-def _divide(a, b):
+def _divide(a, b, out=None):
     """Safe division for color ops."""
     with np.errstate(divide='ignore', invalid='ignore'):
-        c = np.true_divide(a, b)
-        c[~np.isfinite(c)] = 1.
+        c = np.true_divide(a, b, out=out)
+        np.copyto(c, 1., where=~np.isfinite(c))
     return c
@@ -11,79 +11,100 @@ logger = logging.getLogger(__name__)
 
 
 # Separable blend functions
-def normal(Cb, Cs):
-    return Cs
+#
+# Blend functions take an optional `out` buffer of the broadcast shape of `Cb`
+# and `Cs` so that the compositor can reuse preallocated arrays. `out` must
+# not be either of the operands.
+def normal(Cb, Cs, out=None):
+    if out is None:
+        return Cs
+    np.copyto(out, Cs)
+    return out
 
 
-def multiply(Cb, Cs):
-    return Cb * Cs
+def multiply(Cb, Cs, out=None):
+    return np.multiply(Cb, Cs, out=out)
 
 
-def screen(Cb, Cs):
-    return Cb + Cs - (Cb * Cs)
+def screen(Cb, Cs, out=None):
+    out = np.multiply(Cb, Cs, out=out)
+    np.subtract(Cb, out, out=out)
+    return np.add(out, Cs, out=out)
 
 
-def overlay(Cb, Cs):
-    return hard_light(Cs, Cb)
+def overlay(Cb, Cs, out=None):
+    return hard_light(Cs, Cb, out=out)
 
 
-def darken(Cb, Cs):
-    return np.minimum(Cb, Cs)
+def darken(Cb, Cs, out=None):
+    return np.minimum(Cb, Cs, out=out)
 
 
-def lighten(Cb, Cs):
-    return np.maximum(Cb, Cs)
+def lighten(Cb, Cs, out=None):
+    return np.maximum(Cb, Cs, out=out)
 
 
-def color_dodge(Cb, Cs, s=1.0):
-    B = np.zeros_like(Cb, dtype=np.float32)
-    B[Cs == 1] = 1
-    B[Cb == 0] = 0
-    index = (Cs != 1) & (Cb != 0)
-    B[index] = np.minimum(1, Cb[index] / (s * (1 - Cs[index])))
-    return B
-
+def color_dodge(Cb, Cs, s=1.0, out=None):
+    out = np.subtract(1., Cs, out=_empty(Cb, Cs, out))
+    if s != 1.0:
+        out *= s
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(Cb, out, out=out)
+    np.minimum(out, 1., out=out)
+    np.copyto(out, 1., where=(Cs == 1))
+    np.copyto(out, 0., where=(Cb == 0))
+    return out
 
-def color_burn(Cb, Cs, s=1.0):
-    B = np.zeros_like(Cb, dtype=np.float32)
-    B[Cb == 1] = 1
-    index = (Cb != 1) & (Cs != 0)
-    B[index] = 1 - np.minimum(1, (1 - Cb[index]) / (s * Cs[index]))
-    return B
 
+def color_burn(Cb, Cs, s=1.0, out=None):
+    # 1 - min(1, (1 - Cb) / (s * Cs)) == 1 + max(-1, (Cb - 1) / (s * Cs))
+    out = np.subtract(Cb, 1., out=_empty(Cb, Cs, out))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(out, Cs, out=out)
+        if s != 1.0:
+            out /= s
+    np.maximum(out, -1., out=out)
+    out += 1.
+    np.copyto(out, 0., where=(Cs == 0))
+    np.copyto(out, 1., where=(Cb == 1))
+    return out
 
-def linear_dodge(Cb, Cs):
-    return np.minimum(1, Cb + Cs)
 
+def linear_dodge(Cb, Cs, out=None):
+    out = np.add(Cb, Cs, out=out)
+    return np.minimum(out, 1., out=out)
 
-def linear_burn(Cb, Cs):
-    return np.maximum(0, Cb + Cs - 1)
 
+def linear_burn(Cb, Cs, out=None):
+    out = np.add(Cb, Cs, out=out)
+    out -= 1.
+    return np.maximum(out, 0., out=out)
 
-def hard_light(Cb, Cs):
-    index = Cs > 0.5
-    B = multiply(Cb, 2 * Cs)
-    B[index] = screen(Cb, 2 * Cs - 1)[index]
-    return B
 
+def hard_light(Cb, Cs, out=None):
+    out = np.multiply(Cs, 2., out=_empty(Cb, Cs, out))
+    index = np.broadcast_to(Cs > 0.5, out.shape)
+    screened = screen(_masked(Cb, index), out[index] - 1.)
+    out *= Cb
+    out[index] = screened
+    return out
 
-def soft_light(Cb, Cs):
-    index = Cs <= 0.25
-    index_not = ~index
-    D = np.zeros_like(Cb, dtype=np.float32)
-    D[index] = ((16 * Cb[index] - 12) * Cb[index] + 4) * Cb[index]
-    D[index_not] = np.sqrt(Cb[index_not])
 
-    index = Cs <= 0.5
-    index_not = ~index
-    B = np.zeros_like(Cb, dtype=np.float32)
-    B[index] = Cb[index] - (1 - 2 * Cs[index]) * Cb[index] * (1 - Cb[index])
-    B[index_not] = Cb[index_not] + \
-        (2 * Cs[index_not] - 1) * (D[index_not] - Cb[index_not])
-    return B
+def soft_light(Cb, Cs, out=None):
+    out = _empty(Cb, Cs, out)
+    # D(Cb) is sqrt(Cb) wherever it is used, i.e., Cs > 0.5.
+    index = np.broadcast_to(Cs > 0.5, out.shape)
+    Cb_i = _masked(Cb, index)
+    lightened = Cb_i + (2 * _masked(Cs, index) - 1) * (np.sqrt(Cb_i) - Cb_i)
+    np.subtract(1., Cb, out=out)
+    out *= Cb
+    out *= 1. - 2. * Cs
+    np.subtract(Cb, out, out=out)
+    out[index] = lightened
+    return out
 
 
-def vivid_light(Cb, Cs):
+def vivid_light(Cb, Cs, out=None):
     """
     Burns or dodges the colors by increasing or decreasing the contrast,
     depending on the blend color. If the blend color (light source) is lighter
@@ -99,10 +120,10 @@ def vivid_light(Cb, Cs):
 
     # On contrary to what the document says, Photoshop generates the inverse of
     # hard_mix
-    return hard_mix(Cs, Cb)
+    return hard_mix(Cs, Cb, out=out)
 
 
-def linear_light(Cb, Cs):
+def linear_light(Cb, Cs, out=None):
     """
     Burns or dodges the colors by decreasing or increasing the brightness,
     depending on the blend color. If the blend color (light source) is lighter
@@ -111,12 +132,16 @@ def linear_light(Cb, Cs):
     the brightness.
     """
     index = Cs > 0.5
-    B = linear_burn(Cb, 2 * Cs)
-    B[index] = linear_dodge(Cb, 2 * Cs - 1)[index]
-    return B
+    out = np.multiply(Cs, 2., out=_empty(Cb, Cs, out))
+    np.subtract(out, 1., out=out, where=index)
+    out += Cb
+    np.subtract(out, 1., out=out, where=~index)
+    np.minimum(out, 1., out=out, where=index)
+    np.maximum(out, 0., out=out, where=~index)
+    return out
 
 
-def pin_light(Cb, Cs):
+def pin_light(Cb, Cs, out=None):
     """
     Replaces the colors, depending on the blend color. If the blend color
     (light source) is lighter than 50% gray, pixels darker than the blend color
@@ -126,24 +151,31 @@ def pin_light(Cb, Cs):
     useful for adding special effects to an image.
     """
     index = Cs > 0.5
-    B = darken(Cb, 2 * Cs)
-    B[index] = lighten(Cb, 2 * Cs - 1)[index]
-    return B
+    out = np.multiply(Cs, 2., out=_empty(Cb, Cs, out))
+    np.subtract(out, 1., out=out, where=index)
+    np.maximum(Cb, out, out=out, where=index)
+    np.minimum(Cb, out, out=out, where=~index)
+    return out
 
 
-def difference(Cb, Cs):
-    return np.abs(Cb - Cs)
+def difference(Cb, Cs, out=None):
+    out = np.subtract(Cb, Cs, out=out)
+    return np.abs(out, out=out)
 
 
-def exclusion(Cb, Cs):
-    return Cb + Cs - 2 * Cb * Cs
+def exclusion(Cb, Cs, out=None):
+    out = np.multiply(Cb, Cs, out=out)
+    out *= 2.
+    np.subtract(Cb, out, out=out)
+    return np.add(out, Cs, out=out)
 
 
-def subtract(Cb, Cs):
-    return np.maximum(0, Cb - Cs)
+def subtract(Cb, Cs, out=None):
+    out = np.subtract(Cb, Cs, out=out)
+    return np.maximum(out, 0., out=out)
 
 
-def hard_mix(Cb, Cs):
+def hard_mix(Cb, Cs, out=None):
     """
     Adds the red, green and blue channel values of the blend color to the RGB
     values of the base color. If the resulting sum for a channel is 255 or
@@ -152,19 +184,31 @@ def hard_mix(Cb, Cs):
     either 0 or 255. This changes all pixels to primary additive colors (red,
     green, or blue), white, or black.
     """
-    B = np.zeros_like(Cb, dtype=np.float32)
-    B[(Cb + .999999 * Cs) >= 1] = 1  # There seems a weird numerical issue.
-    return B
+    # There seems a weird numerical issue.
+    out = np.multiply(Cs, .999999, out=_empty(Cb, Cs, out))
+    out += Cb
+    return np.greater_equal(out, 1., out=out)
 
 
-def divide(Cb, Cs):
+def divide(Cb, Cs, out=None):
     """
     Looks at the color information in each channel and divides the blend color
     from the base color.
     """
-    B = Cb / (Cs + 1e-6)
-    B[B > 1] = 1
-    return B
+    out = np.add(Cs, 1e-6, out=_empty(Cb, Cs, out))
+    np.divide(Cb, out, out=out)
+    return np.minimum(out, 1., out=out)
+
+
+def _empty(Cb, Cs, out):
+    """Get the output buffer of the broadcast shape of the operands."""
+    if out is None:
+        out = np.empty(np.broadcast(Cb, Cs).shape, dtype=np.float32)
+    return out
+
+
+def _masked(x, index):
+    return np.broadcast_to(x, index.shape)[index]
 
 
 # Non-separable blending must be in RGB. CMYK should be first converted to RGB,
@@ -174,16 +218,23 @@ def divide(Cb, Cs):
 def non_separable(k='s'):
     """Wrap non-separable blending function for CMYK handling.
 
+    The wrapped function takes an optional `out` buffer for the result.
+
     .. note: This implementation is still inaccurate.
     """
     def decorator(func):
         @functools.wraps(func)
-        def _blend_fn(Cb, Cs):
+        def _blend_fn(Cb, Cs, out=None):
             if Cs.shape[2] == 4:
                 K = Cs[:, :, 3:4] if k == 's' else Cb[:, :, 3:4]
                 Cb, Cs = _cmyk2rgb(Cb), _cmyk2rgb(Cs)
-                return np.concatenate((_rgb2cmy(func(Cb, Cs), K), K), axis=2)
-            return func(Cb, Cs)
+                B = np.concatenate((_rgb2cmy(func(Cb, Cs), K), K), axis=2)
+            else:
+                B = func(Cb, Cs)
+            if out is None:
+                return B
+            np.copyto(out, B)
+            return out
 
         return _blend_fn
 
@@ -239,10 +290,10 @@ def lighter_color(Cb, Cs):
     return B
 
 
-def dissolve(Cb, Cs):
+def dissolve(Cb, Cs, out=None):
     # TODO: Implement me!
     logger.debug('Dissolve blend is not implemented')
-    return normal(Cb, Cs)
+    return normal(Cb, Cs, out=out)
 
 
 # Helper functions from PDF reference.
@@ -16,11 +16,11 @@ _COLOR_FUNC = {
 }
 
 
-def draw_vector_mask(layer):
-    return _draw_path(layer, brush={'color': 255})
+def draw_vector_mask(layer, viewport=None):
+    return _draw_path(layer, brush={'color': 255}, viewport=viewport)
 
 
-def draw_stroke(layer):
+def draw_stroke(layer, viewport=None):
     desc = layer.stroke._data
     # _CAP = {
     #     'strokeStyleButtCap': 0,
@@ -41,6 +41,7 @@ def draw_stroke(layer):
     # aggdraw >= 1.3.12 will support additional params.
     return _draw_path(
         layer,
+        viewport=viewport,
         pen={
             'color': 255,
             'width': width,
@@ -51,8 +52,12 @@ def draw_stroke(layer):
     )
 
 
-def _draw_path(layer, brush=None, pen=None):
-    height, width = layer._psd.height, layer._psd.width
+def _draw_path(layer, brush=None, pen=None, viewport=None):
+    """
+    Rasterize the vector mask in the viewport, default is the canvas.
+    """
+    viewport = viewport or layer._psd.viewbox
+    height, width = viewport[3] - viewport[1], viewport[2] - viewport[0]
     color = 0
     if layer.vector_mask.initial_fill_rule and \
         len(layer.vector_mask.paths) == 0:
@@ -70,7 +75,10 @@ def _draw_path(layer, brush=None, pen=None):
     # Apply shape operation.
     first = True
     for subpath_list in paths:
-        plane = _draw_subpath(subpath_list, width, height, brush, pen)
+        plane = _draw_subpath(
+            subpath_list, layer._psd.width, layer._psd.height, brush, pen,
+            viewport
+        )
         assert mask.shape == (height, width, 1)
         assert plane.shape == mask.shape
 
@@ -92,7 +100,7 @@ def _draw_path(layer, brush=None, pen=None):
     return np.minimum(1, np.maximum(0, mask))
 
 
-def _draw_subpath(subpath_list, width, height, brush, pen):
+def _draw_subpath(subpath_list, width, height, brush, pen, viewport=None):
     """
     Rasterize Bezier curves.
 
@@ -100,7 +108,10 @@ def _draw_subpath(subpath_list, width, height, brush, pen):
     """
     from PIL import Image
     import aggdraw
-    mask = Image.new('L', (width, height), 0)
+    viewport = viewport or (0, 0, width, height)
+    mask = Image.new(
+        'L', (viewport[2] - viewport[0], viewport[3] - viewport[1]), 0
+    )
     draw = aggdraw.Draw(mask)
     pen = aggdraw.Pen(**pen) if pen else None
     brush = aggdraw.Brush(**brush) if brush else None
@@ -110,7 +121,7 @@ def _draw_subpath(subpath_list, width, height, brush, pen):
             continue
         path = ' '.join(map(str, _generate_symbol(subpath, width, height)))
         symbol = aggdraw.Symbol(path)
-        draw.symbol((0, 0), symbol, pen, brush)
+        draw.symbol((-viewport[0], -viewport[1]), symbol, pen, brush)
     draw.flush()
     del draw
     return np.expand_dims(np.array(mask).astype(np.float32) / 255., 2)
@@ -146,54 +157,59 @@ def _generate_symbol(path, width, height, command='C'):
         yield 'Z'
 
 
-def create_fill_desc(layer, desc, viewport):
+def create_fill_desc(layer, desc, viewport, region=None):
     """Create a fill image."""
     if desc.classID == b'solidColorLayer':
-        return draw_solid_color_fill(viewport, desc)
+        return draw_solid_color_fill(viewport, desc, region)
     if desc.classID == b'patternLayer':
-        return draw_pattern_fill(viewport, layer._psd, desc)
+        return draw_pattern_fill(viewport, layer._psd, desc, region)
     if desc.classID == b'gradientLayer':
-        return draw_gradient_fill(viewport, desc)
+        return draw_gradient_fill(viewport, desc, region)
     return None, None
 
 
-def create_fill(layer, viewport):
-    """Create a fill image."""
+def create_fill(layer, viewport, region=None):
+    """Create a fill image.
+
+    :param viewport: bbox that the fill covers.
+    :param region: part of `viewport` to rasterize, default is `viewport`.
+    """
     if Tag.SOLID_COLOR_SHEET_SETTING in layer.tagged_blocks:
         desc = layer.tagged_blocks.get_data(Tag.SOLID_COLOR_SHEET_SETTING)
-        return draw_solid_color_fill(viewport, desc)
+        return draw_solid_color_fill(viewport, desc, region)
     if Tag.PATTERN_FILL_SETTING in layer.tagged_blocks:
         desc = layer.tagged_blocks.get_data(Tag.PATTERN_FILL_SETTING)
-        return draw_pattern_fill(viewport, layer._psd, desc)
+        return draw_pattern_fill(viewport, layer._psd, desc, region)
     if Tag.GRADIENT_FILL_SETTING in layer.tagged_blocks:
         desc = layer.tagged_blocks.get_data(Tag.GRADIENT_FILL_SETTING)
-        return draw_gradient_fill(viewport, desc)
+        return draw_gradient_fill(viewport, desc, region)
     if Tag.VECTOR_STROKE_CONTENT_DATA in layer.tagged_blocks:
         stroke = layer.tagged_blocks.get_data(Tag.VECTOR_STROKE_DATA)
         if not stroke or stroke.get('fillEnabled').value is True:
             desc = layer.tagged_blocks.get_data(Tag.VECTOR_STROKE_CONTENT_DATA)
             if Key.Color in desc:
-                return draw_solid_color_fill(viewport, desc)
+                return draw_solid_color_fill(viewport, desc, region)
             elif Key.Pattern in desc:
-                return draw_pattern_fill(viewport, layer._psd, desc)
+                return draw_pattern_fill(viewport, layer._psd, desc, region)
             elif Key.Gradient in desc:
-                return draw_gradient_fill(viewport, desc)
+                return draw_gradient_fill(viewport, desc, region)
     return None, None
 
 
-def draw_solid_color_fill(viewport, desc):
+def draw_solid_color_fill(viewport, desc, region=None):
     """
     Create a solid color fill.
     """
     color_desc = desc.get(Key.Color)
     color_fn = _COLOR_FUNC.get(color_desc.classID, 1.0)
     fill = [color_fn(x) for x in color_desc.values()]
-    height, width = viewport[3] - viewport[1], viewport[2] - viewport[0]
+    region = viewport if region is None else region
+    height, width = region[3] - region[1], region[2] - region[0]
     color = np.full((height, width, len(fill)), fill, dtype=np.float32)
     return color, None
 
 
-def draw_pattern_fill(viewport, psd, desc):
+def draw_pattern_fill(viewport, psd, desc, region=None):
     """
     Create a pattern fill.
     """
@@ -215,32 +231,35 @@ def draw_pattern_fill(viewport, psd, desc):
         )
         panel = resize(panel, new_shape)
 
-    height, width = viewport[3] - viewport[1], viewport[2] - viewport[0]
-    reps = (
-        int(np.ceil(float(height) / panel.shape[0])),
-        int(np.ceil(float(width) / panel.shape[1])),
-        1,
-    )
+    # The pattern repeats from the viewport origin.
+    region = viewport if region is None else region
+    rows = np.arange(region[1] - viewport[1], region[3] - viewport[1])
+    columns = np.arange(region[0] - viewport[0], region[2] - viewport[0])
     channels = EXPECTED_CHANNELS.get(pattern.image_mode)
-    pixels = np.tile(panel, reps)[:height, :width, :]
+    pixels = panel[np.ix_(rows % panel.shape[0], columns % panel.shape[1])]
     if pixels.shape[2] > channels:
         return pixels[:, :, :channels], pixels[:, :, -1:]
     return pixels, None
 
 
-def draw_gradient_fill(viewport, desc):
+def draw_gradient_fill(viewport, desc, region=None):
     """
     Create a gradient fill image.
     """
     height, width = viewport[3] - viewport[1], viewport[2] - viewport[0]
+    region = viewport if region is None else region
 
     angle = float(desc.get(Key.Angle, 0))
     scale = float(desc.get(Key.Scale, 100.)) / 100.
     ratio = (angle % 90)
     scale *= (90. - ratio) / 90. * width + (ratio / 90.) * height
     X, Y = np.meshgrid(
-        np.linspace(-width / scale, width / scale, width, dtype=np.float32),
-        np.linspace(-height / scale, height / scale, height, dtype=np.float32),
+        np.linspace(-width / scale, width / scale, width,
+                    dtype=np.float32)[region[0] - viewport[0]:
+                                      region[2] - viewport[0]],
+        np.linspace(-height / scale, height / scale, height,
+                    dtype=np.float32)[region[1] - viewport[1]:
+                                      region[3] - viewport[1]],
     )
 
     gradient_kind = desc.get(Key.Type).enum
@@ -257,7 +276,7 @@ def draw_gradient_fill(viewport, desc):
     else:
         # Unsupported: b'shapeburst', only avail in stroke effect
         logger.warning('Unknown gradient style: %s.' % (gradient_kind))
-        Z = np.full((height, width), 0.5, dtype=np.float32)
+        Z = np.full(X.shape, 0.5, dtype=np.float32)
 
     Z = np.maximum(0., np.minimum(1., Z))
     if bool(desc.get(Key.Reverse, False)):
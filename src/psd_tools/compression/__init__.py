@@ -3,12 +3,10 @@ Image compression utils.
 """
 from __future__ import absolute_import, unicode_literals
 import array
-import io
 import zlib
 from psd_tools.constants import Compression
-from psd_tools.utils import (
-    be_array_from_bytes, be_array_to_bytes, read_be_array, write_be_array
-)
+from psd_tools.profiling import span
+from psd_tools.utils import be_array_from_bytes, be_array_to_bytes
 try:
     from . import _rle as rle_impl
 except ImportError:
@@ -26,17 +24,18 @@ def compress(data, compression, width, height, depth, version=1):
     :param version: psd file version.
     :return: compressed data bytes.
     """
-    if compression == Compression.RAW:
-        result = data
-    elif compression == Compression.RLE:
-        result = encode_rle(data, width, height, depth, version)
-    elif compression == Compression.ZIP:
-        result = zlib.compress(data)
-    else:
-        encoded = encode_prediction(data, width, height, depth)
-        result = zlib.compress(encoded)
+    with span('compress', nbytes=len(data), compression=compression):
+        if compression == Compression.RAW:
+            result = data
+        elif compression == Compression.RLE:
+            result = encode_rle(data, width, height, depth, version)
+        elif compression == Compression.ZIP:
+            result = zlib.compress(data)
+        else:
+            encoded = encode_prediction(data, width, height, depth)
+            result = zlib.compress(encoded)
 
-    return result
+        return result
 
 
 def decompress(data, compression, width, height, depth, version=1):
@@ -51,52 +50,441 @@ def decompress(data, compression, width, height, depth, version=1):
     :param version: psd file version.
     :return: decompressed data bytes.
     """
-    length = width * height * max(1, depth // 8)
+    with span('decompress', nbytes=len(data), compression=compression):
+        length = width * height * max(1, depth // 8)
 
-    result = None
-    if compression == Compression.RAW:
-        result = data[:length]
-    elif compression == Compression.RLE:
-        result = decode_rle(data, width, height, depth, version)
-    elif compression == Compression.ZIP:
-        result = zlib.decompress(data)
-    else:
-        decompressed = zlib.decompress(data)
-        result = decode_prediction(decompressed, width, height, depth)
+        result = None
+        if compression == Compression.RAW:
+            result = data[:length]
+        elif compression == Compression.RLE:
+            result = decode_rle(data, width, height, depth, version)
+        elif compression == Compression.ZIP:
+            result = zlib.decompress(data)
+        else:
+            decompressed = zlib.decompress(data)
+            result = decode_prediction(decompressed, width, height, depth)
 
-    if depth >= 8:
+        if depth >= 8:
+            assert len(result) == length, (
+                'len=%d, expected=%d' % (len(result), length)
+            )
+
+        return result
+
+
+def decompress_rows(
+    data, compression, width, height, depth, version=1, start=0, stop=None
+):
+    """Decompress a range of rows.
+
+    RLE and raw data are decoded only for the requested rows, and ZIP data is
+    inflated incrementally up to the last requested row.
+
+    :param data: compressed data bytes.
+    :param compression: compression type,
+            see :py:class:`~psd_tools.constants.Compression`.
+    :param width: width.
+    :param height: height.
+    :param depth: bit depth of the pixel.
+    :param version: psd file version.
+    :param start: first row to decode.
+    :param stop: row to stop decoding at, default is `height`.
+    :return: decompressed data bytes of rows from `start` to `stop`.
+    """
+    stop = height if stop is None else stop
+    if depth < 8:
+        result = decompress(data, compression, width, height, depth, version)
+        row_size = len(result) // height if height else 0
+        return result[start * row_size:stop * row_size]
+
+    with span('decompress', nbytes=len(data), compression=compression):
+        row_size = width * depth // 8
+        if compression == Compression.RAW:
+            result = data[start * row_size:stop * row_size]
+        elif compression == Compression.RLE:
+            view = memoryview(data)
+            count_size = (2, 4)[version - 1]
+            counts = be_array_from_bytes(
+                ('H', 'I')[version - 1], view[:height * count_size].tobytes()
+            )
+            offset = height * count_size + sum(counts[:start])
+            length = sum(counts[start:stop])
+            chunk = (
+                view[start * count_size:stop * count_size].tobytes() +
+                view[offset:offset + length].tobytes()
+            )
+            result = decode_rle(chunk, width, stop - start, depth, version)
+        else:
+            result = _inflate_rows(data, row_size, start, stop)
+            if compression != Compression.ZIP:
+                result = decode_prediction(result, width, stop - start, depth)
+
+        length = (stop - start) * row_size
         assert len(result) == length, (
             'len=%d, expected=%d' % (len(result), length)
         )
+        return result
+
 
+class RowReader(object):
+    """Forward-only reader of row ranges of ZIP compressed data.
+
+    Consecutive ranges are inflated by a single zlib stream, so reading a
+    channel band by band inflates every row once. The last range is kept,
+    and reading it again, e.g., for the next tile of the same band, does not
+    inflate anything. A range before the last one starts over from the
+    first row.
+
+    :param data: compressed data bytes.
+    :param compression: compression type, either
+        :py:attr:`~psd_tools.constants.Compression.ZIP` or
+        :py:attr:`~psd_tools.constants.Compression.ZIP_WITH_PREDICTION`.
+    :param width: width.
+    :param height: height.
+    :param depth: bit depth of the pixel, 8 or more.
+    """
+    def __init__(self, data, compression, width, height, depth):
+        assert depth >= 8
+        self._data = data
+        self._compression = compression
+        self._width = width
+        self._depth = depth
+        self._row_size = width * depth // 8
+        self._inflater = None
+        self._start = 0
+        self._stop = 0
+        self._rows = b''
+
+    def read(self, start, stop):
+        """Read decompressed rows from `start` to `stop`."""
+        row_size = self._row_size
+        if self._inflater is None or start < self._start:
+            self._inflater = _Inflater(self._data)
+            self._start = self._stop = 0
+            self._rows = b''
+        if start > self._stop:
+            self._inflater.skip((start - self._stop) * row_size)
+            self._start = self._stop = start
+            self._rows = b''
+        if stop > self._stop:
+            with span(
+                'decompress', nbytes=len(self._data),
+                compression=self._compression
+            ):
+                rows = self._inflater.read((stop - self._stop) * row_size)
+                if self._compression != Compression.ZIP:
+                    rows = decode_prediction(
+                        rows, self._width, stop - self._stop, self._depth
+                    )
+            self._rows = (
+                self._rows[(start - self._start) * row_size:] + rows
+            )
+            self._start, self._stop = start, stop
+        result = self._rows[(start - self._start) * row_size:
+                            (stop - self._start) * row_size]
+        length = (stop - start) * row_size
+        assert len(result) == length, (
+            'len=%d, expected=%d' % (len(result), length)
+        )
+        return result
+
+
+def decompress_sampled(
+    data, compression, width, height, depth, version=1, rows=()
+):
+    """Decompress the given rows.
+
+    RLE and raw data are decoded only for the requested rows, reading the
+    compressed bytes by slices so that `data` can be a lazy reference such
+    as :py:class:`~psd_tools.psd.source.ByteRange`. ZIP data is inflated
+    in chunks, keeping only the requested rows.
+
+    :param data: compressed data bytes.
+    :param compression: compression type,
+            see :py:class:`~psd_tools.constants.Compression`.
+    :param width: width.
+    :param height: height.
+    :param depth: bit depth of the pixel.
+    :param version: psd file version.
+    :param rows: sorted row indices to decode.
+    :return: decompressed data bytes of the rows in the given order.
+    """
+    import numpy as np
+
+    rows = list(rows)
+    if depth < 8:
+        result = decompress(
+            bytes(data[:len(data)]), compression, width, height, depth,
+            version
+        )
+        row_size = len(result) // height if height else 0
+        return b''.join(
+            result[row * row_size:(row + 1) * row_size] for row in rows
+        )
+
+    row_size = width * depth // 8
+    if compression == Compression.RAW:
+        result = b''.join(
+            bytes(data[row * row_size:(row + 1) * row_size]) for row in rows
+        )
+    elif compression == Compression.RLE:
+        count_size = (2, 4)[version - 1]
+        counts = np.frombuffer(
+            bytes(data[:height * count_size]), ('>u2', '>u4')[version - 1]
+        )
+        offsets = np.cumsum(counts, dtype=np.int64) - counts
+        offsets += height * count_size
+        selected = counts[rows]
+        chunk = selected.tobytes() + b''.join(
+            bytes(data[offset:offset + count])
+            for offset, count in zip(offsets[rows].tolist(), selected.tolist())
+        )
+        result = decode_rle(chunk, width, len(rows), depth, version)
+    else:
+        wanted = set(rows)
+        selected = {}
+        for row, value in enumerate(_iter_inflated_rows(data, row_size)):
+            if row in wanted:
+                selected[row] = value
+                if len(selected) == len(wanted):
+                    break
+        result = b''.join(selected[row] for row in rows)
+        if compression != Compression.ZIP:
+            result = decode_prediction(result, width, len(rows), depth)
+
+    length = len(rows) * row_size
+    assert len(result) == length, (
+        'len=%d, expected=%d' % (len(result), length)
+    )
     return result
 
 
-def encode_rle(data, width, height, depth, version):
+def iter_decompressed_planes(
+    data, compression, width, height, channels, depth, version=1, rows=64
+):
+    """Decompress planar data by horizontal strips.
+
+    Planar data consists of `channels` planes of `height` rows, such as the
+    merged image data. Each strip holds up to `rows` rows of every plane, so
+    that the memory usage does not depend on the height. RLE and raw data
+    are sliced by rows, and a ZIP stream is inflated by one decompressor per
+    plane that starts at the beginning of the plane.
+
+    :param data: compressed data bytes.
+    :param compression: compression type,
+            see :py:class:`~psd_tools.constants.Compression`.
+    :param width: width.
+    :param height: height of each plane.
+    :param channels: number of planes.
+    :param depth: bit depth of the pixel.
+    :param version: psd file version.
+    :param rows: number of rows in a strip.
+    :return: generator of `(top, planes)` tuples, where `planes` is a list of
+        decompressed bytes of the strip for each plane.
+    """
+    import numpy as np
+
+    if depth < 8:
+        result = decompress(
+            bytes(data[:len(data)]), compression, width, height * channels,
+            depth, version
+        )
+        row_size = len(result) // (height * channels) if height else 0
+        for top in range(0, height, rows):
+            bottom = min(top + rows, height)
+            yield top, [
+                result[(index * height + top) * row_size:
+                       (index * height + bottom) * row_size]
+                for index in range(channels)
+            ]
+        return
+
     row_size = width * depth // 8
-    with io.BytesIO(data) as fp:
-        rows = [rle_impl.encode(fp.read(row_size)) for _ in range(height)]
-    bytes_counts = array.array(('H', 'I')[version - 1], map(len, rows))
-    encoded = b''.join(rows)
+    if compression == Compression.RAW:
+        for top in range(0, height, rows):
+            bottom = min(top + rows, height)
+            yield top, [
+                bytes(
+                    data[(index * height + top) * row_size:
+                         (index * height + bottom) * row_size]
+                ) for index in range(channels)
+            ]
+    elif compression == Compression.RLE:
+        count_size = (2, 4)[version - 1]
+        counts = np.frombuffer(
+            bytes(data[:height * channels * count_size]),
+            ('>u2', '>u4')[version - 1]
+        )
+        offsets = np.cumsum(counts, dtype=np.int64)
+        offsets += height * channels * count_size
+        for top in range(0, height, rows):
+            bottom = min(top + rows, height)
+            planes = []
+            for index in range(channels):
+                start, stop = index * height + top, index * height + bottom
+                chunk = counts[start:stop].tobytes() + bytes(
+                    data[int(offsets[start] - counts[start]):
+                         int(offsets[stop - 1])]
+                )
+                planes.append(
+                    decode_rle(chunk, width, bottom - top, depth, version)
+                )
+            yield top, planes
+    else:
+        inflaters = []
+        inflater = _Inflater(data)
+        for index in range(channels):
+            if index:
+                inflater.skip(height * row_size)
+            inflaters.append(inflater.copy())
+        for top in range(0, height, rows):
+            bottom = min(top + rows, height)
+            planes = []
+            for inflater in inflaters:
+                plane = inflater.read((bottom - top) * row_size)
+                if compression != Compression.ZIP:
+                    plane = decode_prediction(
+                        plane, width, bottom - top, depth
+                    )
+                planes.append(plane)
+            yield top, planes
+
+
+class _Inflater(object):
+    """Incremental zlib reader over sliceable compressed data."""
+    def __init__(self, data, chunk_size=1 << 16):
+        self._data = data
+        self._chunk_size = chunk_size
+        self._decompressor = zlib.decompressobj()
+        self._position = 0
+        self._tail = b''
+
+    def read(self, size):
+        """Read up to `size` decompressed bytes."""
+        result = []
+        while size > 0:
+            if not self._tail:
+                if (
+                    self._position >= len(self._data) or
+                    self._decompressor.eof
+                ):
+                    break
+                self._tail = bytes(
+                    self._data[self._position:self._position +
+                               self._chunk_size]
+                )
+                self._position += self._chunk_size
+            chunk = self._decompressor.decompress(self._tail, size)
+            self._tail = self._decompressor.unconsumed_tail
+            result.append(chunk)
+            size -= len(chunk)
+        return b''.join(result)
+
+    def skip(self, size):
+        """Skip `size` decompressed bytes."""
+        while size > 0:
+            chunk = self.read(min(size, self._chunk_size))
+            if not chunk:
+                break
+            size -= len(chunk)
+
+    def copy(self):
+        """Copy the reader at the current position."""
+        other = self.__class__.__new__(self.__class__)
+        other._data = self._data
+        other._chunk_size = self._chunk_size
+        other._decompressor = self._decompressor.copy()
+        other._position = self._position
+        other._tail = self._tail
+        return other
+
+
+def _iter_inflated_rows(data, row_size):
+    """Inflate zlib data by slices and yield rows of `row_size` bytes."""
+    inflater = _Inflater(data)
+    while True:
+        row = inflater.read(row_size)
+        if len(row) < row_size:
+            break
+        yield row
+
+
+def _inflate_rows(data, row_size, start, stop):
+    """Inflate zlib data up to `stop` rows, discarding rows before `start`."""
+    inflater = _Inflater(data)
+    inflater.skip(start * row_size)
+    return inflater.read((stop - start) * row_size)
 
-    with io.BytesIO() as fp:
-        write_be_array(fp, bytes_counts)
-        fp.write(encoded)
-        result = fp.getvalue()
 
-    return result
+def encode_rle(data, width, height, depth, version):
+    row_size = width * depth // 8
+    return rle_impl.encode_rows(data, height, row_size, version)
 
 
-def decode_rle(data, width, height, depth, version):
+def decode_rle(data, width, height, depth, version, out=None):
+    """
+    Decode RLE compressed data.
+
+    :param out: optional writable buffer, such as a `uint8` NumPy array, to
+        receive the decoded bytes.
+    """
     row_size = max(width * depth // 8, 1)
-    with io.BytesIO(data) as fp:
-        bytes_counts = read_be_array(('H', 'I')[version - 1], height, fp)
-        return b''.join(
-            rle_impl.decode(fp.read(count), row_size) for count in bytes_counts
-        )
+    return rle_impl.decode_rows(data, height, row_size, version, out)
 
 
 def encode_prediction(data, w, h, depth):
+    """
+    Encode raw data with delta prediction, vectorized in NumPy.
+
+    Rows are differenced with modular wraparound of the pixel type. 32bit
+    values are split into bytes before differencing, see
+    :py:func:`_shuffled_order`.
+    """
+    import numpy as np
+
+    if depth == 8:
+        arr = np.frombuffer(data, np.uint8).reshape((h, w))
+    elif depth == 16:
+        arr = np.frombuffer(data, '>u2').reshape((h, w)).astype(np.uint16)
+    elif depth == 32:
+        arr = np.frombuffer(data, np.uint8).reshape((h, w, 4))
+        arr = arr.transpose((0, 2, 1)).reshape((h, w * 4))
+    else:
+        raise ValueError('Invalid pixel size %d' % (depth))
+
+    encoded = arr.copy()
+    np.subtract(arr[:, 1:], arr[:, :-1], out=encoded[:, 1:])
+    if depth == 16:
+        return encoded.astype('>u2').tobytes()
+    return encoded.tobytes()
+
+
+def decode_prediction(data, w, h, depth):
+    """
+    Decode delta-predicted data, vectorized in NumPy.
+
+    Rows are restored by a cumulative sum that wraps around in the pixel
+    type, and 32bit bytes are recombined by a transpose.
+    """
+    import numpy as np
+
+    if depth == 8:
+        arr = np.frombuffer(data, np.uint8).reshape((h, w))
+        return np.cumsum(arr, axis=1, dtype=np.uint8).tobytes()
+    elif depth == 16:
+        arr = np.frombuffer(data, '>u2').reshape((h, w))
+        arr = np.cumsum(arr, axis=1, dtype=np.uint16)
+        return arr.astype('>u2').tobytes()
+    elif depth == 32:
+        arr = np.frombuffer(data, np.uint8).reshape((h, w * 4))
+        arr = np.cumsum(arr, axis=1, dtype=np.uint8).reshape((h, 4, w))
+        return arr.transpose((0, 2, 1)).tobytes()
+    else:
+        raise ValueError('Invalid pixel size %d' % (depth))
+
+
+def _encode_prediction(data, w, h, depth):
+    """Pure-Python reference of :py:func:`encode_prediction`."""
     if depth == 8:
         arr = array.array('B', data)
         arr = _delta_encode(arr, 0x100, w, h)
@@ -109,12 +497,13 @@ def encode_prediction(data, w, h, depth):
         arr = array.array('B', data)
         arr = _shuffle_byte_order(arr, w, h)
         arr = _delta_encode(arr, 0x100, w * 4, h)
-        return getattr(arr, 'tobytes', getattr(arr, 'tostring'))()
+        return _tobytes(arr)
     else:
         raise ValueError('Invalid pixel size %d' % (depth))
 
 
-def decode_prediction(data, w, h, depth):
+def _decode_prediction(data, w, h, depth):
+    """Pure-Python reference of :py:func:`decode_prediction`."""
     if depth == 8:
         arr = be_array_from_bytes('B', data)
         arr = _delta_decode(arr, 0x100, w, h)
@@ -128,7 +517,13 @@ def decode_prediction(data, w, h, depth):
     else:
         raise ValueError('Invalid pixel size %d' % (depth))
 
-    return getattr(arr, 'tobytes', getattr(arr, 'tostring'))()
+    return _tobytes(arr)
+
+
+def _tobytes(arr):
+    if hasattr(arr, 'tobytes'):
+        return arr.tobytes()
+    return arr.tostring()
 
 
 def _delta_encode(arr, mod, w, h):
@@ -126,3 +126,237 @@ def finish_raw(buf, result):
 def finish_rle(result, repeat_count, data, pos):
     result.append(256-(repeat_count - 1))
     result.append(data[pos])
+
+
+cdef extern from "Python.h":
+    bytes PyBytes_FromStringAndSize(char *v, Py_ssize_t len)
+    char* PyBytes_AS_STRING(object o)
+
+
+cdef Py_ssize_t _read_count(
+    const unsigned char[:] data, Py_ssize_t index, int size
+) nogil:
+    cdef Py_ssize_t value = 0
+    cdef int i
+    for i in range(size):
+        value = (value << 8) | data[index * size + i]
+    return value
+
+
+cdef int _decode_row(
+    const unsigned char[:] data, Py_ssize_t src, Py_ssize_t end,
+    unsigned char* result, Py_ssize_t size, Py_ssize_t* decoded
+) nogil:
+    cdef Py_ssize_t dst = 0
+    cdef Py_ssize_t length
+    cdef int header
+    while src < end:
+        header = data[src]
+        if header > 127:
+            header -= 256
+        src += 1
+
+        if 0 <= header <= 127:
+            length = header + 1
+            if src + length <= end and dst + length <= size:
+                memcpy(&result[dst], &data[src], length)
+                src += length
+                dst += length
+            else:
+                return -1
+        elif header == -128:
+            pass
+        else:
+            length = 1 - header
+            if src + 1 <= end and dst + length <= size:
+                memset(&result[dst], data[src], length)
+                src += 1
+                dst += length
+            else:
+                return -1
+    decoded[0] = dst
+    if dst < size:
+        return -2
+    return 0
+
+
+def decode_rows(
+    const unsigned char[:] data, Py_ssize_t height, Py_ssize_t row_size,
+    int version=1, unsigned char[:] out=None
+):
+    """
+    Decodes RLE encoded rows prefixed by the byte counts table.
+
+    The GIL is released while decoding.
+
+    :param data: byte counts table followed by the encoded rows.
+    :param height: number of rows.
+    :param row_size: byte size of the decoded row.
+    :param version: psd file version, which determines the counts format.
+    :param out: optional writable buffer of `height * row_size` bytes.
+    :return: `bytes`, or `out` when specified.
+    """
+    cdef int count_size = 2 if version == 1 else 4
+    cdef Py_ssize_t size = height * row_size
+    cdef Py_ssize_t src = height * count_size
+    cdef Py_ssize_t length = data.shape[0]
+    cdef Py_ssize_t count, decoded = 0, row = 0
+    cdef unsigned char* result
+    cdef int status = 0
+
+    if src > length:
+        raise ValueError('Invalid RLE compression')
+    if out is None:
+        py_result = PyBytes_FromStringAndSize(NULL, size)
+        result = <unsigned char*> PyBytes_AS_STRING(py_result)
+    else:
+        if out.shape[0] < size:
+            raise ValueError('Output buffer too small')
+        py_result = out.base
+        result = &out[0] if size > 0 else NULL
+
+    with nogil:
+        while row < height:
+            count = _read_count(data, row, count_size)
+            if src + count > length:
+                status = -1
+                break
+            status = _decode_row(
+                data, src, src + count, &result[row * row_size], row_size,
+                &decoded
+            )
+            if status != 0:
+                break
+            src += count
+            row += 1
+
+    if status == -1:
+        raise ValueError('Invalid RLE compression')
+    elif status == -2:
+        raise ValueError('Expected %d bytes but decoded only %d bytes' % (
+            row_size, decoded))
+    return py_result
+
+
+cdef Py_ssize_t _encode_row(
+    const unsigned char[:] data, Py_ssize_t start, Py_ssize_t length,
+    unsigned char* result
+) nogil:
+    # Same algorithm as encode(), writing into a preallocated buffer.
+    cdef Py_ssize_t pos = 0
+    cdef Py_ssize_t dst = 0
+    cdef Py_ssize_t raw_start = 0
+    cdef Py_ssize_t raw_length = 0
+    cdef int repeat_count = 0
+    cdef int MAX_LENGTH = 127
+    cdef State state = State.RAW
+
+    if length == 0:
+        return 0
+    if length == 1:
+        result[0] = 0
+        result[1] = data[start]
+        return 2
+
+    while pos < length - 1:
+        if data[start + pos] == data[start + pos + 1]:
+            if state == State.RAW:
+                if raw_length > 0:
+                    result[dst] = raw_length - 1
+                    memcpy(&result[dst + 1], &data[start + raw_start],
+                           raw_length)
+                    dst += raw_length + 1
+                    raw_length = 0
+                state = State.RLE
+                repeat_count = 1
+            elif state == State.RLE:
+                if repeat_count == MAX_LENGTH:
+                    result[dst] = 256 - (repeat_count - 1)
+                    result[dst + 1] = data[start + pos]
+                    dst += 2
+                    repeat_count = 0
+                repeat_count += 1
+        else:
+            if state == State.RLE:
+                repeat_count += 1
+                result[dst] = 256 - (repeat_count - 1)
+                result[dst + 1] = data[start + pos]
+                dst += 2
+                state = State.RAW
+                repeat_count = 0
+            elif state == State.RAW:
+                if raw_length == MAX_LENGTH:
+                    result[dst] = raw_length - 1
+                    memcpy(&result[dst + 1], &data[start + raw_start],
+                           raw_length)
+                    dst += raw_length + 1
+                    raw_length = 0
+                if raw_length == 0:
+                    raw_start = pos
+                raw_length += 1
+        pos += 1
+
+    if state == State.RAW:
+        if raw_length == 0:
+            raw_start = pos
+        raw_length += 1
+        result[dst] = raw_length - 1
+        memcpy(&result[dst + 1], &data[start + raw_start], raw_length)
+        dst += raw_length + 1
+    else:
+        repeat_count += 1
+        result[dst] = 256 - (repeat_count - 1)
+        result[dst + 1] = data[start + pos]
+        dst += 2
+    return dst
+
+
+def encode_rows(
+    const unsigned char[:] data, Py_ssize_t height, Py_ssize_t row_size,
+    int version=1
+):
+    """
+    Encodes rows using RLE encoding, prefixed by the byte counts table.
+
+    The GIL is released while encoding.
+
+    :param data: raw data of `height * row_size` bytes.
+    :param height: number of rows.
+    :param row_size: byte size of the row.
+    :param version: psd file version, which determines the counts format.
+    :return: `bytes`
+    """
+    cdef int count_size = 2 if version == 1 else 4
+    cdef Py_ssize_t header_size = height * count_size
+    # A row never grows beyond 2 bytes per input byte.
+    cdef Py_ssize_t bound = header_size + height * (2 * row_size + 2)
+    cdef Py_ssize_t dst = header_size
+    cdef Py_ssize_t count, row = 0
+    cdef unsigned char* result
+    cdef int i
+
+    if data.shape[0] < height * row_size:
+        raise ValueError('Expected %d bytes but given only %d bytes' % (
+            height * row_size, data.shape[0]))
+
+    result = <unsigned char*> malloc(bound * sizeof(char))
+    if not result:
+        raise MemoryError()
+
+    try:
+        with nogil:
+            while row < height:
+                count = _encode_row(
+                    data, row * row_size, row_size, &result[dst]
+                )
+                for i in range(count_size):
+                    result[row * count_size + i] = (
+                        count >> (8 * (count_size - 1 - i))
+                    ) & 0xff
+                dst += count
+                row += 1
+        py_result = result[:dst]
+    finally:
+        free(result)
+
+    return py_result
@@ -1,3 +1,6 @@
+import struct
+
+
 def decode(data, size):
     """
     Decodes RLE encoded data.
@@ -37,6 +40,41 @@ def decode(data, size):
     return bytes(result)
 
 
+def decode_rows(data, height, row_size, version=1, out=None):
+    """
+    Decodes RLE encoded rows prefixed by the byte counts table.
+
+    :param data: byte counts table followed by the encoded rows.
+    :param height: number of rows.
+    :param row_size: byte size of the decoded row.
+    :param version: psd file version, which determines the counts format.
+    :param out: optional writable buffer of `height * row_size` bytes.
+    :return: `bytes`, or `out` when specified.
+    """
+    count_size = (2, 4)[version - 1]
+    view = memoryview(data)
+    src = height * count_size
+    if src > len(view):
+        raise ValueError('Invalid RLE compression')
+    counts = struct.unpack(
+        str('>%d%s' % (height, ('H', 'I')[version - 1])), view[:src]
+    )
+    if out is None:
+        result = bytearray(height * row_size)
+    else:
+        result = memoryview(out).cast('B')
+        if len(result) < height * row_size:
+            raise ValueError('Output buffer too small')
+    for row, count in enumerate(counts):
+        if src + count > len(view):
+            raise ValueError('Invalid RLE compression')
+        start = row * row_size
+        result[start:start + row_size] = decode(view[src:src + count],
+                                                row_size)
+        src += count
+    return bytes(result) if out is None else out
+
+
 def encode(data):
     """
     Encodes data using RLE encoding.
@@ -101,6 +139,30 @@ def encode(data):
     return bytes(result)
 
 
+def encode_rows(data, height, row_size, version=1):
+    """
+    Encodes rows using RLE encoding, prefixed by the byte counts table.
+
+    :param data: raw data of `height * row_size` bytes.
+    :param height: number of rows.
+    :param row_size: byte size of the row.
+    :param version: psd file version, which determines the counts format.
+    :return: `bytes`
+    """
+    view = memoryview(data)
+    if len(view) < height * row_size:
+        raise ValueError('Expected %d bytes but given only %d bytes' % (
+            height * row_size, len(view)))
+    rows = [
+        encode(view[row * row_size:(row + 1) * row_size].tobytes())
+        for row in range(height)
+    ]
+    counts = struct.pack(
+        str('>%d%s' % (height, ('H', 'I')[version - 1])), *map(len, rows)
+    )
+    return counts + b''.join(rows)
+
+
 def finish_raw(buf, result):
     if len(buf) == 0:
         return
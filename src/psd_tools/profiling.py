@@ -0,0 +1,302 @@
+"""
+Profiling module.
+
+Stages of reading, decoding, compositing, and writing documents emit timing
+events to the registered listeners. Instrumentation is disabled while no
+listener is registered, and each instrumented stage then costs one function
+call.
+
+Events are :py:class:`Event` objects named after the stage:
+
+- `open`: :py:meth:`~psd_tools.PSDImage.open`
+- `read.header`, `read.color_mode_data`, `read.image_resources`,
+  `read.layer_and_mask_information`, `read.image_data`: sections in
+  :py:meth:`~psd_tools.psd.PSD.read`
+- `decompress`, `compress`: a channel or the merged image
+- `composite`: :py:func:`~psd_tools.composite.composite`
+- `composite.layer`: a layer or a group
+- `composite.decode`: decoded pixels of a layer
+- `composite.mask`: user and vector masks of a layer
+- `composite.vector`: rasterized fills, strokes, and vector masks
+- `composite.effects`: layer effects
+- `composite.blend`: blending a source into the backdrop
+- `save`: :py:meth:`~psd_tools.PSDImage.save`
+- `write.header`, ...: sections in :py:meth:`~psd_tools.psd.PSD.write`
+
+Events have the byte count of the stage in `nbytes`: the file bytes of
+sections, the input bytes of codecs, and the decoded array bytes of
+`composite.decode` and `composite.mask`. Composite events of a layer have
+the layer in `attrs`. Groups composite recursively, so `composite` events
+nest; the outermost one has `depth` 0 unless it is itself inside `open` or
+another stage.
+Listeners are called in the thread that runs the stage, which can be a
+worker thread of the decoder or the compositor.
+
+Example::
+
+    from psd_tools import PSDImage, profiling
+
+    def on_event(event):
+        metrics.timing(event.name, event.duration, nbytes=event.nbytes)
+
+    with profiling.listen(on_event):
+        psd = PSDImage.open('example.psd')
+        psd.composite()
+
+    with profiling.record() as recorder:
+        psd.save('output.psd')
+    for name, (count, duration, nbytes) in recorder.summary().items():
+        print(name, count, duration, nbytes)
+"""
+from __future__ import absolute_import, unicode_literals
+import contextlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_listeners = ()
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Event(object):
+    """
+    Timing event of a stage.
+
+    .. py:attribute:: name
+
+        Dotted name of the stage, such as `read.image_data`.
+
+    .. py:attribute:: start
+
+        Start time in seconds of :py:func:`time.perf_counter`.
+
+    .. py:attribute:: duration
+
+        Duration in seconds.
+
+    .. py:attribute:: nbytes
+
+        Byte count of the stage, or `None`.
+
+    .. py:attribute:: depth
+
+        Nesting level of the stage in the thread, 0 for the outermost.
+
+    .. py:attribute:: thread
+
+        Identifier of the thread.
+
+    .. py:attribute:: attrs
+
+        `dict` of other attributes of the stage. `error` is the exception
+        name when the stage fails.
+    """
+    __slots__ = (
+        'name', 'start', 'duration', 'nbytes', 'depth', 'thread', 'attrs'
+    )
+
+    def __init__(
+        self, name, start, duration, nbytes=None, depth=0, thread=None,
+        attrs=None
+    ):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.nbytes = nbytes
+        self.depth = depth
+        self.thread = thread
+        self.attrs = attrs or {}
+
+    def __repr__(self):
+        return '%s(%s %.3fms%s)' % (
+            self.__class__.__name__, self.name, self.duration * 1e3,
+            '' if self.nbytes is None else ' nbytes=%d' % self.nbytes
+        )
+
+
+class _Span(object):
+    """Stage that emits an event on exit."""
+    __slots__ = ('_name', '_nbytes', '_attrs', '_start', '_depth')
+
+    def __init__(self, name, nbytes, attrs):
+        self._name = name
+        self._nbytes = nbytes
+        self._attrs = attrs
+
+    def __bool__(self):
+        return True
+
+    __nonzero__ = __bool__
+
+    def set(self, nbytes=None, **kwargs):
+        """Set the byte count or the attributes of the event."""
+        if nbytes is not None:
+            self._nbytes = nbytes
+        self._attrs.update(kwargs)
+
+    def __enter__(self):
+        self._depth = getattr(_local, 'depth', 0)
+        _local.depth = self._depth + 1
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self._start
+        _local.depth = self._depth
+        if exc_type is not None:
+            self._attrs['error'] = exc_type.__name__
+        _emit(
+            Event(
+                self._name, self._start, duration, self._nbytes, self._depth,
+                threading.current_thread().ident, self._attrs
+            )
+        )
+        return False
+
+
+class _NullSpan(object):
+    """Stage while profiling is disabled."""
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    __nonzero__ = __bool__
+
+    def set(self, nbytes=None, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, nbytes=None, **kwargs):
+    """
+    Context manager of a stage that emits an :py:class:`Event` on exit.
+
+    The context value is false while profiling is disabled, so that the
+    stage can skip work that is only needed for the event. Call `set()` on
+    the context value to set the byte count or the attributes known at the
+    end of the stage.
+
+    Example::
+
+        with profiling.span('read.image_data') as stage:
+            data = read(fp)
+            stage.set(nbytes=len(data))
+
+    :param name: name of the stage.
+    :param nbytes: byte count of the stage.
+    :param kwargs: attributes of the stage.
+    """
+    if not _listeners:
+        return _NULL_SPAN
+    return _Span(name, nbytes, kwargs)
+
+
+def is_enabled():
+    """True if any listener is registered."""
+    return bool(_listeners)
+
+
+def add_listener(callback):
+    """
+    Register a callable that receives each :py:class:`Event`.
+
+    Exceptions in the callable are logged and ignored.
+    """
+    global _listeners
+    with _lock:
+        _listeners = _listeners + (callback, )
+
+
+def remove_listener(callback):
+    """Unregister a callable registered by :py:func:`add_listener`."""
+    global _listeners
+    with _lock:
+        listeners = list(_listeners)
+        listeners.remove(callback)
+        _listeners = tuple(listeners)
+
+
+@contextlib.contextmanager
+def listen(callback):
+    """
+    Context manager to register `callback` within the block.
+
+    :param callback: callable that receives each :py:class:`Event`.
+    """
+    add_listener(callback)
+    try:
+        yield callback
+    finally:
+        remove_listener(callback)
+
+
+def record():
+    """
+    Context manager to collect events within the block.
+
+    :return: context manager of :py:class:`Recorder`.
+    """
+    return listen(Recorder())
+
+
+class Recorder(object):
+    """
+    Listener that collects events.
+
+    .. py:attribute:: events
+
+        `list` of :py:class:`Event` in the order of completion.
+    """
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def __iter__(self):
+        return iter(list(self.events))
+
+    def __len__(self):
+        return len(self.events)
+
+    def find(self, name):
+        """Get events of the given name."""
+        return [event for event in self if event.name == name]
+
+    def summary(self):
+        """
+        Aggregate events by name.
+
+        :return: `dict` of name to `(count, duration, nbytes)` tuple of the
+            total duration in seconds and the total byte count.
+        """
+        result = {}
+        for event in self:
+            count, duration, nbytes = result.get(event.name, (0, 0., 0))
+            result[event.name] = (
+                count + 1, duration + event.duration,
+                nbytes + (event.nbytes or 0)
+            )
+        return result
+
+
+def _emit(event):
+    for callback in _listeners:
+        try:
+            callback(event)
+        except Exception:
+            logger.exception('Failed to handle %r' % event)
@@ -7,6 +7,11 @@ defined in :py:mod:`psd_tools.psd.base` module.
 from __future__ import absolute_import, unicode_literals
 import attr
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from psd_tools.compression import compress
+from psd_tools.profiling import span
 from .base import BaseElement
 from .header import FileHeader
 from .color_mode_data import ColorModeData
@@ -22,7 +27,8 @@ class PSD(BaseElement):
     """
     Low-level PSD file structure that resembles the specification_.
 
-    .. _specification: https://www.adobe.com/devnet-apps/photoshop/fileformatashtml/
+    .. _specification:
+        https://www.adobe.com/devnet-apps/photoshop/fileformatashtml/
 
     Example::
 
@@ -34,6 +40,10 @@ class PSD(BaseElement):
         with open(output_file, 'wb') as f:
             psd.write(f)
 
+    When `source` is given, pixel data of channels and the merged image are
+    not loaded but referenced by file offsets, see
+    :py:mod:`psd_tools.psd.source`. When `deferred` is True, tagged blocks
+    are decoded at the first access, see :py:class:`.TaggedBlock`.
 
     .. py:attribute:: header
 
@@ -62,28 +72,107 @@ class PSD(BaseElement):
     image_data = attr.ib(factory=ImageData)
 
     @classmethod
-    def read(cls, fp, encoding='macroman', **kwargs):
-        header = FileHeader.read(fp)
+    def read(
+        cls, fp, encoding='macroman', source=None, deferred=False, **kwargs
+    ):
+        header = _read_section('read.header', FileHeader.read, fp)
         logger.debug('read %s' % header)
         return cls(
             header,
-            ColorModeData.read(fp),
-            ImageResources.read(fp, encoding),
-            LayerAndMaskInformation.read(fp, encoding, header.version),
-            ImageData.read(fp),
+            _read_section('read.color_mode_data', ColorModeData.read, fp),
+            _read_section(
+                'read.image_resources', ImageResources.read, fp, encoding
+            ),
+            _read_section(
+                'read.layer_and_mask_information',
+                LayerAndMaskInformation.read,
+                fp,
+                encoding,
+                header.version,
+                source=source,
+                deferred=deferred
+            ),
+            _read_section(
+                'read.image_data', ImageData.read, fp, source=source
+            ),
         )
 
-    def write(self, fp, encoding='macroman', **kwargs):
+    def write(self, fp, encoding='macroman', workers=None, **kwargs):
+        """
+        Write the document.
+
+        Channels and image data set with `deferred` flag are compressed
+        concurrently before writing, see :py:meth:`compress_pending`.
+
+        :param fp: file-like object.
+        :param encoding: charset encoding of the pascal string within the
+            file, default 'macroman'.
+        :param workers: number of threads to compress pending channels.
+        """
+        self.compress_pending(workers)
         logger.debug('writing %s' % self.header)
-        written = self.header.write(fp)
-        written += self.color_mode_data.write(fp)
-        written += self.image_resources.write(fp, encoding)
-        written += self.layer_and_mask_information.write(
-            fp, encoding, self.header.version, **kwargs
+        written = _write_section('write.header', self.header.write, fp)
+        written += _write_section(
+            'write.color_mode_data', self.color_mode_data.write, fp
+        )
+        written += _write_section(
+            'write.image_resources', self.image_resources.write, fp, encoding
+        )
+        written += _write_section(
+            'write.layer_and_mask_information',
+            self.layer_and_mask_information.write, fp, encoding,
+            self.header.version, **kwargs
+        )
+        written += _write_section(
+            'write.image_data', self.image_data.write, fp
         )
-        written += self.image_data.write(fp)
         return written
 
+    def compress_pending(self, workers=None):
+        """
+        Compress channels and image data set with `deferred` flag on a
+        thread pool.
+
+        zlib and the Cython RLE codec release the GIL, so that channels are
+        compressed in parallel. Each channel is compressed independently and
+        the results are stored in the order of the channels, so that the
+        output does not depend on the number of workers.
+
+        :param workers: number of threads, default is the number of CPUs.
+            1 compresses in the calling thread.
+        :return: number of compressed items.
+        """
+        items = list(self._iter_pending())
+        tasks = [item._get_tasks() for item in items]
+        arguments = [args for item_tasks in tasks for args in item_tasks]
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(arguments) > 1:
+            logger.debug(
+                'compressing %d channels with %d workers' %
+                (len(arguments), workers)
+            )
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(
+                    executor.map(lambda args: compress(*args), arguments)
+                )
+        else:
+            results = [compress(*args) for args in arguments]
+
+        offset = 0
+        for item, item_tasks in zip(items, tasks):
+            item._set_compressed(results[offset:offset + len(item_tasks)])
+            offset += len(item_tasks)
+        return len(items)
+
+    def _iter_pending(self):
+        """Iterate over channels and image data waiting for compression."""
+        for _, channels in self._iter_layers():
+            for channel in channels:
+                if channel.is_pending:
+                    yield channel
+        if self.image_data.is_pending:
+            yield self.image_data
+
     def _iter_layers(self):
         """
         Iterate over (layer_record, channel_data) pairs.
@@ -104,3 +193,21 @@ class PSD(BaseElement):
                 if key in tagged_blocks:
                     return tagged_blocks.get_data(key)
         return self.layer_and_mask_information.layer_info
+
+
+def _read_section(name, read, fp, *args, **kwargs):
+    """Read a section, emitting a profiling event of the read bytes."""
+    with span(name) as stage:
+        start = fp.tell() if stage else 0
+        value = read(fp, *args, **kwargs)
+        if stage:
+            stage.set(nbytes=fp.tell() - start)
+    return value
+
+
+def _write_section(name, write, fp, *args, **kwargs):
+    """Write a section, emitting a profiling event of the written bytes."""
+    with span(name) as stage:
+        written = write(fp, *args, **kwargs)
+        stage.set(nbytes=written)
+    return written
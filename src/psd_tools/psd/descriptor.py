@@ -29,7 +29,6 @@ from psd_tools.psd.base import (
     StringElement,
 )
 from psd_tools.constants import OSType
-from psd_tools.terminology import Klass, Enum, Event, Form, Key, Type, Unit
 from psd_tools.validators import in_
 from psd_tools.utils import (
     read_fmt,
@@ -48,10 +47,38 @@ logger = logging.getLogger(__name__)
 
 TYPES, register = new_registry(attribute='ostype')
 
-_TERMS = set(
-    item.value for kls in (Klass, Enum, Event, Form, Key, Type, Unit)
-    for item in kls
-)
+#: Keys written without the length. Terms in :py:mod:`psd_tools.terminology`
+#: are added on the first write, as the enum tables are slow to import.
+_TERMS = set()
+_TERMINOLOGY_LOADED = False
+
+
+def _is_term(value):
+    global _TERMINOLOGY_LOADED
+    if value not in _TERMS and not _TERMINOLOGY_LOADED:
+        from psd_tools.terminology import (
+            Klass, Enum, Event, Form, Key, Type, Unit
+        )
+        _TERMS.update(
+            item.value for kls in (Klass, Enum, Event, Form, Key, Type, Unit)
+            for item in kls
+        )
+        _TERMINOLOGY_LOADED = True
+    return value in _TERMS
+
+
+def _get_unit(unit):
+    from psd_tools.terminology import Enum, Unit
+    try:
+        return Unit(unit)
+    except ValueError:
+        logger.warning('Using Enum for Unit field')
+        return Enum(unit)
+
+
+def _default_unit():
+    from psd_tools.terminology import Unit
+    return Unit._None
 
 
 def read_length_and_key(fp):
@@ -60,8 +87,7 @@ def read_length_and_key(fp):
     """
     length = read_fmt('I', fp)[0]
     key = fp.read(length or 4)
-    if length == 0 and key not in _TERMS:
-        logger.debug('Unknown term: %r' % (key))
+    if length == 0:
         _TERMS.add(key)
     return key
 
@@ -70,7 +96,7 @@ def write_length_and_key(fp, value):
     """
     Helper to write descriptor key.
     """
-    written = write_fmt(fp, 'I', 0 if value in _TERMS else len(value))
+    written = write_fmt(fp, 'I', 0 if _is_term(value) else len(value))
     written += write_bytes(fp, value)
     return written
 
@@ -159,7 +185,7 @@ class Descriptor(_DescriptorMixin):
         bytes in :py:class:`~psd_tools.terminology.Klass`
     """
     name = attr.ib(default='', type=str)
-    classID = attr.ib(default=Klass.Null.value)
+    classID = attr.ib(default=b'null')
 
     @classmethod
     def read(cls, fp):
@@ -190,7 +216,7 @@ class ObjectArray(_DescriptorMixin):
     """
     items_count = attr.ib(default=0, type=int)
     name = attr.ib(default='', type=str)
-    classID = attr.ib(default=Klass.Null.value)
+    classID = attr.ib(default=b'null')
 
     @classmethod
     def read(cls, fp):
@@ -285,17 +311,12 @@ class UnitFloat(NumericElement):
         `float` value
     """
     value = attr.ib(default=0.0, type=float)
-    unit = attr.ib(default=Unit._None)
+    unit = attr.ib(factory=_default_unit)
 
     @classmethod
     def read(cls, fp):
         unit, value = read_fmt('4sd', fp)
-        try:
-            unit = Unit(unit)
-        except ValueError:
-            logger.warning('Using Enum for Unit field')
-            unit = Enum(unit)
-        return cls(unit=unit, value=value)
+        return cls(unit=_get_unit(unit), value=value)
 
     def write(self, fp):
         return write_fmt(fp, '4sd', self.unit.value, self.value)
@@ -322,19 +343,14 @@ class UnitFloats(BaseElement):
 
         List of `float` values
     """
-    unit = attr.ib(default=Unit._None)
+    unit = attr.ib(factory=_default_unit)
     values = attr.ib(factory=list)
 
     @classmethod
     def read(cls, fp):
         unit, count = read_fmt('4sI', fp)
-        try:
-            unit = Unit(unit)
-        except ValueError:
-            logger.warning('Using Enum for Unit field')
-            unit = Enum(unit)
         values = list(read_fmt('%dd' % count, fp))
-        return cls(unit=unit, values=values)
+        return cls(unit=_get_unit(unit), values=values)
 
     def write(self, fp):
         return write_fmt(
@@ -584,6 +600,7 @@ class Enumerated(BaseElement):
     def get_name(self):
         """Get enum name."""
         if len(self.enum) == 4:
+            from psd_tools.terminology import Enum
             try:
                 return Enum(self.enum).name
             except ValueError:
@@ -70,15 +70,28 @@ class Tokenizer(object):
     """
     Tokenize engine data.
 
+    The tokenizer scans the data in a single pass; a master regex that
+    combines all the :py:class:`EngineToken` patterns is matched at the
+    current offset.
+
     Example::
 
         tokenizer = Tokenizer(data)
         for token, token_type in tokenizer:
             print('%s: %r' % (token_type.name, token))
     """
-    DIVIDER = compile_re(r'[ \n\t]+')
-    UTF16_START = b'(\xfe\xff'
-    UTF16_END = compile_re(r'[^\\]\)')
+    TOKEN = compile_re(
+        r'[ \n\t]*(?:(?P<STRING>\(\xfe\xff.*?(?<!\\)\))|'
+        r'(?P<UTF16_START>\(\xfe\xff)|(?:%s)(?=[ \n\t]|\Z)|'
+        r'(?P<UNKNOWN>[^ \n\t]+))' % '|'.join(
+            '(?P<%s>%s)' % (
+                token_type.name,
+                token_type.value.pattern.decode('macroman')[1:-1]
+            ) for token_type in EngineToken
+            if token_type not in (EngineToken.NOOP, EngineToken.STRING)
+        )
+    )
+    TOKEN_TYPES = {token_type.name: token_type for token_type in EngineToken}
 
     def __init__(self, data):
         self.data = data
@@ -94,32 +107,64 @@ class Tokenizer(object):
         return self.__next__()
 
     def __next__(self):
-        if len(self) == 0:
+        match = self.TOKEN.match(self.data, self.index)
+        if match is None:
+            self.index = len(self.data)
             raise StopIteration
 
-        index = self.index
-        if self.data[index:].startswith(self.UTF16_START):
-            match = self.UTF16_END.search(self.data[index:])
-            if match is None:
-                raise ValueError('Invalid token: %r' % (self.data[index:]))
-            token = self.data[index:index + match.end()]
-            self.index += match.end()
-        else:
-            match = self.DIVIDER.search(self.data[index:])
-            if match is None:
-                token = self.data[index:]
-                self.index = len(self.data)
-            else:
-                token = self.data[index:index + match.start()]
-                self.index += match.end()
-                if token == b'':
-                    return self.__next__()
+        kind = match.lastgroup
+        if kind == 'UTF16_START':
+            raise ValueError('Invalid token: %r' % (self.data[self.index:]))
+        token = match.group(kind)
+        if kind == 'UNKNOWN':
+            raise ValueError("Unknown token: %r" % (token))
+        self.index = match.end()
+        return token, self.TOKEN_TYPES[kind]
+
 
-        for token_type in EngineToken:
-            if token_type.value.search(token):
-                return token, token_type
+def _parse(tokenizer, root):
+    """
+    Parse tokens into the given container.
+
+    Nested containers are kept in an explicit stack instead of recursion. In
+    a dict, tokens other than properties and the end of the dict are ignored,
+    so that the opening `<<` of the root is skipped.
+    """
+    stack = [root]
+    for token, token_type in tokenizer:
+        container = stack[-1]
+        if isinstance(container, Dict):
+            if token_type == EngineToken.DICT_END:
+                stack.pop()
+                if not stack:
+                    break
+                continue
+            elif token_type != EngineToken.PROPERTY:
+                continue
+            key = Property.frombytes(token)
+            token, token_type = next(tokenizer)
+        elif token_type == EngineToken.ARRAY_END:
+            stack.pop()
+            if not stack:
+                break
+            continue
+        else:
+            key = None
+
+        kls = TOKEN_CLASSES.get(token_type)
+        if kls is None:
+            raise ValueError('Invalid token: %r' % (token))
+        if token_type in (EngineToken.ARRAY_START, EngineToken.DICT_START):
+            value = kls()
+            stack.append(value)
+        else:
+            value = kls.frombytes(token)
 
-        raise ValueError("Unknown token: %r" % (token))
+        if key is None:
+            container.append(value)
+        else:
+            container[key] = value
+    return root
 
 
 @register(EngineToken.DICT_START)
@@ -135,24 +180,7 @@ class Dict(DictElement):
     @classmethod
     def frombytes(cls, data, **kwargs):
         tokenizer = data if isinstance(data, Tokenizer) else Tokenizer(data)
-        self = cls()
-        for k_token, k_token_type in tokenizer:
-            if k_token_type == EngineToken.PROPERTY:
-                key = Property.frombytes(k_token)
-                v_token, v_token_type = next(tokenizer)
-                kls = TOKEN_CLASSES.get(v_token_type)
-                if v_token_type in (
-                    EngineToken.ARRAY_START, EngineToken.DICT_START
-                ):
-                    value = kls.frombytes(tokenizer)
-                elif kls:
-                    value = kls.frombytes(v_token)
-                else:
-                    raise ValueError('Invalid token: %r' % (v_token))
-                self[key] = value
-            elif k_token_type == EngineToken.DICT_END:
-                return self
-        return self
+        return _parse(tokenizer, cls())
 
     def write(self, fp, indent=0, write_container=True):
         inner_indent = indent if indent is None else indent + 1
@@ -254,19 +282,7 @@ class List(ListElement):
     @classmethod
     def frombytes(cls, data):
         tokenizer = data if isinstance(data, Tokenizer) else Tokenizer(data)
-        self = cls()
-        for token, token_type in tokenizer:
-            if token_type == EngineToken.ARRAY_END:
-                return self
-
-            kls = TOKEN_CLASSES.get(token_type)
-            if token_type in (EngineToken.ARRAY_START, EngineToken.DICT_START):
-                value = kls.frombytes(tokenizer)
-            else:
-                value = kls.frombytes(token)
-            self.append(value)
-
-        return self
+        return _parse(tokenizer, cls())
 
     def write(self, fp, indent=None):
         written = write_bytes(fp, b'[')
@@ -10,16 +10,19 @@ import attr
 import logging
 import io
 
-from psd_tools.compression import compress, decompress
+from psd_tools.compression import (
+    compress, decompress, decompress_sampled, iter_decompressed_planes
+)
 from psd_tools.constants import Compression
 from psd_tools.psd.base import BaseElement
+from psd_tools.psd.source import resolve
 from psd_tools.validators import in_
 from psd_tools.utils import read_fmt, write_fmt, write_bytes, pack
 
 logger = logging.getLogger(__name__)
 
 
-@attr.s(repr=False, slots=True)
+@attr.s(repr=False, slots=True, eq=False)
 class ImageData(BaseElement):
     """
     Merged channel image data.
@@ -30,27 +33,66 @@ class ImageData(BaseElement):
 
     .. py:attribute:: data
 
-        `bytes` as compressed in the `compression` flag.
+        `bytes` as compressed in the `compression` flag. When read with a
+        source, a :py:class:`~psd_tools.psd.source.ByteRange` reference to
+        the data in the file. Data set with `deferred` flag is compressed at
+        the first access.
     """
     compression = attr.ib(
         default=Compression.RAW,
         converter=Compression,
         validator=in_(Compression)
     )
-    data = attr.ib(default=b'', type=bytes)
+    _data = attr.ib(default=b'', type=bytes)
+    _raw = attr.ib(default=None, repr=False)
+
+    @property
+    def data(self):
+        if self._raw is not None:
+            self._set_compressed(
+                [compress(*args) for args in self._get_tasks()]
+            )
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._raw = None
+
+    @property
+    def is_pending(self):
+        """True if the data set with `deferred` flag is not compressed yet."""
+        return self._raw is not None
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.compression, self.data) == (other.compression, other.data)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
 
     @classmethod
-    def read(cls, fp):
+    def read(cls, fp, source=None, **kwargs):
         start_pos = fp.tell()
         compression = Compression(read_fmt('H', fp)[0])
-        data = fp.read()  # TODO: Parse data here. Need header.
+        if source is not None:
+            fp.seek(0, 2)
+            length = fp.tell() - start_pos - 2
+            fp.seek(start_pos + 2)
+            data = source.slice(fp, length)
+        else:
+            data = fp.read()  # TODO: Parse data here. Need header.
         logger.debug('  read image data, len=%d' % (fp.tell() - start_pos))
         return cls(compression, data)
 
     def write(self, fp):
         start_pos = fp.tell()
         written = write_fmt(fp, 'H', self.compression.value)
-        written += write_bytes(fp, self.data)
+        written += write_bytes(fp, resolve(self.data))
         logger.debug('  wrote image data, len=%d' % (fp.tell() - start_pos))
         return written
 
@@ -61,8 +103,12 @@ class ImageData(BaseElement):
         :param header: See :py:class:`~psd_tools.psd.header.FileHeader`.
         :return: `list` of bytes corresponding each channel.
         """
+        if self._raw is not None and self._raw[1:] == (
+            header.width, header.height, header.depth, header.version
+        ) and len(self._raw[0]) == header.channels:
+            return list(self._raw[0]) if split else b''.join(self._raw[0])
         data = decompress(
-            self.data, self.compression, header.width,
+            resolve(self.data), self.compression, header.width,
             header.height * header.channels, header.depth, header.version
         )
         if split:
@@ -71,7 +117,93 @@ class ImageData(BaseElement):
                 return [f.read(plane_size) for _ in range(header.channels)]
         return data
 
-    def set_data(self, data, header):
+    def iter_strips(self, header, rows=64):
+        """
+        Iterate over horizontal strips of the decompressed image.
+
+        Strips are decoded straight from the RLE byte counts, the raw data,
+        or the zlib stream, so that the memory usage depends on the strip
+        size but not on the image height. When the data is a
+        :py:class:`~psd_tools.psd.source.ByteRange`, the compressed bytes
+        are also read from the file by strips.
+
+        Example::
+
+            for top, strip in psd.image_data.iter_strips(psd.header, 256):
+                writer.write_rows(strip)
+
+        :param header: See :py:class:`~psd_tools.psd.header.FileHeader`.
+        :param rows: number of rows in a strip.
+        :return: generator of `(top, strip)` tuples, where `strip` is a NumPy
+            array of shape `(rows, width, channels)` with channels
+            interleaved. The dtype is `uint8` for 8-bit, `uint16` for 16-bit,
+            and `float32` for 32-bit images, and `bool` for bitmap images
+            where True is black.
+        """
+        import numpy as np
+
+        dtype = {1: np.uint8, 8: np.uint8, 16: '>u2', 32: '>f4'}.get(
+            header.depth
+        )
+        if dtype is None:
+            raise ValueError('Unsupported depth: %g' % header.depth)
+        for top, planes in iter_decompressed_planes(
+            self.data, self.compression, header.width, header.height,
+            header.channels, header.depth, header.version, rows
+        ):
+            count = min(rows, header.height - top)
+            planes = [
+                np.frombuffer(plane, dtype).reshape((count, -1))
+                for plane in planes
+            ]
+            if header.depth == 1:
+                planes = [
+                    np.unpackbits(plane, axis=1)[:, :header.width].view(bool)
+                    for plane in planes
+                ]
+            strip = np.stack(planes, axis=-1)
+            if header.depth > 8:
+                strip = strip.astype(strip.dtype.newbyteorder('='))
+            yield top, strip
+
+    def get_sampled_data(self, header, step):
+        """
+        Get decompressed data of every `step`-th row and column.
+
+        Only the sampled rows are decoded from RLE or raw data, and when the
+        data is a :py:class:`~psd_tools.psd.source.ByteRange`, only the bytes
+        of these rows are read from the file.
+
+        :param header: See :py:class:`~psd_tools.psd.header.FileHeader`.
+        :param step: sampling interval in pixels.
+        :return: `list` of bytes corresponding each channel, where each
+            channel has `ceil(width / step)` x `ceil(height / step)` pixels.
+        """
+        import numpy as np
+
+        height = header.height
+        rows = [
+            index * height + y
+            for index in range(header.channels)
+            for y in range(0, height, step)
+        ]
+        data = decompress_sampled(
+            self.data, self.compression, header.width,
+            height * header.channels, header.depth, header.version, rows
+        )
+        count = len(rows) // header.channels if header.channels else 0
+        arr = np.frombuffer(data, np.uint8).reshape(
+            (header.channels, count, -1)
+        )
+        if header.depth == 1:
+            arr = np.unpackbits(arr, axis=2)[:, :, :header.width:step]
+            arr = np.packbits(arr, axis=2)
+        else:
+            arr = arr.reshape((header.channels, count, header.width, -1))
+            arr = arr[:, :, ::step]
+        return [channel.tobytes() for channel in arr]
+
+    def set_data(self, data, header, deferred=False):
         """
         Set raw data and compress.
 
@@ -79,14 +211,57 @@ class ImageData(BaseElement):
         :param compression: compression type,
             see :py:class:`~psd_tools.constants.Compression`.
         :param header: See :py:class:`~psd_tools.psd.header.FileHeader`.
-        :return: length of compressed data.
+        :param deferred: Boolean flag to defer compression until the data is
+            accessed or the document is written, so that the channels are
+            compressed concurrently by :py:meth:`~psd_tools.psd.PSD.write`.
+        :return: length of compressed data, or `None` when deferred.
         """
-        self.data = compress(
-            b''.join(data), self.compression, header.width,
-            header.height * header.channels, header.depth, header.version
+        self.data = b''
+        self._raw = (
+            list(data), header.width, header.height, header.depth,
+            header.version
         )
+        if deferred:
+            return None
         return len(self.data)
 
+    def _get_tasks(self):
+        """
+        List of arguments to :py:func:`~psd_tools.compression.compress`.
+
+        RLE rows are encoded independently, so that each channel is a task.
+        Other compressions make a single stream of all the channels.
+        """
+        data, width, height, depth, version = self._raw
+        if self.compression == Compression.RLE:
+            return [
+                (channel, self.compression, width, height, depth, version)
+                for channel in data
+            ]
+        return [(
+            b''.join(data), self.compression, width, height * len(data),
+            depth, version
+        )]
+
+    def _set_compressed(self, results):
+        if self.compression == Compression.RLE and len(results) > 1:
+            # Concatenate byte counts and rows of each channel.
+            height, version = self._raw[2], self._raw[4]
+            size = height * (2, 4)[version - 1]
+            results = (
+                [result[:size] for result in results] +
+                [result[size:] for result in results]
+            )
+        self._data = b''.join(results)
+        self._raw = None
+
+    def __reduce__(self):
+        # Memory-mapped data is not picklable and is copied.
+        data = self.data
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return (self.__class__, (self.compression, data))
+
     @classmethod
     def new(cls, header, color=0, compression=Compression.RAW):
         """
@@ -7,6 +7,7 @@ import io
 import logging
 
 from psd_tools.psd.base import BaseElement, ListElement
+from psd_tools.psd.source import resolve
 from psd_tools.psd.tagged_blocks import TaggedBlocks, register
 from psd_tools.compression import compress, decompress
 from psd_tools.validators import in_, range_
@@ -44,7 +45,7 @@ class LayerAndMaskInformation(BaseElement):
     tagged_blocks = attr.ib(default=None)
 
     @classmethod
-    def read(cls, fp, encoding='macroman', version=1):
+    def read(cls, fp, encoding='macroman', version=1, **kwargs):
         start_pos = fp.tell()
         length = read_fmt(('I', 'Q')[version - 1], fp)[0]
         end_pos = fp.tell() + length
@@ -55,14 +56,14 @@ class LayerAndMaskInformation(BaseElement):
         if length == 0:
             self = cls()
         else:
-            self = cls._read_body(fp, end_pos, encoding, version)
+            self = cls._read_body(fp, end_pos, encoding, version, **kwargs)
         assert fp.tell() <= end_pos
         fp.seek(end_pos, 0)
         return self
 
     @classmethod
-    def _read_body(cls, fp, end_pos, encoding, version):
-        layer_info = LayerInfo.read(fp, encoding, version)
+    def _read_body(cls, fp, end_pos, encoding, version, **kwargs):
+        layer_info = LayerInfo.read(fp, encoding, version, **kwargs)
 
         global_layer_mask_info = None
         if is_readable(fp, 17) and fp.tell() < end_pos:
@@ -72,7 +73,7 @@ class LayerAndMaskInformation(BaseElement):
         if is_readable(fp):
             # For some reason, global tagged blocks aligns 4 byte
             tagged_blocks = TaggedBlocks.read(
-                fp, version=version, padding=4, end_pos=end_pos
+                fp, version=version, padding=4, end_pos=end_pos, **kwargs
             )
 
         return cls(layer_info, global_layer_mask_info, tagged_blocks)
@@ -121,25 +122,29 @@ class LayerInfo(BaseElement):
     channel_image_data = attr.ib(default=None)
 
     @classmethod
-    def read(cls, fp, encoding='macroman', version=1):
+    def read(cls, fp, encoding='macroman', version=1, **kwargs):
         length = read_fmt(('I', 'Q')[version - 1], fp)[0]
         logger.debug('reading layer info, len=%d' % length)
         end_pos = fp.tell() + length
         if length == 0:
             self = LayerInfo()
         else:
-            self = cls._read_body(fp, encoding, version)
+            self = cls._read_body(fp, encoding, version, **kwargs)
         assert fp.tell() <= end_pos
         fp.seek(end_pos, 0)
         return self
 
     @classmethod
-    def _read_body(cls, fp, encoding, version):
+    def _read_body(cls, fp, encoding, version, deferred=False, **kwargs):
         start_pos = fp.tell()
         layer_count = read_fmt('h', fp)[0]
-        layer_records = LayerRecords.read(fp, layer_count, encoding, version)
+        layer_records = LayerRecords.read(
+            fp, layer_count, encoding, version, deferred
+        )
         logger.debug('  read layer records, len=%d' % (fp.tell() - start_pos))
-        channel_image_data = ChannelImageData.read(fp, layer_records)
+        channel_image_data = ChannelImageData.read(
+            fp, layer_records, **kwargs
+        )
         return cls(layer_count, layer_records, channel_image_data)
 
     def write(self, fp, encoding='macroman', version=1, padding=4):
@@ -186,7 +191,7 @@ class LayerInfoBlock(LayerInfo):
 
     @classmethod
     def read(cls, fp, encoding='macroman', version=1, **kwargs):
-        return cls._read_body(fp, encoding, version)
+        return cls._read_body(fp, encoding, version, **kwargs)
 
     def write(self, fp, encoding='macroman', version=1, padding=4, **kwargs):
         return self._write_body(fp, encoding, version, padding)
@@ -333,10 +338,12 @@ class LayerRecords(ListElement):
     """
 
     @classmethod
-    def read(cls, fp, layer_count, encoding='macroman', version=1):
+    def read(
+        cls, fp, layer_count, encoding='macroman', version=1, deferred=False
+    ):
         items = []
         for idx in range(abs(layer_count)):
-            items.append(LayerRecord.read(fp, encoding, version))
+            items.append(LayerRecord.read(fp, encoding, version, deferred))
         return cls(items)
 
 
@@ -426,7 +433,7 @@ class LayerRecord(BaseElement):
     tagged_blocks = attr.ib(factory=TaggedBlocks)
 
     @classmethod
-    def read(cls, fp, encoding='macroman', version=1):
+    def read(cls, fp, encoding='macroman', version=1, deferred=False):
         start_pos = fp.tell()
         top, left, bottom, right, num_channels = read_fmt('4iH', fp)
         channel_info = [
@@ -441,7 +448,7 @@ class LayerRecord(BaseElement):
             self = cls(
                 top, left, bottom, right, channel_info, signature,
                 blend_mode, opacity, clipping, flags,
-                *cls._read_extra(f, encoding, version)
+                *cls._read_extra(f, encoding, version, deferred)
             )
 
         # with io.BytesIO() as f:
@@ -451,11 +458,13 @@ class LayerRecord(BaseElement):
         return self
 
     @classmethod
-    def _read_extra(cls, fp, encoding, version):
+    def _read_extra(cls, fp, encoding, version, deferred=False):
         mask_data = MaskData.read(fp)
         blending_ranges = LayerBlendingRanges.read(fp)
         name = read_pascal_string(fp, encoding, padding=4)
-        tagged_blocks = TaggedBlocks.read(fp, version=version, padding=1)
+        tagged_blocks = TaggedBlocks.read(
+            fp, version=version, padding=1, deferred=deferred
+        )
         return mask_data, blending_ranges, name, tagged_blocks
 
     def write(self, fp, encoding='macroman', version=1):
@@ -787,11 +796,13 @@ class ChannelImageData(ListElement):
     """
 
     @classmethod
-    def read(cls, fp, layer_records=None):
+    def read(cls, fp, layer_records=None, **kwargs):
         start_pos = fp.tell()
         items = []
         for idx, layer in enumerate(layer_records):
-            items.append(ChannelDataList.read(fp, layer.channel_info))
+            items.append(
+                ChannelDataList.read(fp, layer.channel_info, **kwargs)
+            )
         logger.debug(
             '  read channel image data, len=%d' % (fp.tell() - start_pos)
         )
@@ -832,7 +843,7 @@ class ChannelDataList(ListElement):
         return [item._length for item in self]
 
 
-@attr.s(repr=False, slots=True)
+@attr.s(repr=False, slots=True, eq=False)
 class ChannelData(BaseElement):
     """
     Channel data.
@@ -843,24 +854,60 @@ class ChannelData(BaseElement):
 
     .. py:attribute:: data
 
-        Data.
+        Data. When read with a source, a
+        :py:class:`~psd_tools.psd.source.ByteRange` reference to the data in
+        the file. Data set with `deferred` flag is compressed at the first
+        access.
     """
     compression = attr.ib(
         default=Compression.RAW,
         converter=Compression,
         validator=in_(Compression)
     )
-    data = attr.ib(default=b'', type=bytes)
+    _data = attr.ib(default=b'', type=bytes)
+    _raw = attr.ib(default=None, repr=False)
+
+    @property
+    def data(self):
+        if self._raw is not None:
+            self._set_compressed(
+                [compress(*args) for args in self._get_tasks()]
+            )
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._raw = None
+
+    @property
+    def is_pending(self):
+        """True if the data set with `deferred` flag is not compressed yet."""
+        return self._raw is not None
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.compression, self.data) == (other.compression, other.data)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
 
     @classmethod
-    def read(cls, fp, length=0, **kwargs):
+    def read(cls, fp, length=0, source=None, **kwargs):
         compression = Compression(read_fmt('H', fp)[0])
-        data = fp.read(length)
+        if source is not None:
+            data = source.slice(fp, length)
+        else:
+            data = fp.read(length)
         return cls(compression, data)
 
     def write(self, fp, **kwargs):
         written = write_fmt(fp, 'H', self.compression.value)
-        written += write_bytes(fp, self.data)
+        written += write_bytes(fp, resolve(self.data))
         # written += write_padding(fp, written, 2)  # Seems no padding here.
         return written
 
@@ -873,11 +920,16 @@ class ChannelData(BaseElement):
         :param version: psd file version.
         :rtype: bytes
         """
+        if self._raw is not None and self._raw[1:] == (
+            width, height, depth, version
+        ):
+            return self._raw[0]
         return decompress(
-            self.data, self.compression, width, height, depth, version
+            resolve(self.data), self.compression, width, height, depth,
+            version
         )
 
-    def set_data(self, data, width, height, depth, version=1):
+    def set_data(self, data, width, height, depth, version=1, deferred=False):
         """Set raw channel data and compress to store.
 
         :param data: raw data bytes to write.
@@ -887,12 +939,33 @@ class ChannelData(BaseElement):
         :param height: height.
         :param depth: bit depth of the pixel.
         :param version: psd file version.
+        :param deferred: Boolean flag to defer compression until the data is
+            accessed or the document is written, so that pending channels are
+            compressed concurrently by :py:meth:`~psd_tools.psd.PSD.write`.
+        :return: length of compressed data, or `None` when deferred.
         """
-        self.data = compress(
-            data, self.compression, width, height, depth, version
-        )
+        self.data = b''
+        self._raw = (data, width, height, depth, version)
+        if deferred:
+            return None
         return len(self.data)
 
+    def _get_tasks(self):
+        """List of arguments to :py:func:`~psd_tools.compression.compress`."""
+        data, width, height, depth, version = self._raw
+        return [(data, self.compression, width, height, depth, version)]
+
+    def _set_compressed(self, results):
+        self._data = results[0]
+        self._raw = None
+
+    def __reduce__(self):
+        # Memory-mapped data is not picklable and is copied.
+        data = self.data
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return (self.__class__, (self.compression, data))
+
     @property
     def _length(self):
         """Length of channel data block.
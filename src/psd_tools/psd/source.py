@@ -0,0 +1,251 @@
+"""
+Deferred storage of pixel data.
+
+By default, :py:class:`~psd_tools.psd.layer_and_mask.ChannelData` and
+:py:class:`~psd_tools.psd.image_data.ImageData` keep a private `bytes` copy of
+the file contents. When a source is given to
+:py:meth:`~psd_tools.psd.PSD.read`, these elements instead keep what the source
+returns for their byte range: :py:class:`.FileSource` records the file offset
+and length and reads the bytes on demand, while :py:class:`.MmapSource`
+exposes `memoryview` slices of a memory-mapped file.
+
+Example::
+
+    from psd_tools.psd import PSD
+    from psd_tools.psd.source import FileSource
+
+    with open(input_file, 'rb') as f:
+        psd = PSD.read(f, source=FileSource(input_file))
+"""
+from __future__ import absolute_import, unicode_literals
+import io
+import logging
+import mmap
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class FileSource(object):
+    """
+    Source that reads byte ranges from a file.
+
+    :param fp: filename or file-like object. A filename is reopened at each
+        read, while a file-like object is retained and must be kept open as
+        long as the data is accessed.
+    """
+    def __init__(self, fp):
+        if hasattr(fp, 'read'):
+            self._name = None
+            self._fp = fp
+        else:
+            self._name = fp
+            self._fp = None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        """Path of the file, or `None` if unknown."""
+        if self._name is not None:
+            return self._name
+        return getattr(self._fp, 'name', None)
+
+    def slice(self, fp, length):
+        """
+        Return a reference to the next `length` bytes of `fp` and skip them.
+
+        :param fp: file-like object positioned at the beginning of the data.
+        :param length: byte size of the data.
+        :return: :py:class:`.ByteRange`.
+        """
+        offset = fp.tell()
+        fp.seek(length, 1)
+        return ByteRange(self, offset, length)
+
+    def read(self, offset, length):
+        """
+        Read `length` bytes at `offset`.
+
+        :return: `bytes`
+        """
+        if self._name is not None:
+            with open(self._name, 'rb') as f:
+                f.seek(offset)
+                data = f.read(length)
+        else:
+            with self._lock:
+                position = self._fp.tell()
+                self._fp.seek(offset)
+                data = self._fp.read(length)
+                self._fp.seek(position)
+        assert len(data) == length, 'read=%d, expected=%d' % (
+            len(data), length
+        )
+        return data
+
+    def __getstate__(self):
+        if self._name is None:
+            raise TypeError('Cannot pickle a source of a file object')
+        return {'name': self._name}
+
+    def __setstate__(self, state):
+        self.__init__(state['name'])
+
+
+class MmapSource(object):
+    """
+    Source that memory-maps a file and exposes zero-copy slices.
+
+    The mapping is read-only and shared, so processes opening the same file
+    share the page cache instead of holding private copies.
+
+    Call :py:meth:`close` to unmap the file once the data is no longer
+    accessed, e.g., to release the file lock on Windows.
+
+    :param fp: filename or file-like object that has `fileno()`.
+    :raise ValueError: if the file-like object is not backed by a file,
+        e.g., :py:class:`io.BytesIO`.
+    """
+    def __init__(self, fp):
+        if hasattr(fp, 'read'):
+            try:
+                fileno = fp.fileno()
+            except (AttributeError, io.UnsupportedOperation):
+                raise ValueError(
+                    'Memory-mapping requires a file with fileno(): %r' % fp
+                )
+            self._name = getattr(fp, 'name', None)
+            self._mmap = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        else:
+            self._name = fp
+            with open(fp, 'rb') as f:
+                self._mmap = mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ
+                )
+        self._view = memoryview(self._mmap)
+
+    def slice(self, fp, length):
+        """
+        Return a view of the next `length` bytes of `fp` and skip them.
+
+        :param fp: file-like object positioned at the beginning of the data.
+        :param length: byte size of the data.
+        :return: `memoryview`
+        """
+        offset = fp.tell()
+        fp.seek(length, 1)
+        return self.read(offset, length)
+
+    def read(self, offset, length):
+        """
+        Return a view of `length` bytes at `offset`.
+
+        :return: `memoryview`
+        """
+        data = self._view[offset:offset + length]
+        assert len(data) == length, 'read=%d, expected=%d' % (
+            len(data), length
+        )
+        return data
+
+    @property
+    def name(self):
+        """Path of the file, or `None` if unknown."""
+        return self._name
+
+    @property
+    def closed(self):
+        """True if the mapping is closed."""
+        return self._mmap.closed
+
+    def close(self):
+        """
+        Unmap the file.
+
+        Views returned by :py:meth:`read` must be released beforehand. When a
+        view is still in use, the mapping is left to be closed by the garbage
+        collector.
+        """
+        if self._mmap.closed:
+            return
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            logger.warning('Mapping of %r is still in use' % (self._name, ))
+
+    def __getstate__(self):
+        if not isinstance(self._name, str):
+            raise TypeError('Cannot pickle a source of an unnamed file')
+        return {'name': self._name}
+
+    def __setstate__(self, state):
+        self.__init__(state['name'])
+
+
+class ByteRange(object):
+    """
+    Reference to a range of bytes in a source.
+
+    The reference behaves like the `bytes` it points to for `len` and
+    equality, and :py:meth:`read` fetches the actual content.
+    """
+    __slots__ = ('source', 'offset', 'length')
+
+    def __init__(self, source, offset, length):
+        self.source = source
+        self.offset = offset
+        self.length = length
+
+    def read(self):
+        """
+        Read the referenced bytes.
+
+        :return: `bytes`
+        """
+        logger.debug('  read %d bytes at %d' % (self.length, self.offset))
+        return self.source.read(self.offset, self.length)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        """Read a slice of the referenced bytes without reading the rest."""
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError('Only contiguous slices are supported')
+        start, stop, _ = key.indices(self.length)
+        if stop <= start:
+            return b''
+        return self.source.read(self.offset + start, stop - start)
+
+    def __bytes__(self):
+        return self.read()
+
+    def __eq__(self, other):
+        if isinstance(other, ByteRange):
+            if other.source is self.source and other.offset == self.offset:
+                return other.length == self.length
+            other = other.read()
+        return self.read() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(offset=%d, length=%d)' % (
+            self.__class__.__name__, self.offset, self.length
+        )
+
+
+def resolve(data):
+    """
+    Return the content of `data`, reading it when `data` is a reference.
+
+    :param data: `bytes` or :py:class:`.ByteRange`.
+    :return: bytes-like object.
+    """
+    if isinstance(data, ByteRange):
+        return data.read()
+    return data
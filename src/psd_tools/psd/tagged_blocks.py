@@ -39,8 +39,8 @@ from psd_tools.psd.vector import (
 from psd_tools.validators import in_
 from psd_tools.utils import (
     read_fmt, write_fmt, read_length_block, write_length_block, is_readable,
-    write_bytes, write_padding, read_pascal_string, write_pascal_string,
-    trimmed_repr, new_registry
+    write_bytes, read_padding, write_padding, read_pascal_string,
+    write_pascal_string, trimmed_repr, new_registry
 )
 
 logger = logging.getLogger(__name__)
@@ -150,12 +150,18 @@ class TaggedBlocks(DictElement):
         self[key] = TaggedBlock(key=key, data=kls(*args, **kwargs))
 
     @classmethod
-    def read(cls, fp, version=1, padding=1, end_pos=None):
+    def read(cls, fp, version=1, padding=1, end_pos=None, **kwargs):
+        """
+        Read tagged blocks.
+
+        :param deferred: Boolean flag to defer decoding of the block data
+            until the first access, see :py:class:`.TaggedBlock`.
+        """
         items = []
         while is_readable(fp, 8):  # len(signature) + len(key) = 8
             if end_pos is not None and fp.tell() >= end_pos:
                 break
-            block = TaggedBlock.read(fp, version, padding)
+            block = TaggedBlock.read(fp, version, padding, **kwargs)
             if block is None:
                 break
             items.append((block.key, block))
@@ -188,7 +194,7 @@ class TaggedBlocks(DictElement):
             p.breakable('')
 
 
-@attr.s(repr=False, slots=True)
+@attr.s(repr=False, slots=True, eq=False)
 class TaggedBlock(BaseElement):
     """
     Layer tagged block with extra info.
@@ -200,6 +206,10 @@ class TaggedBlock(BaseElement):
     .. py:attribute:: data
 
         Data.
+
+    A deferred block keeps the raw bytes read from the file and decodes
+    :py:attr:`data` at the first access. A block that is never accessed is
+    written back byte-for-byte.
     """
     _SIGNATURES = (b'8BIM', b'8B64')
     _BIG_KEYS = {
@@ -231,10 +241,45 @@ class TaggedBlock(BaseElement):
         default=b'8BIM', repr=False, validator=in_(_SIGNATURES)
     )
     key = attr.ib(default=b'')
-    data = attr.ib(default=b'', repr=True)
+    _data = attr.ib(default=b'', repr=False)
+    _raw = attr.ib(default=None, repr=False)
+    _version = attr.ib(default=1, repr=False)
+
+    @property
+    def data(self):
+        if self._raw is not None:
+            kls = TYPES.get(self.key)
+            self._data = kls.frombytes(self._raw, version=self._version)
+            self._raw = None
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._raw = None
+
+    @property
+    def is_deferred(self):
+        """True if the data is not decoded yet."""
+        return self._raw is not None
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.signature, self.key, self.data) == (
+            other.signature, other.key, other.data
+        )
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
 
     @classmethod
-    def read(cls, fp, version=1, padding=1):
+    def read(
+        cls, fp, version=1, padding=1, source=None, deferred=False, **kwargs
+    ):
         signature = read_fmt('4s', fp)[0]
         if signature not in cls._SIGNATURES:
             logger.warning('Invalid signature (%r)' % (signature))
@@ -250,9 +295,23 @@ class TaggedBlock(BaseElement):
             logger.warning(message)
 
         fmt = cls._length_format(key, version)
-        raw_data = read_length_block(fp, fmt=fmt, padding=padding)
         kls = TYPES.get(key)
-        if kls:
+        if source is not None and key in (Tag.LAYER_16, Tag.LAYER_32):
+            # Read layers in place so that channel data keeps file offsets.
+            length = read_fmt(fmt, fp)[0]
+            end_pos = fp.tell() + length
+            data = kls.read(
+                fp, version=version, source=source, deferred=deferred
+            )
+            assert fp.tell() <= end_pos
+            fp.seek(end_pos, 0)
+            read_padding(fp, length, padding)
+            return cls(signature, key, data)
+
+        raw_data = read_length_block(fp, fmt=fmt, padding=padding)
+        if kls and deferred:
+            return cls(signature, key, None, raw_data, version)
+        elif kls:
             data = kls.frombytes(raw_data, version=version)
             # _raw_data = data.tobytes(version=version,
             #                          padding=1 if padding == 4 else 4)
@@ -273,6 +332,8 @@ class TaggedBlock(BaseElement):
         written = write_fmt(fp, '4s4s', self.signature, key)
 
         def writer(f):
+            if self._raw is not None and version == self._version:
+                return write_bytes(f, self._raw)
             if hasattr(self.data, 'write'):
                 # It seems padding size applies at the block level here.
                 inner_padding = 1 if padding == 4 else 4
@@ -285,6 +346,23 @@ class TaggedBlock(BaseElement):
         written += write_length_block(fp, writer, fmt=fmt, padding=padding)
         return written
 
+    def _repr_pretty_(self, p, cycle):
+        if cycle:
+            return "{name}(...)".format(name=self.__class__.__name__)
+
+        with p.group(2, '{name}('.format(name=self.__class__.__name__), ')'):
+            p.breakable('')
+            p.text('key=')
+            p.text(getattr(self.key, 'name', repr(self.key)))
+            p.text(',')
+            p.breakable()
+            p.text('data=')
+            if isinstance(self.data, bytes):
+                p.text(trimmed_repr(self.data))
+            else:
+                p.pretty(self.data)
+            p.breakable('')
+
     @classmethod
     def _length_format(cls, key, version):
         return ('I', 'Q')[int(version == 2 and key in cls._BIG_KEYS)]
@@ -0,0 +1,119 @@
+from __future__ import absolute_import, unicode_literals
+import pytest
+import logging
+
+import numpy as np
+from psd_tools.api.cache import ChannelCache
+from psd_tools.api.psd_image import PSDImage
+from psd_tools.constants import Compression
+from psd_tools.psd.layer_and_mask import ChannelData
+
+from ..utils import full_name
+
+logger = logging.getLogger(__name__)
+
+
+def test_cache_lru():
+    cache = ChannelCache(budget=8)
+    channels = [ChannelData(Compression.RAW, b'\x00' * 4) for _ in range(3)]
+    cache.put(channels[0], 8, b'\x00' * 4)
+    cache.put(channels[1], 8, b'\x01' * 4)
+    assert cache.get(channels[0], 8) == b'\x00' * 4
+    cache.put(channels[2], 8, b'\x02' * 4)
+    assert cache.size == 8
+    assert cache.get(channels[1], 8) is None
+    assert cache.get(channels[0], 8) == b'\x00' * 4
+    assert cache.get(channels[0], 16) is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    cache.put(channels[1], 8, b'\x00' * 9)
+    assert len(cache) == 2
+
+    cache.budget = 4
+    assert len(cache) == 1
+    cache.clear()
+    assert (len(cache), cache.size, cache.hits, cache.misses) == (0, 0, 0, 0)
+
+
+def test_cache_shrink():
+    cache = ChannelCache(budget=16)
+    channels = [ChannelData(Compression.RAW, b'\x00' * 4) for _ in range(3)]
+    for channel in channels:
+        cache.put(channel, 8, b'\x00' * 4)
+    assert cache.get(channels[0], 8) is not None
+    assert [entry[0] for entry in cache.entries()] == [
+        channels[1], channels[2], channels[0]
+    ]
+    cache.shrink(8)
+    assert cache.size == 8
+    assert cache.budget == 16
+    assert [(entry[0], entry[1:]) for entry in cache.entries()] == [
+        (channels[2], (8, 4)), (channels[0], (8, 4))
+    ]
+
+
+def test_cache_limit():
+    cache = ChannelCache(budget=16)
+    channels = [ChannelData(Compression.RAW, b'\x00' * 4) for _ in range(3)]
+    for channel in channels:
+        cache.put(channel, 8, b'\x00' * 4)
+    cache.limit = 8
+    assert (cache.size, cache.capacity, cache.budget) == (8, 8, 16)
+    cache.put(channels[0], 8, b'\x00' * 4)
+    assert cache.size == 8
+    cache.put(channels[1], 8, b'\x00' * 9)
+    assert cache.get(channels[1], 8) is None
+    with pytest.raises(ValueError):
+        cache.budget = -1
+
+
+def test_cache_default():
+    assert ChannelCache().budget == 0
+    psd = PSDImage.open(full_name('clipping-mask.psd'))
+    psd.composite(force=True)
+    assert psd.cache.budget == 0
+    assert len(psd.cache) == 0
+    assert psd.cache.misses == 0
+
+
+def test_cache_set_data():
+    cache = ChannelCache(budget=1024)
+    channel = ChannelData(Compression.RAW, b'\x00' * 4)
+    cache.put(channel, 8, channel.get_data(2, 2, 8))
+    assert (channel, 8) in cache
+    channel.set_data(b'\x01' * 4, 2, 2, 8)
+    assert (channel, 8) not in cache
+    assert cache.get(channel, 8) is None
+    assert len(cache) == 0
+
+
+@pytest.mark.parametrize('filename', ['clipping-mask.psd', 'group.psd'])
+def test_cache_composite(filename):
+    psd = PSDImage.open(full_name(filename), cache_budget=1 << 24)
+    expected = psd.composite(force=True)
+    misses = psd.cache.misses
+    assert misses > 0 and len(psd.cache) > 0
+    assert psd.composite(force=True) == expected
+    assert psd.cache.misses == misses
+    assert psd.cache.hits >= misses
+
+    psd.cache.budget = 0
+    assert len(psd.cache) == 0
+    assert psd.composite(force=True) == expected
+    assert len(psd.cache) == 0
+
+
+def test_cache_layer_numpy():
+    psd = PSDImage.open(full_name('clipping-mask.psd'), cache_budget=1 << 24)
+    layer = psd[0]
+    color = layer.numpy('color')
+    assert np.array_equal(layer.numpy('color'), color)
+    assert psd.cache.hits == len(
+        [info for info in layer._record.channel_info if info.id >= 0]
+    )
+
+    index = [info.id for info in layer._record.channel_info].index(0)
+    channel = layer._channels[index]
+    data = b'\x00' * (layer.width * layer.height)
+    channel.set_data(data, layer.width, layer.height, psd.depth)
+    assert np.all(layer.numpy('color')[:, :, 0] == 0)
@@ -0,0 +1,143 @@
+from __future__ import absolute_import, unicode_literals
+import pytest
+
+from psd_tools.api.psd_image import PSDImage
+from psd_tools.api.layers import GroupMixin
+from psd_tools.constants import Tag
+
+from ..utils import all_files, full_name
+
+
+def _walk(group):
+    for layer in group:
+        yield layer
+        if layer.is_group():
+            for child in _walk(layer):
+                yield child
+        for clip_layer in layer.clip_layers:
+            yield clip_layer
+
+
+@pytest.mark.parametrize('filename', all_files())
+def test_index_descendants(filename):
+    psd = PSDImage.open(filename)
+    expected = list(_walk(psd))
+    assert list(psd.descendants()) == expected
+    assert list(GroupMixin.descendants(psd)) == expected
+    assert len(psd.index) == len(expected)
+    for layer in expected:
+        if layer.layer_id != -1:
+            assert layer.layer_id in psd.index
+            assert psd.index.get(layer.layer_id).layer_id == layer.layer_id
+        assert any(x is layer for x in psd.index.find_by_name(layer.name))
+        assert any(x is layer for x in psd.index.find_by_kind(layer.kind))
+
+
+def test_index_lookup():
+    psd = PSDImage.open(full_name('clipping-mask.psd'))
+    assert psd.index.get(4).name == 'Shape 3'
+    assert psd.index.get(100) is None
+    assert 100 not in psd.index
+    assert [x.layer_id for x in psd.index.find_by_kind('group')] == [8, 6]
+    assert psd.index.find_by_name('Unknown') == []
+    assert psd.index.find_by_kind('unknown') == []
+
+
+def test_index_rename():
+    psd = PSDImage.open(full_name('clipping-mask.psd'))
+    layer = psd.index.get(5)
+    assert psd.index.find_by_name('Shape 4') == [layer]
+    layer.name = 'Shape 1'
+    assert psd.index.find_by_name('Shape 4') == []
+    assert [x.layer_id for x in psd.index.find_by_name('Shape 1')] == [5, 2]
+
+
+def test_index_remove():
+    psd = PSDImage.open(full_name('clipping-mask.psd'))
+    assert 6 in psd.index
+    group = psd.index.get(8)
+    del group[0]
+    assert 6 not in psd.index
+    assert 4 not in psd.index
+    assert [x.layer_id for x in psd.descendants()] == [1, 8, 2, 3]
+
+    layer = psd.index.get(2)
+    psd[0] = layer
+    assert 1 not in psd.index
+    assert psd.index.find_by_name('Shape 1') == [layer, layer]
+
+
+def test_index_smart_object():
+    psd = PSDImage.open(full_name('placedLayer.psd'))
+    for layer in psd.index.find_by_kind('smartobject'):
+        item = psd.index.get_linked_layer(layer.smart_object.unique_id)
+        assert item is not None
+        assert layer.smart_object._data is item
+    assert psd.index.get_linked_layer('unknown') is None
+
+
+def test_index_pattern():
+    psd = PSDImage.open(full_name('layers/pattern-fill.psd'))
+    patterns = [
+        pattern for key in (Tag.PATTERNS1, Tag.PATTERNS2, Tag.PATTERNS3)
+        if key in psd.tagged_blocks
+        for pattern in psd.tagged_blocks.get_data(key)
+    ]
+    assert patterns
+    for pattern in patterns:
+        assert psd.index.get_pattern(pattern.pattern_id) is pattern
+    assert psd.index.get_pattern('unknown') is None
+
+
+def _search(psd, bbox):
+    return [
+        layer for layer in psd.descendants()
+        if layer.bbox[0] < bbox[2] and bbox[0] < layer.bbox[2] and
+        layer.bbox[1] < bbox[3] and bbox[1] < layer.bbox[3]
+    ]
+
+
+@pytest.mark.parametrize('filename', all_files())
+def test_spatial_index_search(filename):
+    psd = PSDImage.open(filename)
+    w, h = psd.width, psd.height
+    for bbox in [
+        (0, 0, w, h),
+        (0, 0, w // 2 + 1, h // 2 + 1),
+        (w // 3, h // 4, w, h),
+        (-10, -10, 0, 0),
+    ]:
+        assert psd.spatial_index.search(bbox) == _search(psd, bbox)
+    for x, y in [(0, 0), (w // 2, h // 2), (w - 1, h - 1)]:
+        assert psd.spatial_index.search_point(x, y) == _search(
+            psd, (x, y, x + 1, y + 1)
+        )
+
+
+def test_spatial_index_tree():
+    psd = PSDImage.open(full_name('clipping-mask.psd'))
+    psd.spatial_index.NODE_SIZE = 2
+    bbox = (0, 0, psd.width // 2, psd.height // 2)
+    assert psd.spatial_index.search(bbox) == _search(psd, bbox)
+    assert len(psd.spatial_index._levels) > 2
+
+
+def test_spatial_index_invalidate():
+    psd = PSDImage.open(full_name('clipping-mask.psd'))
+    layer = psd.index.get(1)
+    bbox = psd.bbox
+    assert layer in psd.spatial_index.search_point(0, 0)
+
+    layer.offset = (psd.width, psd.height)
+    assert layer not in psd.spatial_index.search_point(0, 0)
+    assert layer in psd.spatial_index.search_point(psd.width, psd.height)
+    assert psd.bbox != bbox
+
+    group = psd.index.get(8)
+    assert group.bbox != (0, 0, 0, 0)
+    group.visible = False
+    assert group.bbox == (0, 0, 0, 0)
+    assert psd.index.get(6).bbox == (0, 0, 0, 0)
+    assert group not in psd.spatial_index.search(psd.viewbox)
+    group.visible = True
+    assert group in psd.spatial_index.search(psd.viewbox)
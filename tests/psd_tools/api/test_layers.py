@@ -111,6 +111,39 @@ def test_layer_is_visible(pixel_layer):
     assert pixel_layer.is_visible()
 
 
+@pytest.mark.parametrize('fixture', ALL_FIXTURES)
+def test_layer_memoized_properties(fixture, request):
+    layer = request.getfixturevalue(fixture)
+    assert layer.name is layer.name
+    assert layer.kind is layer.kind
+    assert layer.effects is layer.effects
+    assert layer.mask is layer.mask
+    assert layer.vector_mask is layer.vector_mask
+    assert layer.stroke is layer.stroke
+    assert layer.is_visible() is layer.is_visible()
+
+
+def test_layer_memoized_invalidation():
+    group = PSDImage.open(full_name('clipping-mask.psd')).index.get(8)
+    layer = group[0][0]
+    assert layer.name != 'foo'
+    layer.name = 'foo'
+    assert layer.name == 'foo'
+
+    assert layer.is_visible()
+    group.visible = False
+    assert not group.is_visible()
+    assert not layer.is_visible()
+    group.visible = True
+    assert layer.is_visible()
+    layer.visible = False
+    assert not layer.is_visible()
+
+    bbox = layer.bbox
+    layer.offset = (bbox[0] + 1, bbox[1] + 1)
+    assert layer.bbox == (bbox[0] + 1, bbox[1] + 1, bbox[2] + 1, bbox[3] + 1)
+
+
 @pytest.fixture(params=['pixel_layer', 'group'])
 def is_group_args(request):
     return (
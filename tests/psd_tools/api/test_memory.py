@@ -0,0 +1,130 @@
+from __future__ import absolute_import, unicode_literals
+import pytest
+import logging
+
+import numpy as np
+from psd_tools.api.memory import MemoryLimitError, getsizeof
+from psd_tools.api.psd_image import PSDImage
+
+from ..utils import full_name
+
+logger = logging.getLogger(__name__)
+
+
+def test_memory_report():
+    psd = PSDImage.open(full_name('layer_mask_data.psd'), cache_budget=1 << 24)
+    report = psd.memory_report()
+    assert report.cache == 0
+    assert report.mapped == 0
+    assert report.image_data == len(psd._record.image_data.data)
+    assert len(report.layers) == len(list(psd.descendants()))
+    for item, layer in zip(report.layers, psd.descendants()):
+        assert item.layer is layer
+        assert item.channels == sum(len(c.data) for c in layer._channels)
+        assert item.tagged_blocks > 0
+        assert item.cache == 0
+    assert report.total == (
+        report.image_data + report.image_resources + report.patterns +
+        report.linked_layers + report.filter_effects + report.tagged_blocks +
+        sum(item.total for item in report.layers)
+    )
+
+    psd.composite(force=True)
+    report = psd.memory_report()
+    assert report.cache == psd.cache.size > 0
+    assert sum(item.cache for item in report.layers) == report.cache
+
+
+@pytest.mark.parametrize(
+    'filename, attribute', [
+        ('patterns.psd', 'patterns'),
+        ('layers-minimal/smartobject-layer.psd', 'linked_layers'),
+    ]
+)
+def test_memory_report_blocks(filename, attribute):
+    psd = PSDImage.open(full_name(filename))
+    report = psd.memory_report()
+    assert getattr(report, attribute) > 0
+
+
+@pytest.mark.parametrize('kwargs', [dict(lazy=True), dict(mmap=True)])
+def test_memory_report_source(kwargs):
+    with open(full_name('layer_mask_data.psd'), 'rb') as f:
+        psd = PSDImage.open(f, **kwargs)
+        report = psd.memory_report()
+    assert report.image_data == 0
+    assert all(item.channels == 0 for item in report.layers)
+    if kwargs.get('mmap'):
+        assert report.mapped > 0
+        assert report.mapped == sum(
+            item.mapped for item in report.layers
+        ) + len(psd._record.image_data.data)
+    else:
+        assert report.mapped == 0
+
+
+def test_getsizeof():
+    data = [b'\x00' * 100, {'key': b'\x00' * 100}]
+    data.append(data[0])
+    assert getsizeof(data) < getsizeof(data[0]) * 2 + getsizeof(data[1:])
+    assert getsizeof(data, {id(data)}) == 0
+
+
+def test_memory_limit():
+    psd = PSDImage.open(full_name('layer_mask_data.psd'))
+    assert psd.memory_limit is None
+    expected = psd.composite(force=True)
+    psd.cache.clear()
+
+    psd.memory_limit = 1024
+    with pytest.raises(MemoryLimitError):
+        psd.composite(force=True)
+    with pytest.raises(MemoryError):
+        psd[0].numpy()
+    with pytest.raises(MemoryLimitError):
+        psd.numpy()
+    assert psd.cache.size == 0
+
+    psd.memory_limit = 2 * 1024 * 1024
+    with pytest.raises(MemoryLimitError):
+        psd.composite(force=True)
+    image = psd.composite(force=True, tile_size=64)
+    assert np.allclose(np.asarray(image), np.asarray(expected), atol=1)
+    assert psd.cache.size <= psd.memory_limit
+
+    psd.memory_limit = None
+    assert psd.composite(force=True) == expected
+
+
+def test_memory_limit_pil():
+    psd = PSDImage.open(full_name('layer_params.psb'))
+    assert psd.has_preview()
+    psd.memory_limit = 100000
+    with pytest.raises(MemoryLimitError):
+        psd.topil()
+    with pytest.raises(MemoryLimitError):
+        psd[0].topil()
+    with pytest.raises(MemoryLimitError):
+        psd.composite()
+    assert psd.cache.size == 0
+
+
+def test_memory_limit_cache():
+    psd = PSDImage.open(full_name('layer_params.psb'), cache_budget=1 << 24)
+    psd.composite(force=True)
+    assert psd.cache.size > 100000
+    psd.memory_limit = 100000
+    assert psd.cache.size <= 100000
+    psd.memory_limit = 2000000
+    psd.composite(force=True, tile_size=64)
+    assert psd.cache.size <= psd.memory_limit
+    psd.memory_limit = None
+    assert psd.cache.capacity == psd.cache.budget
+
+
+@pytest.mark.parametrize('value', [-1, -1024])
+def test_memory_limit_invalid(value):
+    psd = PSDImage.open(full_name('layer_mask_data.psd'))
+    with pytest.raises(ValueError):
+        psd.memory_limit = value
+    assert psd.memory_limit is None
@@ -0,0 +1,63 @@
+from __future__ import absolute_import, unicode_literals
+import numpy as np
+import pytest
+
+from psd_tools.api.psd_image import PSDImage
+from psd_tools.api.pil_io import convert_image_data_to_pil
+from psd_tools.api.preview import preview
+
+from ..utils import full_name
+
+
+@pytest.mark.parametrize(
+    'filename', [
+        'clipping-mask.psd',
+        'clipping-mask.psb',
+        '1layer.psd',
+        'layers/pixel-layer.psd',
+        'colormodes/4x4_16bit_rgb.psd',
+        'colormodes/4x4_32bit_grayscale.psd',
+    ]
+)
+@pytest.mark.parametrize('size', [16, 100, 1024])
+def test_preview(filename, size):
+    image = preview(full_name(filename), size)
+    psd = PSDImage.open(full_name(filename), lazy=True)
+    assert max(image.size) == min(size, max(psd.size))
+    assert psd.preview(size).size == image.size
+
+
+def test_preview_thumbnail():
+    psd = PSDImage.open(full_name('clipping-mask.psd'))
+    thumbnail = psd.thumbnail()
+    image = psd.preview(max(thumbnail.size))
+    assert np.array_equal(np.asarray(image), np.asarray(thumbnail))
+
+
+def test_preview_image_data():
+    psd = PSDImage.open(full_name('clipping-mask.psd'))
+    image = psd.preview(max(psd.size))
+    assert np.array_equal(np.asarray(image), np.asarray(psd.topil()))
+
+
+def test_preview_file_object():
+    with open(full_name('clipping-mask.psd'), 'rb') as f:
+        image = preview(f, 300)
+    assert max(image.size) == 300
+
+
+@pytest.mark.parametrize(
+    'filename', [
+        'clipping-mask.psd',
+        'colormodes/4x4_8bit_cmyk.psd',
+        'colormodes/4x4_16bit_rgb.psd',
+        'colormodes/4x4_1bit_bitmap.psd',
+        'colormodes/4x4_8bit_index_color.psd',
+    ]
+)
+@pytest.mark.parametrize('step', [2, 3])
+def test_convert_image_data_sampled(filename, step):
+    psd = PSDImage.open(full_name(filename))
+    expected = np.asarray(psd.topil())[::step, ::step]
+    image = convert_image_data_to_pil(psd, None, False, step=step)
+    assert np.array_equal(np.asarray(image), expected)
@@ -0,0 +1,58 @@
+from __future__ import absolute_import, unicode_literals
+import io
+import pytest
+
+from psd_tools import probe
+from psd_tools.api.probe import ProbeResult
+from psd_tools.psd import PSD
+
+from ..utils import all_files, full_name
+
+
+@pytest.mark.parametrize('filename', all_files())
+def test_probe(filename):
+    with open(filename, 'rb') as f:
+        psd = PSD.read(f)
+    info = probe(filename)
+    assert isinstance(info, ProbeResult)
+    assert info.header == psd.header
+    assert info.size == (psd.header.width, psd.header.height)
+    assert info.image_resources == psd.image_resources
+    assert info.compression == psd.image_data.compression
+    layer_info = psd._get_layer_info()
+    if layer_info is None:
+        assert info.layer_count == 0
+    else:
+        assert info.layer_count == abs(layer_info.layer_count)
+
+
+class _ReadCounter(io.BytesIO):
+    def __init__(self, data):
+        super(_ReadCounter, self).__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super(_ReadCounter, self).read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+@pytest.mark.parametrize(
+    'filename', ['colormodes/4x4_16bit_rgb.psd', 'clipping-mask.psd']
+)
+def test_probe_skips_pixels(filename):
+    with open(full_name(filename), 'rb') as f:
+        data = f.read()
+    f = _ReadCounter(data)
+    info = probe(f)
+    assert info.layer_count > 0
+    assert f.bytes_read < 26 + 4 + len(info.image_resources.tobytes()) + 256
+    assert info.image_data_offset < len(data)
+
+
+def test_probe_thumbnail():
+    info = probe(full_name('layers/pixel-layer.psd'))
+    assert repr(info)
+    assert info.has_thumbnail()
+    assert info.thumbnail().size[0] > 0
+    assert isinstance(info.has_icc(), bool)
@@ -1,7 +1,9 @@
 from __future__ import absolute_import, unicode_literals
 import pytest
+import io
 import logging
 import os
+import numpy as np
 from IPython.lib.pretty import pprint
 
 from psd_tools.api.psd_image import PSDImage
@@ -113,3 +115,82 @@ def test_repr_pretty(fixture):
 ])
 def test_open(filename):
     assert isinstance(PSDImage.open(full_name(filename)), PSDImage)
+
+
+@pytest.mark.parametrize('filename', [
+    'colormodes/4x4_8bit_rgb.psd',
+    'colormodes/4x4_32bit_rgb.psd',
+    'layer_params.psb',
+])
+@pytest.mark.parametrize('option', ['lazy', 'mmap'])
+def test_open_lazy(filename, option):
+    expected = PSDImage.open(full_name(filename))
+    psd = PSDImage.open(full_name(filename), **{option: True})
+    assert (psd.numpy() == expected.numpy()).all()
+    for layer, expected_layer in zip(
+        psd.descendants(), expected.descendants()
+    ):
+        assert layer.name == expected_layer.name
+        assert layer.has_pixels() == expected_layer.has_pixels()
+        if layer.has_pixels():
+            assert (layer.numpy() == expected_layer.numpy()).all()
+
+    with open(full_name(filename), 'rb') as f:
+        psd = PSDImage.open(f, **{option: True})
+        assert (psd.numpy() == expected.numpy()).all()
+
+
+def test_open_mmap_close():
+    filename = full_name('layer_mask_data.psd')
+    with PSDImage.open(filename, mmap=True) as psd:
+        expected = PSDImage.open(filename).numpy()
+        assert np.array_equal(psd.numpy(), expected)
+        source = psd._source
+        assert not source.closed
+    assert source.closed
+    psd.close()
+
+
+def test_open_mmap_bytesio():
+    with open(full_name('layer_mask_data.psd'), 'rb') as f:
+        data = io.BytesIO(f.read())
+    with pytest.raises(ValueError):
+        PSDImage.open(data, mmap=True)
+
+
+@pytest.mark.parametrize('kwargs', [dict(lazy=True), dict(lazy=True, fp=True)])
+def test_save_over_source(tmpdir, kwargs):
+    import shutil
+    filename = str(tmpdir.join('output.psd'))
+    shutil.copy(full_name('clipping-mask.psd'), filename)
+    expected = PSDImage.open(filename)
+    if kwargs.pop('fp', False):
+        f = open(filename, 'rb')
+        psd = PSDImage.open(f, **kwargs)
+    else:
+        f = None
+        psd = PSDImage.open(filename, **kwargs)
+    psd.save(filename)
+    assert psd._source is None
+    assert np.array_equal(psd[0].numpy(), expected[0].numpy())
+    if f is not None:
+        f.close()
+    with open(filename, 'rb') as f:
+        with open(full_name('clipping-mask.psd'), 'rb') as g:
+            assert f.read() == g.read()
+
+
+def test_save_over_mmap_source(tmpdir):
+    import shutil
+    filename = str(tmpdir.join('output.psd'))
+    shutil.copy(full_name('clipping-mask.psd'), filename)
+    expected = PSDImage.open(filename)
+    psd = PSDImage.open(filename, mmap=True)
+    source = psd._source
+    psd.save(filename)
+    assert source.closed
+    assert psd._source is None
+    assert np.array_equal(psd[0].numpy(), expected[0].numpy())
+    with open(filename, 'rb') as f:
+        with open(full_name('clipping-mask.psd'), 'rb') as g:
+            assert f.read() == g.read()
@@ -0,0 +1,125 @@
+from __future__ import absolute_import, unicode_literals
+import pytest
+import logging
+
+import numpy as np
+from psd_tools.api.psd_image import PSDImage
+from psd_tools.api.scheduler import (
+    DecodeScheduler, decode_channel_rows, stream_channel_rows
+)
+from psd_tools.compression import compress
+from psd_tools.constants import Compression
+from psd_tools.psd.layer_and_mask import ChannelData
+
+from ..utils import full_name
+
+logger = logging.getLogger(__name__)
+
+FILES = [
+    'clipping-mask.psd',
+    'group.psd',
+    'layer_mask_data.psd',
+    '16bit5x5.psd',
+    '32bit5x5.psb',
+    'colormodes/4x4_8bit_rgba.psd',
+    'colormodes/4x4_8bit_grayscale.psd',
+]
+
+
+@pytest.fixture(
+    scope='module', params=[False, True], ids=['thread', 'process']
+)
+def scheduler(request):
+    scheduler = DecodeScheduler(workers=2, processes=request.param, window=2)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def _open(filename, scheduler=None):
+    psd = PSDImage.open(full_name(filename))
+    psd.scheduler = scheduler
+    return psd
+
+
+@pytest.mark.parametrize('filename', FILES)
+def test_scheduler_numpy(filename, scheduler):
+    expected = _open(filename)
+    psd = _open(filename, scheduler)
+    assert np.array_equal(psd.numpy(), expected.numpy())
+    for layer, reference in zip(psd.descendants(), expected.descendants()):
+        channels = (None, 'color', 'shape')
+        if layer.has_mask():
+            channels += ('mask', )
+        for channel in channels:
+            x = layer.numpy(channel)
+            y = reference.numpy(channel)
+            assert (x is None and y is None) or np.array_equal(x, y)
+
+
+@pytest.mark.parametrize('filename', FILES)
+def test_scheduler_topil(filename, scheduler):
+    expected = _open(filename)
+    psd = _open(filename, scheduler)
+    assert psd.topil() == expected.topil()
+    for layer, reference in zip(psd.descendants(), expected.descendants()):
+        assert layer.topil() == reference.topil()
+
+
+@pytest.mark.parametrize('filename', FILES)
+def test_scheduler_composite(filename, scheduler):
+    expected = _open(filename).composite(force=True)
+    psd = _open(filename, scheduler)
+    assert psd.composite(force=True) == expected
+    assert not scheduler._pending
+    assert not scheduler._queue
+
+
+def test_scheduler_prefetch():
+    psd = _open('group.psd')
+    scheduler = DecodeScheduler(workers=1, window=4)
+    layers = [layer for layer in psd.descendants() if layer.has_pixels()]
+    groups = [
+        [(channel, layer.width, layer.height, psd.depth, psd.version)
+         for channel in layer._channels] for layer in layers
+    ]
+    assert len(groups) == 2 and len(groups[0]) == 3
+    with scheduler.prefetch(groups):
+        assert len(scheduler._pending) == 4
+        scheduler.decode(groups[0][:2])
+        assert len(scheduler._pending) == 4
+        # Skipping to the next group discards the preceding group.
+        scheduler.decode(groups[1][:1])
+        assert all(group == 1 for group, _ in scheduler._pending.values())
+    assert not scheduler._pending
+    scheduler.shutdown()
+
+
+def test_scheduler_prefetch_arguments():
+    scheduler = DecodeScheduler(workers=1, window=4)
+    channel = ChannelData(Compression.RAW, b'\x00' * 4)
+    task = (channel, 2, 2, 8, 1)
+    other = (channel, 4, 1, 8, 1)
+    with scheduler.prefetch([[task]]):
+        (_, future), = scheduler._pending.values()
+        assert scheduler._take(other) is not future
+        assert len(scheduler._pending) == 1
+        assert scheduler._take(task) is future
+    scheduler.shutdown()
+
+
+def test_stream_channel_rows():
+    psd = _open('group.psd')
+    width, height = 4, 6
+    fixture = bytes(bytearray(range(width * height)))
+    channel = ChannelData(
+        Compression.ZIP, compress(fixture, Compression.ZIP, width, height, 8)
+    )
+    task = (channel, width, height, 8, 1)
+    with stream_channel_rows(psd) as readers:
+        with stream_channel_rows(psd) as inner:
+            assert inner is readers
+        for start, stop in [(0, 2), (0, 2), (2, 4), (4, 6)]:
+            data, = decode_channel_rows(psd, [task], start, stop)
+            assert data == fixture[start * width:stop * width]
+        assert len(readers) == 1
+    assert psd._row_readers is None
@@ -0,0 +1,74 @@
+from __future__ import absolute_import, unicode_literals
+import io
+import pytest
+
+from psd_tools.api.psd_image import PSDImage
+from psd_tools.api.synthetic import generate
+from psd_tools.constants import Compression
+from psd_tools.psd import PSD
+
+
+@pytest.mark.parametrize('depth', [8, 16, 32])
+@pytest.mark.parametrize('compression', list(Compression))
+def test_generate(depth, compression):
+    with io.BytesIO() as f:
+        generate(
+            f, (64, 48), layers=5, depth=depth, compression=compression,
+            image=True
+        )
+        data = f.getvalue()
+    assert PSD.read(io.BytesIO(data)).tobytes() == data
+
+    psd = PSDImage.open(io.BytesIO(data))
+    assert psd.size == (64, 48)
+    assert psd.depth == depth
+    assert psd.has_preview()
+    assert len(psd) == 5
+    for layer in psd:
+        assert layer.kind == 'pixel'
+        assert layer.numpy().shape == (layer.height, layer.width, 4)
+
+
+@pytest.mark.parametrize('version', [1, 2])
+def test_generate_features(version):
+    with io.BytesIO() as f:
+        generate(
+            f, (100, 80), layers=8, group_depth=3, masks=True, effects=True,
+            text=True, text_length=40, version=version, mode='RGBA'
+        )
+        data = f.getvalue()
+    assert PSD.read(io.BytesIO(data)).tobytes() == data
+
+    psd = PSDImage.open(io.BytesIO(data))
+    assert psd.version == version
+    assert not psd.has_preview()
+    layers = list(psd.descendants())
+    groups = [layer for layer in layers if layer.is_group()]
+    assert len(groups) == 3
+    assert groups[-1].parent is groups[-2]
+    type_layers = [layer for layer in layers if layer.kind == 'type']
+    assert len(type_layers) == 8
+    for layer in type_layers:
+        assert layer.has_mask()
+        assert layer.mask.bbox == layer.bbox
+        assert [effect.__class__.__name__ for effect in layer.effects] == [
+            'DropShadow', 'ColorOverlay'
+        ]
+        assert len(layer.text) == 40
+        runs = layer.engine_dict['StyleRun']['RunLengthArray']
+        assert sum(runs) == 41
+
+
+def test_generate_seed():
+    outputs = []
+    for seed in (0, 0, 1):
+        with io.BytesIO() as f:
+            generate(f, (32, 32), layers=3, masks=0.5, seed=seed)
+            outputs.append(f.getvalue())
+    assert outputs[0] == outputs[1]
+    assert outputs[0] != outputs[2]
+
+
+def test_generate_errors():
+    with pytest.raises(ValueError):
+        generate(io.BytesIO(), (300001, 10))
@@ -0,0 +1,289 @@
+from __future__ import absolute_import, unicode_literals
+import io
+import numpy as np
+import pytest
+
+from psd_tools.api.probe import probe
+from psd_tools.api.psd_image import PSDImage
+from psd_tools.api.writer import DTYPES, PSDWriter
+from psd_tools.constants import BlendMode, Compression, Tag
+from psd_tools.psd import PSD
+
+
+class Pipe(object):
+    """Non-seekable output."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
+def _make_pixels(shape, depth, seed=0):
+    values = np.random.RandomState(seed).rand(*shape)
+    if depth == 32:
+        return values.astype(np.float32)
+    return (values * ((1 << depth) - 1)).astype(DTYPES[depth])
+
+
+def _channel_bytes(pixels, index, depth):
+    plane = np.ascontiguousarray(pixels[:, :, index])
+    return plane.astype(DTYPES[depth]).tobytes()
+
+
+@pytest.mark.parametrize('depth', [8, 16, 32])
+@pytest.mark.parametrize('compression', list(Compression))
+def test_writer(depth, compression):
+    layer = _make_pixels((40, 30, 4), depth)
+    image = _make_pixels((48, 64, 3), depth, 1)
+    with io.BytesIO() as f:
+        with PSDWriter(
+            f, (64, 48), depth=depth, compression=compression
+        ) as writer:
+            writer.add_layer(layer, name='Layer 1', offset=(5, 3))
+            writer.add_layer(
+                iter(layer[:, :, :3]), name='Layer 2', offset=(-3, 20),
+                size=(30, 40)
+            )
+            writer.set_image(image)
+        f.seek(0)
+        psd = PSD.read(f)
+
+    records = list(psd._iter_layers())
+    assert len(records) == 2
+    for (record, channels), pixels in zip(records, (layer, layer[:, :, :3])):
+        assert record.width == 30 and record.height == 40
+        for info, channel in zip(record.channel_info, channels):
+            index = 3 if info.id == -1 else info.id
+            assert channel.compression == compression
+            assert channel.get_data(30, 40, depth) == _channel_bytes(
+                pixels, index, depth
+            )
+    assert psd.image_data.compression == compression
+    planes = psd.image_data.get_data(psd.header)
+    for index in range(3):
+        assert planes[index] == _channel_bytes(image, index, depth)
+
+
+@pytest.mark.parametrize('depth', [8, 16])
+@pytest.mark.parametrize('version', [1, 2])
+def test_writer_non_seekable(depth, version):
+    output = Pipe()
+    with PSDWriter(
+        output, (20, 10), mode='RGBA', depth=depth, version=version
+    ) as writer:
+        writer.add_layer(np.full((10, 20, 4), 0.5), name='Layer 1')
+        writer.add_layer(None, name='Empty')
+    data = output.getvalue()
+
+    # The layout is the same as the low-level writer.
+    assert PSD.read(io.BytesIO(data)).tobytes() == data
+    info = probe(io.BytesIO(data))
+    assert info.version == version
+    assert info.layer_count == 2
+
+
+def test_writer_layers():
+    with io.BytesIO() as f:
+        with PSDWriter(f, (32, 32)) as writer:
+            writer.add_layer(np.zeros((32, 32, 3), np.uint8), name='Bottom')
+            writer.begin_group('Group', opacity=128)
+            layer_id = writer.add_layer(
+                np.ones((8, 8, 4)),
+                name='ロゴ',
+                blend_mode=BlendMode.MULTIPLY,
+                visible=False,
+            )
+            writer.add_layer(np.ones((8, 8, 3)), clipping=True)
+            writer.end_group()
+        f.seek(0)
+        psd = PSDImage.open(f)
+
+    assert [layer.name for layer in psd] == ['Bottom', 'Group']
+    group = psd[1]
+    assert group.is_group()
+    assert group.opacity == 128
+    assert group.blend_mode == BlendMode.PASS_THROUGH
+    layer = group[0]
+    assert layer.name == 'ロゴ'
+    assert layer.layer_id == layer_id
+    assert layer.blend_mode == BlendMode.MULTIPLY
+    assert not layer.visible
+    assert layer.has_clip_layers()
+    assert np.all(np.asarray(layer.topil()) == 255)
+
+
+def test_writer_rows():
+    pixels = _make_pixels((10, 6, 4), 8)
+    with io.BytesIO() as f:
+        with PSDWriter(f, (6, 10), rows=4) as writer:
+            # Strips and rows of different heights.
+            writer.add_layer(
+                iter([pixels[:3], pixels[3], pixels[4:]]), size=(6, 10)
+            )
+        f.seek(0)
+        psd = PSD.read(f)
+    record, channels = next(psd._iter_layers())
+    assert [info.id for info in record.channel_info] == [-1, 0, 1, 2]
+    for info, channel in zip(record.channel_info, channels):
+        index = 3 if info.id == -1 else info.id
+        assert channel.get_data(6, 10, 8) == _channel_bytes(pixels, index, 8)
+
+
+def test_writer_grayscale_rows():
+    pixels = _make_pixels((4, 6), 16)
+    with io.BytesIO() as f:
+        with PSDWriter(f, (6, 4), mode='L', depth=16) as writer:
+            writer.add_layer(iter(pixels), size=(6, 4))
+            writer.set_image(pixels)
+        f.seek(0)
+        psd = PSD.read(f)
+    record, channels = next(psd._iter_layers())
+    expected = pixels.astype('>u2').tobytes()
+    assert channels[0].get_data(6, 4, 16) == expected
+    assert psd.image_data.get_data(psd.header)[0] == expected
+
+
+def test_writer_blank_image():
+    with io.BytesIO() as f:
+        with PSDWriter(f, (16, 16), compression=Compression.ZIP) as writer:
+            writer.add_layer(np.full((16, 16, 3), 255, np.uint8))
+        f.seek(0)
+        psd = PSDImage.open(f)
+    assert not psd.has_preview()
+    assert psd._record.image_data.compression == Compression.ZIP
+    assert psd.composite().getpixel((0, 0))[:3] == (255, 255, 255)
+
+
+def test_writer_errors():
+    with io.BytesIO() as f:
+        writer = PSDWriter(f, (8, 8))
+        with pytest.raises(ValueError):
+            writer.add_layer(np.zeros((8, 8, 2), np.uint8))
+        with pytest.raises(ValueError):
+            writer.add_layer(iter(np.zeros((8, 8, 3), np.uint8)))
+        with pytest.raises(ValueError):
+            writer.add_layer(
+                iter(np.zeros((8, 8, 3), np.uint8)), size=(8, 9)
+            )
+        with pytest.raises(ValueError):
+            writer.add_layer(
+                iter(np.zeros((8, 8, 3), np.uint8)), size=(7, 8)
+            )
+        with pytest.raises(ValueError):
+            writer.set_image(np.zeros((8, 8, 4), np.uint8))
+        with pytest.raises(ValueError):
+            writer.end_group()
+        writer.begin_group()
+        with pytest.raises(ValueError):
+            writer.close()
+        writer.end_group()
+        writer.close()
+        assert writer.closed
+        with pytest.raises(ValueError):
+            writer.add_layer()
+
+
+def test_writer_discard_on_error():
+    with io.BytesIO() as f:
+        with pytest.raises(RuntimeError):
+            with PSDWriter(f, (8, 8)) as writer:
+                writer.add_layer(np.zeros((8, 8, 3), np.uint8))
+                raise RuntimeError()
+        assert writer.closed
+        assert f.getvalue() == b''
+
+
+def test_writer_filename(tmpdir):
+    filename = str(tmpdir.join('output.psb'))
+    with PSDWriter(filename, (16, 8), version=2) as writer:
+        writer.add_layer(np.zeros((8, 16, 3), np.uint8), name='Layer')
+    psd = PSDImage.open(filename)
+    assert psd.version == 2
+    assert psd.size == (16, 8)
+    assert psd[0].name == 'Layer'
+
+
+def test_writer_mask():
+    from psd_tools.constants import ChannelID
+    from psd_tools.psd.base import ByteElement
+
+    pixels = _make_pixels((10, 8, 3), 8)
+    mask = _make_pixels((6, 4), 8, 1)
+    with io.BytesIO() as f:
+        with PSDWriter(f, (16, 16)) as writer:
+            writer.add_layer(
+                pixels, offset=(2, 3), mask=mask, mask_offset=(4, 5),
+                mask_color=255,
+                tagged_blocks=[(Tag.BLEND_CLIPPING_ELEMENTS, ByteElement(1))],
+            )
+            writer.add_layer(None, mask=iter(mask), size=(4, 6))
+        data = f.getvalue()
+    psd = PSD.read(io.BytesIO(data))
+    assert psd.tobytes() == data
+
+    layers = list(psd._iter_layers())
+    for (record, channels), (left, top) in zip(layers, [(4, 5), (0, 0)]):
+        assert record.channel_info[-1].id == ChannelID.USER_LAYER_MASK
+        mask_data = record.mask_data
+        assert (mask_data.left, mask_data.top) == (left, top)
+        assert (mask_data.width, mask_data.height) == (4, 6)
+        assert channels[-1].get_data(4, 6, 8) == mask.tobytes()
+    record = layers[0][0]
+    assert record.mask_data.background_color == 255
+    assert record.tagged_blocks.get_data(Tag.BLEND_CLIPPING_ELEMENTS) == 1
+
+
+def test_writer_mask_defaults():
+    pixels = _make_pixels((6, 4, 3), 8)
+    mask = _make_pixels((6, 4), 8, 1)
+    with io.BytesIO() as f:
+        with PSDWriter(f, (16, 16)) as writer:
+            writer.add_layer(pixels, offset=(3, 2), mask=mask)
+        f.seek(0)
+        psd = PSDImage.open(f)
+    layer = psd[0]
+    assert layer.has_mask()
+    assert layer.mask.bbox == layer.bbox == (3, 2, 7, 8)
+    assert layer.mask.background_color == 0
+    assert np.allclose(layer.numpy('mask')[:, :, 0], mask / 255.)
+
+
+def test_writer_mask_errors():
+    pixels = _make_pixels((6, 4, 3), 8)
+    with io.BytesIO() as f:
+        with PSDWriter(f, (16, 16)) as writer:
+            with pytest.raises(ValueError):
+                writer.add_layer(pixels, mask=np.zeros((6, 4, 3), np.uint8))
+            with pytest.raises(ValueError):
+                writer.add_layer(
+                    pixels, mask=iter(np.zeros((5, 4), np.uint8))
+                )
+            writer.add_layer(pixels)
+        f.seek(0)
+        psd = PSDImage.open(f)
+    assert len(psd) == 1
+    assert not psd[0].has_mask()
+
+
+def test_writer_tagged_blocks():
+    from psd_tools.psd.base import IntegerElement
+
+    with io.BytesIO() as f:
+        with PSDWriter(f, (8, 8)) as writer:
+            writer.add_layer(
+                _make_pixels((8, 8, 3), 8),
+                tagged_blocks=[(b'lspf', IntegerElement(1))],
+            )
+        f.seek(0)
+        psd = PSDImage.open(f)
+    blocks = psd[0].tagged_blocks
+    assert blocks.get_data(Tag.PROTECTED_SETTING) == 1
+    assert blocks.get_data(Tag.LAYER_ID) == 1
+    with pytest.raises(ValueError):
+        with PSDWriter(io.BytesIO(), (8, 8)) as writer:
+            writer.add_layer(tagged_blocks=[(b'????', IntegerElement(1))])
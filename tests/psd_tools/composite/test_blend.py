@@ -1,6 +1,10 @@
 import pytest
 import logging
 
+import numpy as np
+from psd_tools.composite import Workspace
+from psd_tools.composite.blend import BLEND_FUNC
+
 from .test_composite import check_composite_quality
 
 logger = logging.getLogger(__name__)
@@ -47,3 +51,28 @@ def test_blend_quality(filename):
 @pytest.mark.xfail
 def test_blend_quality_xfail(filename):
     check_composite_quality(filename, threshold=0.01)
+
+
+@pytest.mark.parametrize('blend_fn', sorted(set(BLEND_FUNC.values()),
+                                            key=lambda x: x.__name__))
+def test_blend_out(blend_fn):
+    rng = np.random.RandomState(0)
+    Cb = rng.rand(8, 8, 3).astype(np.float32)
+    Cs = rng.rand(8, 8, 3).astype(np.float32)
+    Cb[0], Cs[1], Cs[2] = 0., 1., 0.5
+    expected = blend_fn(Cb.copy(), Cs.copy())
+    out = np.full(expected.shape, np.nan, dtype=np.float32)
+    assert blend_fn(Cb, Cs, out=out) is out
+    assert np.allclose(out, expected, atol=1e-6)
+
+
+def test_workspace():
+    workspace = Workspace()
+    buffer = workspace.get('color', (4, 4, 3))
+    assert buffer.shape == (4, 4, 3)
+    assert workspace.nbytes == buffer.nbytes
+    assert np.shares_memory(workspace.get('color', (2, 2, 1)), buffer)
+    workspace.get('color', (8, 8, 3))
+    assert workspace.nbytes == 8 * 8 * 3 * 4
+    workspace.clear()
+    assert workspace.nbytes == 0
@@ -218,3 +218,103 @@ def test_composite_stroke():
     reference = composite(psd, force=True)
     result = composite(psd)
     assert _mse(reference[0], result[0]) > 0
+
+
+@pytest.mark.parametrize('filename', [
+    'clipping-mask.psd',
+    'group.psd',
+    'layer_mask_data.psd',
+    'stroke.psd',
+    'effects/stroke-composite.psd',
+    'effects/shape-fx.psd',
+    'layers/solid-color-fill.psd',
+    'layers/pattern-fill.psd',
+    'layers/gradient-fill.psd',
+    'path-operations/exclude-group.psd',
+    'transparency/transparency-group.psd',
+    '0layers.psd',
+])
+@pytest.mark.parametrize('force', [False, True])
+def test_composite_tiles(filename, force):
+    psd = PSDImage.open(full_name(filename))
+    reference = np.asarray(psd.composite(force=force, ignore_preview=True))
+    result = np.asarray(
+        psd.composite(force=force, ignore_preview=True, tile_size=(37, 23))
+    )
+    assert reference.shape == result.shape
+    assert _mse(reference / 255., result / 255.) < 1e-5
+
+
+def test_composite_tiles_bbox():
+    from psd_tools.composite import composite_tiles
+    psd = PSDImage.open(full_name('clipping-mask.psd'))
+    viewport = (10, 20, 250, 100)
+    color, shape, alpha = composite(psd, viewport=viewport)
+    tiles = list(composite_tiles(psd, 64, viewport=viewport))
+    assert len(tiles) == 4 * 2
+    for bbox, color_t, shape_t, alpha_t in tiles:
+        assert color_t.shape[:2] == (bbox[3] - bbox[1], bbox[2] - bbox[0])
+        region = (
+            slice(bbox[1] - viewport[1], bbox[3] - viewport[1]),
+            slice(bbox[0] - viewport[0], bbox[2] - viewport[0]),
+        )
+        assert _mse(color[region], color_t) < 1e-6
+        assert _mse(alpha[region], alpha_t) < 1e-6
+
+
+@pytest.mark.parametrize('filename', ['layer_mask_data.psd', 'group.psd'])
+def test_layer_data_viewport(filename):
+    from psd_tools.api.numpy_io import get_layer_data
+    psd = PSDImage.open(full_name(filename))
+    for layer in psd.descendants():
+        if not layer.has_pixels():
+            continue
+        left, top, right, bottom = layer.bbox
+        viewport = (left + 3, top + 5, right - 2, bottom - 4)
+        expected = layer.numpy()[5:-4, 3:-2]
+        assert np.array_equal(
+            get_layer_data(layer, None, viewport=viewport), expected
+        )
+
+
+@pytest.mark.parametrize('processes', [False, True])
+@pytest.mark.parametrize('filename', [
+    'clipping-mask.psd',
+    'effects/stroke-composite.psd',
+])
+def test_composite_tiles_workers(filename, processes):
+    from psd_tools.composite import composite_tiles
+    psd = PSDImage.open(full_name(filename))
+    expected = list(composite_tiles(psd, 32, force=True))
+    result = list(
+        composite_tiles(psd, 32, force=True, workers=3, processes=processes)
+    )
+    assert [x[0] for x in result] == [x[0] for x in expected]
+    for x, y in zip(result, expected):
+        for a, b in zip(x[1:], y[1:]):
+            assert np.array_equal(a, b)
+
+
+def test_composite_workers():
+    psd = PSDImage.open(full_name('clipping-mask.psd'))
+    expected = psd.composite(force=True, tile_size=64)
+    assert psd.composite(force=True, tile_size=64, workers=4) == expected
+    result = psd.composite(force=True, workers=4)
+    assert _mse(np.asarray(expected) / 255., np.asarray(result) / 255.) < 1e-5
+
+
+def test_composite_backdrop_in_place():
+    psd = PSDImage.open(full_name('clipping-mask.psd'))
+    color = np.full((psd.height, psd.width, 3), 0.5, dtype=np.float32)
+    alpha = np.ones((psd.height, psd.width, 1), dtype=np.float32)
+    backdrop = color.copy(), alpha.copy()
+    result, _, _ = composite(
+        psd,
+        color=color,
+        alpha=alpha,
+        layer_filter=lambda x: x.is_visible() and x is not psd[0]
+    )
+    assert np.array_equal(color, backdrop[0])
+    assert np.array_equal(alpha, backdrop[1])
+    # Pixels outside of the layers keep the backdrop.
+    assert np.all(result[:, :psd[1].left] == 0.5)
@@ -1,5 +1,6 @@
 import pytest
 import logging
+import numpy as np
 
 from psd_tools import PSDImage
 from psd_tools.constants import Tag
@@ -79,6 +80,33 @@ def test_draw_gradient_fill():
     draw_gradient_fill(psd.viewbox, desc)
 
 
+@pytest.mark.parametrize('filename, tag', [
+    ('layers/solid-color-fill.psd', Tag.SOLID_COLOR_SHEET_SETTING),
+    ('layers/pattern-fill.psd', Tag.PATTERN_FILL_SETTING),
+    ('layers/gradient-fill.psd', Tag.GRADIENT_FILL_SETTING),
+])
+def test_draw_fill_region(filename, tag):
+    psd = PSDImage.open(full_name(filename))
+    desc = psd[0].tagged_blocks.get_data(tag)
+    draw = {
+        Tag.SOLID_COLOR_SHEET_SETTING: draw_solid_color_fill,
+        Tag.PATTERN_FILL_SETTING: lambda *args: draw_pattern_fill(
+            args[0], psd, *args[1:]
+        ),
+        Tag.GRADIENT_FILL_SETTING: draw_gradient_fill,
+    }[tag]
+    viewport = (10, 20, 110, 90)
+    region = (37, 41, 93, 90)
+    expected = draw(viewport, desc)
+    result = draw(viewport, desc, region)
+    for x, y in zip(expected, result):
+        if x is None:
+            assert y is None
+            continue
+        assert y.shape[:2] == (region[3] - region[1], region[2] - region[0])
+        assert np.allclose(x[21:70, 27:83], y)
+
+
 @pytest.mark.parametrize(("filename", ), [
     ('gradient-styles.psd', ),
     ('gradient-sizes.psd', ),
@@ -2,8 +2,10 @@ from __future__ import unicode_literals, print_function
 import pytest
 import logging
 from psd_tools.compression import (
-    compress, decompress, encode_prediction, decode_prediction,
-    encode_rle, decode_rle
+    compress, decompress, decompress_rows, decompress_sampled,
+    iter_decompressed_planes, RowReader, encode_prediction,
+    decode_prediction,
+    encode_rle, decode_rle, _encode_prediction, _decode_prediction
 )
 from psd_tools.constants import Compression
 
@@ -29,6 +31,24 @@ def test_prediction(fixture, width, height, depth):
     assert fixture == decoded
 
 
+@pytest.mark.parametrize(
+    'width, height, depth', [
+        (1, 1, 8),
+        (37, 5, 8),
+        (37, 5, 16),
+        (37, 5, 32),
+        (1, 7, 32),
+    ]
+)
+def test_prediction_parity(width, height, depth):
+    size = width * height * depth // 8
+    fixture = bytes(bytearray((x * 7919 + 13) % 256 for x in range(size)))
+    encoded = encode_prediction(fixture, width, height, depth)
+    assert encoded == _encode_prediction(fixture, width, height, depth)
+    assert decode_prediction(encoded, width, height, depth) == fixture
+    assert _decode_prediction(encoded, width, height, depth) == fixture
+
+
 @pytest.mark.parametrize(
     'fixture, width, height, depth, version', [
         (bytes(bytearray(range(256))), 128, 2, 8, 1),
@@ -84,3 +104,122 @@ def test_compress_decompress_fail(data, width, height, depth):
         decoded, Compression.ZIP_WITH_PREDICTION, width, height, depth
     )
     assert data == encoded
+
+
+@pytest.mark.parametrize(
+    'data, kind, width, height, depth, version', [
+        (RAW_IMAGE_3x3_8bit, Compression.RAW, 3, 3, 8, 1),
+        (RAW_IMAGE_3x3_8bit, Compression.RLE, 3, 3, 8, 1),
+        (RAW_IMAGE_3x3_8bit, Compression.RLE, 3, 3, 8, 2),
+        (RAW_IMAGE_3x3_8bit, Compression.ZIP, 3, 3, 8, 1),
+        (RAW_IMAGE_2x2_32bit, Compression.ZIP_WITH_PREDICTION, 2, 2, 32, 1),
+    ]
+)
+def test_decompress_memoryview(data, kind, width, height, depth, version):
+    compressed = compress(data, kind, width, height, depth, version)
+    output = decompress(
+        memoryview(compressed), kind, width, height, depth, version
+    )
+    assert output == data, 'output=%r, expected=%r' % (output, data)
+
+
+@pytest.mark.parametrize('kind', list(Compression))
+@pytest.mark.parametrize('depth, version', [(8, 1), (16, 2), (32, 1)])
+@pytest.mark.parametrize('start, stop', [(0, 7), (0, 1), (3, 5), (6, 7)])
+def test_decompress_rows(kind, depth, version, start, stop):
+    width, height = 5, 7
+    size = width * height * depth // 8
+    fixture = bytes(bytearray((x * 7919 + 13) % 256 for x in range(size)))
+    encoded = compress(fixture, kind, width, height, depth, version)
+    row_size = width * depth // 8
+    decoded = decompress_rows(
+        encoded, kind, width, height, depth, version, start, stop
+    )
+    assert decoded == fixture[start * row_size:stop * row_size]
+
+
+@pytest.mark.parametrize('kind', [Compression.ZIP, Compression.RLE])
+def test_decompress_rows_large(kind):
+    import random
+    width, height = 300, 400
+    rng = random.Random(0)
+    fixture = bytes(
+        bytearray(rng.randrange(256) for _ in range(width * height))
+    )
+    encoded = compress(fixture, kind, width, height, 8)
+    assert len(encoded) > 1 << 16
+    decoded = decompress_rows(encoded, kind, width, height, 8, 1, 250, 390)
+    assert decoded == fixture[250 * width:390 * width]
+
+
+@pytest.mark.parametrize(
+    'kind', [Compression.ZIP, Compression.ZIP_WITH_PREDICTION]
+)
+@pytest.mark.parametrize('depth', [8, 16, 32])
+def test_row_reader(kind, depth):
+    width, height = 5, 9
+    size = width * height * depth // 8
+    fixture = bytes(bytearray((x * 7919 + 13) % 256 for x in range(size)))
+    encoded = compress(fixture, kind, width, height, depth)
+    row_size = width * depth // 8
+    reader = RowReader(encoded, kind, width, height, depth)
+    for start, stop in [(0, 3), (0, 3), (3, 6), (4, 8), (8, 9), (1, 2)]:
+        assert reader.read(start, stop) == (
+            fixture[start * row_size:stop * row_size]
+        )
+
+
+@pytest.mark.parametrize('kind', list(Compression))
+@pytest.mark.parametrize('depth, version', [(8, 1), (16, 2), (32, 1)])
+@pytest.mark.parametrize('rows', [[], [0], [0, 3, 6], [1, 2, 5]])
+def test_decompress_sampled(kind, depth, version, rows):
+    width, height = 5, 7
+    size = width * height * depth // 8
+    fixture = bytes(bytearray((x * 7919 + 13) % 256 for x in range(size)))
+    encoded = compress(fixture, kind, width, height, depth, version)
+    row_size = width * depth // 8
+    decoded = decompress_sampled(
+        encoded, kind, width, height, depth, version, rows
+    )
+    assert decoded == b''.join(
+        fixture[row * row_size:(row + 1) * row_size] for row in rows
+    )
+
+
+@pytest.mark.parametrize('kind', [Compression.ZIP, Compression.RLE])
+def test_decompress_sampled_large(kind):
+    import random
+    width, height = 300, 400
+    rng = random.Random(0)
+    fixture = bytes(
+        bytearray(rng.randrange(256) for _ in range(width * height))
+    )
+    encoded = compress(fixture, kind, width, height, 8)
+    assert len(encoded) > 1 << 16
+    rows = list(range(0, height, 9))
+    decoded = decompress_sampled(encoded, kind, width, height, 8, 1, rows)
+    assert decoded == b''.join(
+        fixture[row * width:(row + 1) * width] for row in rows
+    )
+
+
+@pytest.mark.parametrize('kind', [Compression.ZIP, Compression.RLE])
+def test_iter_decompressed_planes_large(kind):
+    import random
+    width, height, channels = 300, 400, 3
+    rng = random.Random(0)
+    fixture = bytes(
+        bytearray(rng.randrange(256) for _ in range(width * height * channels))
+    )
+    encoded = compress(fixture, kind, width, height * channels, 8)
+    assert len(encoded) > 1 << 16
+    plane_size = width * height
+    for top, planes in iter_decompressed_planes(
+        encoded, kind, width, height, channels, 8, 1, 128
+    ):
+        bottom = min(top + 128, height)
+        assert planes == [
+            fixture[index * plane_size + top * width:
+                    index * plane_size + bottom * width]
+            for index in range(channels)
+        ]
@@ -31,3 +31,43 @@ def test_identical():
 def test_malicious(mod, data, size):
     with pytest.raises(ValueError):
         mod.decode(data, size)
+
+
+@pytest.mark.parametrize('version', [1, 2])
+@pytest.mark.parametrize('row', [
+    b'',
+    b'\x01',
+    b'\x01\x02\x03',
+    b'\x01\x01\x01\x02',
+    bytes(bytearray(range(256))) * 2,
+    b'\x00' * 300 + bytes(bytearray(range(200))) + b'\xff' * 3,
+])
+def test_rows_identical(row, version):
+    height = 3
+    data = row * height
+    expected = rle.encode_rows(data, height, len(row), version)
+    assert _rle.encode_rows(data, height, len(row), version) == expected
+    assert expected[(2, 4)[version - 1] * height:] == rle.encode(row) * height
+    assert rle.decode_rows(expected, height, len(row), version) == data
+    assert _rle.decode_rows(expected, height, len(row), version) == data
+
+
+@pytest.mark.parametrize('mod', [rle, _rle])
+def test_decode_rows_out(mod):
+    import numpy as np
+    data = bytes(bytearray(range(256))) * 4
+    encoded = mod.encode_rows(data, 4, 256)
+    out = np.zeros(1024, dtype=np.uint8)
+    assert mod.decode_rows(encoded, 4, 256, 1, out) is out
+    assert out.tobytes() == data
+
+
+@pytest.mark.parametrize('mod', [rle, _rle])
+@pytest.mark.parametrize('data', [
+    b'\x00\x02\xfd\x01',
+    b'\x00\x03\xfd\x01',
+    b'\x00',
+])
+def test_decode_rows_malicious(mod, data):
+    with pytest.raises(ValueError):
+        mod.decode_rows(data, 1, 3)
@@ -32,6 +32,27 @@ def test_tokenizer_item(fixture, token_type):
     assert o_token_type == token_type
 
 
+@pytest.mark.parametrize(
+    'fixture', [
+        b'<< /Key #foo >>',
+        b'/Text (\xfe\xff\x00a',
+    ]
+)
+def test_tokenizer_error(fixture):
+    with pytest.raises(ValueError):
+        list(Tokenizer(fixture))
+
+
+def test_engine_data_nested():
+    depth = 5000
+    fixture = b'<< /A ' + b'[ ' * depth + b'1 ' + b'] ' * depth + b'>>'
+    value = EngineData.frombytes(fixture)['A']
+    for _ in range(depth - 1):
+        assert len(value) == 1
+        value = value[0]
+    assert value[0] == 1
+
+
 @pytest.mark.parametrize(
     'filename, indent, write', [
         ('TySh_1.dat', 0, True),
@@ -1,5 +1,6 @@
 from __future__ import absolute_import, unicode_literals
 import pytest
+import numpy as np
 from psd_tools.constants import Compression
 from psd_tools.psd.header import FileHeader
 from psd_tools.psd.image_data import ImageData
@@ -60,3 +61,56 @@ def test_image_data_data(compression, data, header):
     image_data.set_data(data, header)
     output = image_data.get_data(header)
     assert output == data, 'output=%r, expected=%r' % (output, data)
+
+
+@pytest.mark.parametrize('compression', list(Compression))
+@pytest.mark.parametrize('version', [1, 2])
+def test_image_data_deferred(compression, version):
+    header = FileHeader(width=2, height=2, depth=16, channels=3,
+                        version=version)
+    data = [RAW_IMAGE_2x2_16bit, RAW_IMAGE_2x2_16bit[::-1], b'\x00' * 8]
+    expected = ImageData(compression)
+    expected.set_data(data, header)
+
+    image_data = ImageData(compression)
+    assert image_data.set_data(data, header, deferred=True) is None
+    assert image_data.is_pending
+    assert image_data.get_data(header) == data
+    assert image_data.is_pending
+    # Channels compressed separately are joined into the same stream.
+    assert image_data.data == expected.data
+    assert not image_data.is_pending
+    assert image_data == expected
+
+
+@pytest.mark.parametrize('compression', list(Compression))
+@pytest.mark.parametrize(
+    'depth, dtype, version', [
+        (8, '>u1', 1),
+        (16, '>u2', 2),
+        (32, '>f4', 1),
+    ]
+)
+@pytest.mark.parametrize('rows', [1, 3, 64])
+def test_image_data_iter_strips(compression, depth, dtype, version, rows):
+    header = FileHeader(
+        width=5, height=7, depth=depth, channels=3, version=version
+    )
+    size = header.width * header.height * depth // 8
+    data = [
+        bytes(bytearray((x * 7919 + 13 * c) % 256 for x in range(size)))
+        for c in range(header.channels)
+    ]
+    image_data = ImageData(compression)
+    image_data.set_data(data, header)
+    expected = np.stack([
+        np.frombuffer(plane, dtype).reshape((header.height, header.width))
+        for plane in data
+    ], axis=-1)
+
+    strips = list(image_data.iter_strips(header, rows))
+    assert [top for top, _ in strips] == list(range(0, header.height, rows))
+    assert all(strip.shape[0] <= rows for _, strip in strips)
+    output = np.concatenate([strip for _, strip in strips])
+    assert output.dtype.isnative
+    assert np.array_equal(output, expected, equal_nan=True)
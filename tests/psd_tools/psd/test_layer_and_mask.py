@@ -270,5 +270,19 @@ def test_channel_data_data(compression, data, width, height, depth, version):
     assert output == data, 'output=%r, expected=%r' % (output, data)
 
 
+@pytest.mark.parametrize('compression', list(Compression))
+def test_channel_data_deferred(compression):
+    channel = ChannelData(compression)
+    assert channel.set_data(RAW_IMAGE_3x3_8bit, 3, 3, 8, deferred=True) is None
+    assert channel.is_pending
+    assert channel.get_data(3, 3, 8) == RAW_IMAGE_3x3_8bit
+    assert channel.is_pending
+    expected = ChannelData(compression)
+    expected.set_data(RAW_IMAGE_3x3_8bit, 3, 3, 8)
+    assert channel == expected
+    assert not channel.is_pending
+    assert channel._length == expected._length
+
+
 def test_global_layer_mask_info():
     check_write_read(GlobalLayerMaskInfo())
@@ -3,6 +3,7 @@ import pytest
 import io
 import os
 from psd_tools.psd import PSD
+from psd_tools.psd.source import ByteRange, FileSource, MmapSource
 
 from ..utils import all_files, check_write_read, TEST_ROOT
 
@@ -64,3 +65,137 @@ def test_psd__iter_layers(filename, length):
     with open(os.path.join(TEST_ROOT, 'psd_files', filename), 'rb') as f:
         psd = PSD.read(f)
     assert len(list(psd._iter_layers())) == length
+
+
+@pytest.mark.parametrize('kls', [FileSource, MmapSource])
+@pytest.mark.parametrize('filename', all_files())
+def test_psd_read_write_source(filename, kls):
+    basename = os.path.basename(filename)
+    with open(filename, 'rb') as f:
+        expected = f.read()
+        f.seek(0)
+        psd = PSD.read(f, source=kls(filename))
+
+    padding = BAD_PADDINGS.get(basename, 4)
+    with io.BytesIO() as f:
+        psd.write(f, padding=padding)
+        output = f.getvalue()
+
+    if basename in BAD_UNICODE_PADDINGS:
+        pytest.xfail('Broken file')
+    assert output == expected
+
+
+@pytest.mark.parametrize('filename', all_files())
+def test_psd_read_write_deferred_blocks(filename):
+    basename = os.path.basename(filename)
+    with open(filename, 'rb') as f:
+        expected = f.read()
+
+    with io.BytesIO(expected) as f:
+        psd = PSD.read(f, deferred=True)
+
+    padding = BAD_PADDINGS.get(basename, 4)
+    with io.BytesIO() as f:
+        psd.write(f, padding=padding)
+        output = f.getvalue()
+    # Unchanged blocks are written as is, including irregular paddings.
+    assert output == expected
+
+
+def test_psd_read_source_deferred():
+    filename = os.path.join(TEST_ROOT, 'psd_files', 'colormodes',
+                            '4x4_16bit_rgb.psd')
+    with open(filename, 'rb') as f:
+        expected = PSD.read(f)
+        f.seek(0)
+        psd = PSD.read(f, source=FileSource(f))
+        assert isinstance(psd.image_data.data, ByteRange)
+        for _, channels in psd._iter_layers():
+            for channel in channels:
+                assert isinstance(channel.data, ByteRange)
+        assert psd == expected
+
+
+def test_psd_read_source_mmap():
+    filename = os.path.join(TEST_ROOT, 'psd_files', 'colormodes',
+                            '4x4_16bit_rgb.psd')
+    with open(filename, 'rb') as f:
+        expected = PSD.read(f)
+        f.seek(0)
+        psd = PSD.read(f, source=MmapSource(f))
+    assert isinstance(psd.image_data.data, memoryview)
+    for _, channels in psd._iter_layers():
+        for channel in channels:
+            assert isinstance(channel.data, memoryview)
+    assert psd == expected
+
+
+@pytest.mark.parametrize('kls', [FileSource, MmapSource])
+def test_psd_read_source_pickle(kls):
+    import pickle
+    filename = os.path.join(TEST_ROOT, 'psd_files', 'colormodes',
+                            '4x4_16bit_rgb.psd')
+    with open(filename, 'rb') as f:
+        expected = PSD.read(f)
+        f.seek(0)
+        psd = PSD.read(f, source=kls(filename))
+    assert pickle.loads(pickle.dumps(psd)) == expected
+
+    with open(filename, 'rb') as f:
+        with pytest.raises(TypeError):
+            pickle.dumps(FileSource(f))
+
+
+@pytest.mark.parametrize('kls', [FileSource, MmapSource])
+def test_psd_read_source_slice(kls):
+    filename = os.path.join(TEST_ROOT, 'psd_files', 'clipping-mask.psd')
+    with open(filename, 'rb') as f:
+        expected = PSD.read(f).image_data.data
+        f.seek(0)
+        data = PSD.read(f, source=kls(filename)).image_data.data
+    assert bytes(data[:]) == expected
+    assert bytes(data[10:20]) == expected[10:20]
+    assert bytes(data[-5:]) == expected[-5:]
+    assert bytes(data[20:10]) == b''
+
+
+@pytest.mark.parametrize('filename', [
+    'clipping-mask.psd',
+    'clipping-mask.psb',
+    'colormodes/4x4_16bit_rgb.psd',
+])
+def test_psd_write_deferred(filename):
+    from psd_tools.constants import Compression
+
+    def set_data(psd, deferred):
+        for record, channels in psd._iter_layers():
+            for channel, (width, height) in zip(
+                channels, record.channel_sizes
+            ):
+                data = channel.get_data(
+                    width, height, psd.header.depth, psd.header.version
+                )
+                channel.compression = Compression.ZIP
+                channel.set_data(
+                    data, width, height, psd.header.depth,
+                    psd.header.version, deferred=deferred
+                )
+        data = psd.image_data.get_data(psd.header)
+        psd.image_data.compression = Compression.RLE
+        psd.image_data.set_data(data, psd.header, deferred=deferred)
+
+    with open(os.path.join(TEST_ROOT, 'psd_files', filename), 'rb') as f:
+        expected = PSD.read(f)
+    set_data(expected, False)
+    expected = expected.tobytes()
+
+    for workers in (1, 4):
+        with open(os.path.join(TEST_ROOT, 'psd_files', filename), 'rb') as f:
+            psd = PSD.read(f)
+        set_data(psd, True)
+        assert any(True for _ in psd._iter_pending())
+        with io.BytesIO() as f:
+            psd.write(f, workers=workers)
+            assert f.getvalue() == expected
+        assert not any(True for _ in psd._iter_pending())
@@ -44,6 +44,26 @@ def test_tagged_blocks_v2():
     check_read_write(TaggedBlocks, fixture, version=2, padding=4)
 
 
+def test_tagged_blocks_deferred():
+    filepath = os.path.join(TEST_ROOT, 'tagged_blocks', 'tagged_blocks_v2.dat')
+    with open(filepath, 'rb') as f:
+        fixture = f.read()
+    expected = TaggedBlocks.frombytes(fixture, version=2, padding=4)
+    blocks = TaggedBlocks.frombytes(
+        fixture, version=2, padding=4, deferred=True
+    )
+    assert all(block.is_deferred for block in blocks.values())
+    assert blocks.tobytes(version=2, padding=4) == fixture
+
+    key = next(iter(blocks))
+    assert blocks.get_data(key) == expected.get_data(key)
+    assert not blocks[key].is_deferred
+    assert blocks == expected
+    assert blocks.tobytes(version=2, padding=4) == expected.tobytes(
+        version=2, padding=4
+    )
+
+
 @pytest.mark.parametrize(
     'key, data, version, padding', [
         (Tag.LAYER_VERSION, IntegerElement(1), 1, 1),
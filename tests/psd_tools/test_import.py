@@ -0,0 +1,72 @@
+from __future__ import absolute_import, unicode_literals
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+import psd_tools
+
+from .utils import TEST_ROOT
+
+# Modules that should not be loaded until pixels or effects are requested.
+HEAVY_MODULES = [
+    'numpy',
+    'PIL',
+    'scipy',
+    'skimage',
+    'aggdraw',
+    'psd_tools.composer',
+    'psd_tools.composite',
+    'psd_tools.terminology',
+    'psd_tools.api.effects',
+    'psd_tools.api.pil_io',
+]
+
+
+def _get_loaded(code):
+    script = '\n'.join([
+        'import json, sys',
+        code,
+        'print(json.dumps([m for m in %r if m in sys.modules]))' %
+        (HEAVY_MODULES, ),
+    ])
+    env = dict(os.environ)
+    path = os.path.dirname(os.path.dirname(psd_tools.__file__))
+    env['PYTHONPATH'] = os.pathsep.join(
+        [path] + env.get('PYTHONPATH', '').split(os.pathsep)
+    )
+    output = subprocess.check_output([sys.executable, '-c', script], env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='requires PEP 562')
+def test_import():
+    assert _get_loaded('import psd_tools') == []
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='requires PEP 562')
+@pytest.mark.parametrize('filename', ['1layer.psd', 'clipping-mask.psd'])
+@pytest.mark.parametrize('lazy', [False, True])
+def test_import_open(filename, lazy):
+    code = '\n'.join([
+        'from psd_tools import PSDImage',
+        'psd = PSDImage.open(%r, lazy=%r)' %
+        (os.path.join(TEST_ROOT, 'psd_files', filename), lazy),
+        'psd.size, psd.color_mode, psd.depth, psd.image_resources',
+        '[(layer.name, layer.kind, layer.visible, layer.bbox)',
+        ' for layer in psd.descendants()]',
+    ])
+    assert _get_loaded(code) == []
+
+
+def test_lazy_attributes():
+    from psd_tools.api.psd_image import PSDImage
+    from psd_tools.api.probe import probe
+    from psd_tools.composer import compose
+    assert psd_tools.PSDImage is PSDImage
+    assert psd_tools.probe is probe
+    assert psd_tools.compose is compose
+    assert set(psd_tools.__all__) <= set(dir(psd_tools))
+    with pytest.raises(AttributeError):
+        psd_tools.unknown
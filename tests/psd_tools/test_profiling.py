@@ -0,0 +1,92 @@
+from __future__ import absolute_import, unicode_literals
+import io
+import logging
+import pytest
+
+from psd_tools import profiling
+from psd_tools.api.psd_image import PSDImage
+
+from .utils import full_name
+
+
+def test_span_disabled():
+    assert not profiling.is_enabled()
+    with profiling.span('test', nbytes=1) as stage:
+        assert not stage
+        stage.set(nbytes=2, key='value')
+
+
+def test_span():
+    with profiling.record() as recorder:
+        assert profiling.is_enabled()
+        with profiling.span('outer', key='value') as outer:
+            assert outer
+            with profiling.span('inner') as inner:
+                inner.set(nbytes=10)
+        with pytest.raises(ValueError):
+            with profiling.span('error'):
+                raise ValueError()
+    assert not profiling.is_enabled()
+
+    assert [event.name for event in recorder] == ['inner', 'outer', 'error']
+    inner, outer, error = recorder.events
+    assert inner.nbytes == 10
+    assert inner.depth == 1
+    assert outer.depth == 0
+    assert outer.nbytes is None
+    assert outer.attrs == {'key': 'value'}
+    assert outer.duration >= inner.duration >= 0
+    assert error.attrs == {'error': 'ValueError'}
+    assert recorder.summary()['inner'] == (1, inner.duration, 10)
+
+
+def test_listener_error(caplog):
+    def callback(event):
+        raise RuntimeError()
+
+    recorder = profiling.Recorder()
+    with profiling.listen(callback), profiling.listen(recorder):
+        with caplog.at_level(logging.ERROR, logger='psd_tools.profiling'):
+            with profiling.span('test'):
+                pass
+    assert len(recorder) == 1
+    assert len(caplog.records) == 1
+
+
+@pytest.mark.parametrize(
+    'filename', ['clipping-mask.psd', 'layer_mask_data.psd']
+)
+def test_events(filename):
+    with profiling.record() as recorder:
+        psd = PSDImage.open(full_name(filename))
+        psd.composite(force=True)
+        with io.BytesIO() as f:
+            psd.save(f)
+            size = f.tell()
+
+    summary = recorder.summary()
+    for name in (
+        'open', 'read.header', 'read.color_mode_data',
+        'read.image_resources', 'read.layer_and_mask_information',
+        'read.image_data', 'decompress', 'composite', 'composite.layer',
+        'composite.decode', 'composite.blend', 'save', 'write.header',
+        'write.image_data'
+    ):
+        assert name in summary, name
+
+    reads = [
+        summary[name][2] for name in summary if name.startswith('read.')
+    ]
+    with open(full_name(filename), 'rb') as f:
+        assert sum(reads) == len(f.read())
+    writes = [
+        summary[name][2] for name in summary if name.startswith('write.')
+    ]
+    assert sum(writes) == summary['save'][2] == size
+
+    opened = recorder.find('open')[0]
+    assert opened.depth == 0
+    assert {event.depth for event in recorder.find('read.header')} == {1}
+    layers = {event.attrs['layer'] for event in recorder.find(
+        'composite.layer')}
+    assert set(psd.descendants()) >= layers